@@ -0,0 +1,113 @@
+"""
+Versioned cache for catalog (product/category) responses.
+
+A single catalog version number lives in the catalog cache and is bumped
+whenever a Product or Category is saved or deleted (see ``api.signals``).
+Serialized payloads are stored under keys that include the version, so a
+bump invalidates everything at once without having to track individual keys,
+and the version doubles as the basis for strong ETags: a client that sends
+a matching If-None-Match gets a 304 before any catalog query runs.
+
+The cache alias is configurable through ``CATALOG_CACHE_ALIAS``; it must
+point at a shared backend (Redis, Memcached, database) when more than one
+worker process serves the API, otherwise bumps are only seen locally.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+
+VERSION_KEY = 'catalog:version'
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'CATALOG_CACHE_TTL', 60 * 60)
+
+
+def _initial_version():
+    # Millisecond clock, so a version that was evicted never gets reused
+    return int(time.time() * 1000)
+
+
+def get_version():
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _initial_version(), None)
+        version = cache.get(VERSION_KEY, _initial_version())
+    return version
+
+
+def bump_version():
+    cache = get_cache()
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        version = _initial_version()
+        cache.set(VERSION_KEY, version, None)
+        return version
+
+
+def bump_version_on_commit():
+    """Bump once the current transaction commits, so readers never cache uncommitted data"""
+    transaction.on_commit(bump_version)
+
+
+def cache_key(*parts):
+    return 'catalog:%s:%s' % (get_version(), ':'.join(str(part) for part in parts))
+
+
+def request_digest(request, scope):
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    )
+    # Payloads embed absolute image URLs, so each scheme and host gets its own entry
+    raw = '%s://%s/%s?%s' % (request.scheme, request.get_host(), scope, '&'.join('%s=%s' % pair for pair in params))
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def cached_response(request, scope, build):
+    """
+    Serve ``build()``'s payload from the versioned cache with a strong ETag.
+
+    ``scope`` identifies the resource (e.g. ``'list'`` or ``'detail:12'``);
+    the request's scheme, host and query parameters are folded into the key
+    as well.
+    """
+    version = get_version()
+    digest = request_digest(request, scope)
+    etag = '"%s-%s"' % (version, digest)
+    # Each representation (plain or compact JSON, ...) needs its own strong ETag
+    renderer_format = getattr(getattr(request, 'accepted_renderer', None), 'format', 'json')
+    if renderer_format != 'json':
+        etag = '"%s-%s-%s"' % (version, digest, renderer_format)
+
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        cache = get_cache()
+        key = 'catalog:%s:%s' % (version, digest)
+        data = cache.get(key)
+        if data is None:
+            data = build()
+            cache.set(key, data, get_timeout())
+        response = Response(data)
+
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Accept'])
+    return response
@@ -0,0 +1,157 @@
+"""
+Chunked cleanup of stale pending orders.
+
+Orders still ``pending``/``pending`` after ``ORDER_CLEANUP_AGE_HOURS`` are
+deleted in primary-key order, ``ORDER_CLEANUP_BATCH_SIZE`` at a time, each
+batch in its own short transaction that first gives back the stock the
+orders reserved. The job sleeps ``ORDER_CLEANUP_BATCH_PAUSE`` seconds between
+batches so other writers are not starved of the database lock. The
+deletion events and the sales rollup updates are written once per batch
+rather than by the per-order delete signals.
+
+The last deleted id is saved with every batch in the job's ``JobState``
+row, so an interrupted pass resumes where it stopped; a finished pass resets
+it and the next one starts from the oldest order again. The metrics of the
+last run are kept in ``JobState.stats``.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import JobState, Order
+from .reservations import release_orders
+from .signals import bulk_order_deletion
+from . import order_events, product_sales, rollups, scheduler
+
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = 'cleanup_pending_orders'
+
+
+class CleanupResult:
+    def __init__(self, cutoff, resumed_from=0):
+        self.cutoff = cutoff
+        self.resumed_from = resumed_from
+        self.last_id = resumed_from
+        self.batches = 0
+        self.deleted = 0
+        self.finished = False
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        return self.deleted / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'cutoff': self.cutoff,
+            'resumed_from': self.resumed_from,
+            'last_id': self.last_id,
+            'batches': self.batches,
+            'deleted': self.deleted,
+            'finished': self.finished,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'orders_per_second': round(self.rate, 1),
+        }
+
+
+def get_age_hours():
+    return getattr(settings, 'ORDER_CLEANUP_AGE_HOURS', 1)
+
+
+def stale_orders(cutoff):
+    return Order.objects.filter(status='pending', payment_status='pending', created_at__lt=cutoff)
+
+
+def delete_orders(orders):
+    """
+    Delete ``orders`` (rows with ``id``, ``order_number``, ``created_at`` and
+    the rollup bucket fields), recording them in the change feed and the
+    sales rollups with one write per table instead of per order.
+    """
+    ids = [order['id'] for order in orders]
+    # Before the delete cascades to the order lines the product rollup is computed from
+    product_sales.move_orders([order['id'] for order in orders if product_sales.counts(order['status'])], -1)
+    deltas = {}
+    for order in orders:
+        rollups.move(deltas, order['created_at'], order, None)
+    rollups.apply(deltas)
+
+    with bulk_order_deletion():
+        Order.objects.filter(id__in=ids).delete()
+    order_events.record_many([
+        order_events.make_event(order['id'], order['order_number'], 'deleted', {}) for order in orders
+    ])
+
+
+def delete_batch(cutoff, after_id, batch_size):
+    """Delete the next batch of stale orders above ``after_id``; returns their ids"""
+    with transaction.atomic():
+        orders = list(
+            stale_orders(cutoff).select_for_update()
+            .filter(id__gt=after_id)
+            .order_by('id')
+            .values('id', 'order_number', 'created_at', 'total', *rollups.BUCKET_FIELDS)[:batch_size]
+        )
+        ids = [order['id'] for order in orders]
+        if ids:
+            # Give the stock these orders were holding back before deleting them
+            release_orders(ids, statuses=('reserved',))
+            delete_orders(orders)
+            JobState.objects.filter(name=JOB_NAME).update(cursor=ids[-1])
+    return ids
+
+
+def cleanup_stale_orders(hours=None, batch_size=None, pause=None, max_batches=None, progress=None):
+    """
+    Delete stale pending orders batch by batch, resuming an interrupted pass.
+    The caller must hold the job's lease (see ``api.scheduler.claim``).
+    ``progress`` is called with the ``CleanupResult`` after every batch.
+    """
+    hours = hours if hours is not None else get_age_hours()
+    batch_size = batch_size or getattr(settings, 'ORDER_CLEANUP_BATCH_SIZE', 500)
+    pause = pause if pause is not None else getattr(settings, 'ORDER_CLEANUP_BATCH_PAUSE', 0.5)
+
+    state, _ = JobState.objects.get_or_create(name=JOB_NAME)
+    result = CleanupResult(timezone.now() - timedelta(hours=hours), resumed_from=state.cursor)
+
+    while max_batches is None or result.batches < max_batches:
+        ids = delete_batch(result.cutoff, result.last_id, batch_size)
+        if not ids:
+            result.finished = True
+            JobState.objects.filter(name=JOB_NAME).update(cursor=0)
+            break
+        result.batches += 1
+        result.deleted += len(ids)
+        result.last_id = ids[-1]
+        result.elapsed = time.monotonic() - result.started
+        scheduler.renew(JOB_NAME)
+        if progress is not None:
+            progress(result)
+        if pause and len(ids) == batch_size:
+            time.sleep(pause)
+
+    result.elapsed = time.monotonic() - result.started
+    return result
+
+
+def run_cleanup_job(**options):
+    """Scheduler entry point; returns None when another process is already cleaning up"""
+    if not scheduler.claim(JOB_NAME):
+        return None
+    result = None
+    try:
+        result = cleanup_stale_orders(**options)
+        logger.info(
+            'Order cleanup: deleted %s stale pending orders in %s batches (%.1f/s)',
+            result.deleted, result.batches, result.rate
+        )
+    finally:
+        scheduler.release(JOB_NAME, result.as_dict() if result is not None else None)
+    return result
@@ -0,0 +1,409 @@
+"""
+Customer cohort and lifetime value analytics.
+
+A batch job streams the orders that count as sales (any status but
+cancelled or rejected) in ``(created_at, id)`` keyset chunks of
+``CUSTOMER_ANALYTICS_CHUNK_SIZE`` rows. Each chunk is loaded as columns:
+customer id, local year/month/day and total in paise, all computed by the
+database. The per-customer state lives in flat arrays with one slot per
+customer seen so far (slots are handed out in order of first order, so gaps
+in the customer ids cost nothing), about 56 bytes per customer however many
+orders there are. Each chunk is folded into those arrays with vectorized
+NumPy operations.
+
+Chunks arrive in time order, so a customer's first order fixes their cohort
+month. Their months since then only grow, which is enough to count each
+customer once per month in the retention matrix without keeping their order
+history. Without NumPy the same folds run as plain Python loops over
+dictionaries: same results, only slower.
+
+A run replaces the ``CustomerValue`` rows (one per customer) and stores a
+``CustomerAnalyticsReport``. The report holds the cohort retention matrix,
+the repeat purchase figures and the ``CUSTOMER_ANALYTICS_REORDER_DAYS``
+reorder rate per cohort, and ``/api/dashboard/customer_analytics/`` serves
+the latest one. ``manage.py compute_customer_analytics`` runs the job on
+demand, and the scheduler runs it every ``CUSTOMER_ANALYTICS_INTERVAL``
+seconds.
+"""
+import logging
+import time
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BigIntegerField, F, Q
+from django.db.models.functions import Cast, ExtractDay, ExtractMonth, ExtractYear, Round
+from django.utils import timezone
+
+from .models import CustomerAnalyticsReport, CustomerValue, Order
+from .product_sales import EXCLUDED_STATUSES
+from . import scheduler
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = 'customer_analytics'
+WRITE_BATCH_SIZE = 5000
+
+
+def get_chunk_size():
+    return getattr(settings, 'CUSTOMER_ANALYTICS_CHUNK_SIZE', 50000)
+
+
+def get_reorder_days():
+    return getattr(settings, 'CUSTOMER_ANALYTICS_REORDER_DAYS', 90)
+
+
+def month_number(year, month):
+    return year * 12 + month - 1
+
+
+def month_label(number):
+    return f'{number // 12:04d}-{number % 12 + 1:02d}'
+
+
+def order_chunks(chunk_size):
+    """Counted orders oldest first, as ``(customer, year, month, day, cents)`` column tuples"""
+    queryset = (
+        Order.objects.exclude(status__in=EXCLUDED_STATUSES)
+        .annotate(
+            year=ExtractYear('created_at'), month=ExtractMonth('created_at'), day=ExtractDay('created_at'),
+            cents=Cast(Round(F('total') * 100), BigIntegerField()),
+        )
+        .order_by('created_at', 'id')
+    )
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            page = page.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+        rows = list(page.values_list('created_at', 'id', 'customer_id', 'year', 'month', 'day', 'cents')[:chunk_size])
+        if not rows:
+            return
+        last = rows[-1][:2]
+        yield tuple(zip(*rows))[2:]
+
+
+class NumpyState:
+    """Per-customer arrays indexed by slot; each chunk is folded in without per-row loops"""
+    engine = 'numpy'
+
+    def __init__(self):
+        self.size = 0
+        self.used = 0
+        # Customer ids seen so far, sorted, with their slots
+        self.known = np.zeros(0, np.int64)
+        self.known_slots = np.zeros(0, np.int64)
+        self.ids = np.zeros(0, np.int64)
+        self.count = np.zeros(0, np.int32)
+        self.cents = np.zeros(0, np.int64)
+        self.first_day = np.zeros(0, np.int32)
+        self.second_day = np.zeros(0, np.int32)
+        self.last_day = np.zeros(0, np.int32)
+        self.first_month = np.zeros(0, np.int32)
+        self.last_offset = np.zeros(0, np.int32)
+        self.start_month = None
+        self.active = None
+
+    def grow(self, size):
+        """Make room for ``size`` slots"""
+        if size <= self.size:
+            return
+        size = max(size, self.size * 2)
+        for name, fill in (('ids', 0), ('count', 0), ('cents', 0), ('first_day', -1), ('second_day', -1),
+                           ('last_day', -1), ('first_month', -1), ('last_offset', -1)):
+            array = getattr(self, name)
+            grown = np.full(size, fill, array.dtype)
+            grown[:self.size] = array
+            setattr(self, name, grown)
+        self.size = size
+
+    def slots(self, customers):
+        """Slot of each customer id, giving customers not seen before the next free slots"""
+        unique, inverse = np.unique(customers, return_inverse=True)
+        position = np.searchsorted(self.known, unique)
+        found = position < len(self.known)
+        found[found] = self.known[position[found]] == unique[found]
+
+        unique_slots = np.empty(len(unique), np.int64)
+        unique_slots[found] = self.known_slots[position[found]]
+        new = unique[~found]
+        if len(new):
+            new_slots = np.arange(self.used, self.used + len(new))
+            unique_slots[~found] = new_slots
+            self.grow(self.used + len(new))
+            self.ids[new_slots] = new
+            self.used += len(new)
+            # Both sorted, so the new ids go in with a single merge
+            at = np.searchsorted(self.known, new)
+            self.known = np.insert(self.known, at, new)
+            self.known_slots = np.insert(self.known_slots, at, new_slots)
+        return unique_slots[inverse.reshape(-1)]
+
+    def fold(self, customers, years, months, days, cents, end_month):
+        customers = self.slots(np.asarray(customers, np.int64))
+        years = np.asarray(years, np.int64)
+        calendar_months = np.asarray(months, np.int64)
+        months = month_number(years, calendar_months)
+        days = day_numbers(years, calendar_months, np.asarray(days, np.int64))
+        cents = np.asarray(cents, np.int64)
+        if self.start_month is None:
+            self.start_month = int(months[0])
+            width = end_month - self.start_month + 1
+            self.active = np.zeros((width, width), np.int64)
+
+        # First orders: the earliest row of customers not seen in earlier chunks
+        unique, first_index = np.unique(customers, return_index=True)
+        new = self.count[unique] == 0
+        self.first_day[unique[new]] = days[first_index[new]]
+        self.first_month[unique[new]] = months[first_index[new]]
+
+        # Rank of every order among its customer's orders, to find second orders
+        by_customer = np.argsort(customers, kind='stable')
+        sorted_customers = customers[by_customer]
+        starts = np.flatnonzero(np.r_[True, sorted_customers[1:] != sorted_customers[:-1]])
+        group_start = np.repeat(starts, np.diff(np.r_[starts, len(customers)]))
+        rank = np.empty(len(customers), np.int64)
+        rank[by_customer] = np.arange(len(customers)) - group_start + self.count[sorted_customers]
+        second = rank == 1
+        self.second_day[customers[second]] = days[second]
+
+        np.add.at(self.count, customers, 1)
+        np.add.at(self.cents, customers, cents)
+        np.maximum.at(self.last_day, customers, days)
+
+        # Count each customer once per month since their cohort month
+        width = self.active.shape[1]
+        offsets = np.minimum(months - self.first_month[customers], width - 1)
+        pairs = np.unique(customers * width + offsets)
+        pair_customers, pair_offsets = np.divmod(pairs, width)
+        fresh = pair_offsets > self.last_offset[pair_customers]
+        np.add.at(
+            self.active,
+            (self.first_month[pair_customers[fresh]] - self.start_month, pair_offsets[fresh]),
+            1
+        )
+        np.maximum.at(self.last_offset, pair_customers, pair_offsets)
+
+    def customers(self):
+        """``(customer_id, order_count, cents, first_day, second_day, last_day, first_month)`` columns"""
+        slots = np.argsort(self.ids[:self.used], kind='stable')
+        return (
+            self.ids[slots], self.count[slots], self.cents[slots], self.first_day[slots], self.second_day[slots],
+            self.last_day[slots], self.first_month[slots],
+        )
+
+    def cohorts(self, reorder_days):
+        ids, count, cents, first_day, second_day, last_day, first_month = self.customers()
+        cohort = first_month - self.start_month
+        width = self.active.shape[0]
+        reordered = (second_day >= 0) & (second_day - first_day <= reorder_days)
+        return (
+            np.bincount(cohort, minlength=width),
+            np.bincount(cohort, weights=reordered, minlength=width).astype(np.int64),
+            self.active,
+        )
+
+    def summary(self):
+        ids, count, cents, *_ = self.customers()
+        return {
+            'customers': int(len(ids)),
+            'orders': int(count.sum()),
+            'repeat_customers': int((count >= 2).sum()),
+            'revenue_cents': int(cents.sum()),
+            'median_cents': float(np.median(cents)) if len(ids) else 0,
+        }
+
+
+class PythonState:
+    """The same folds as ``NumpyState`` over dictionaries, for when NumPy is not installed"""
+    engine = 'python'
+
+    def __init__(self):
+        self.state = {}
+        self.start_month = None
+        self.end_month = None
+        self.active = {}
+
+    def fold(self, customers, years, months, days, cents, end_month):
+        if self.start_month is None:
+            self.start_month = month_number(years[0], months[0])
+            self.end_month = end_month
+        for customer, year, month, day, amount in zip(customers, years, months, days, cents):
+            number = month_number(year, month)
+            day = date(year, month, day).toordinal()
+            state = self.state.get(customer)
+            if state is None:
+                # [count, cents, first_day, second_day, last_day, first_month, last_offset]
+                state = self.state[customer] = [0, 0, day, -1, day, number, -1]
+            elif state[0] == 1:
+                state[3] = day
+            state[0] += 1
+            state[1] += amount
+            state[4] = max(state[4], day)
+            offset = min(number - state[5], self.end_month - self.start_month)
+            if offset > state[6]:
+                key = (state[5] - self.start_month, offset)
+                self.active[key] = self.active.get(key, 0) + 1
+                state[6] = offset
+
+    def customers(self):
+        ids = sorted(self.state)
+        columns = list(zip(*(self.state[customer][:6] for customer in ids))) or [()] * 6
+        return (ids,) + tuple(columns)
+
+    def cohorts(self, reorder_days):
+        width = self.end_month - self.start_month + 1
+        sizes, reordered = [0] * width, [0] * width
+        for count, cents, first_day, second_day, last_day, first_month, last_offset in self.state.values():
+            sizes[first_month - self.start_month] += 1
+            if second_day >= 0 and second_day - first_day <= reorder_days:
+                reordered[first_month - self.start_month] += 1
+        active = [[self.active.get((row, column), 0) for column in range(width)] for row in range(width)]
+        return sizes, reordered, active
+
+    def summary(self):
+        values = sorted(state[1] for state in self.state.values())
+        middle = len(values) // 2
+        median = (values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2) if values else 0
+        return {
+            'customers': len(values),
+            'orders': sum(state[0] for state in self.state.values()),
+            'repeat_customers': sum(1 for state in self.state.values() if state[0] >= 2),
+            'revenue_cents': sum(values),
+            'median_cents': median,
+        }
+
+
+def day_numbers(years, months, days):
+    """``date.toordinal()`` of each (year, month, day), in integer arithmetic that works on whole arrays"""
+    years = years - (months <= 2)
+    eras = years // 400
+    year_of_era = years - eras * 400
+    day_of_year = (153 * (months + np.where(months > 2, -3, 9)) + 2) // 5 + days - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return eras * 146097 + day_of_era - 305
+
+
+def make_state(use_numpy=None):
+    if use_numpy is None:
+        use_numpy = np is not None
+    return NumpyState() if use_numpy else PythonState()
+
+
+def to_money(cents):
+    return (Decimal(str(cents)) / 100).quantize(Decimal('0.01'))
+
+
+def build_report(state, reorder_days, end_month):
+    """``(summary, cohorts)`` of a folded state"""
+    sizes, reordered, active = state.cohorts(reorder_days) if state.start_month is not None else ([], [], [])
+    cohorts = []
+    for row, size in enumerate(sizes):
+        size = int(size)
+        if not size:
+            continue
+        months_since = end_month - state.start_month - row
+        counts = [int(active[row][offset]) for offset in range(months_since + 1)]
+        cohorts.append({
+            'cohort': month_label(state.start_month + row),
+            'customers': size,
+            'reordered': int(reordered[row]),
+            'reorder_rate': round(int(reordered[row]) / size, 4),
+            'active': counts,
+            'retention': [round(count / size, 4) for count in counts],
+        })
+
+    totals = state.summary() if state.start_month is not None else {
+        'customers': 0, 'orders': 0, 'repeat_customers': 0, 'revenue_cents': 0, 'median_cents': 0,
+    }
+    customers = totals['customers']
+    summary = {
+        'customers': customers,
+        'orders': totals['orders'],
+        'repeat_customers': totals['repeat_customers'],
+        'repeat_purchase_rate': round(totals['repeat_customers'] / customers, 4) if customers else 0,
+        'total_revenue': to_money(totals['revenue_cents']),
+        'average_lifetime_value': to_money(totals['revenue_cents'] / customers if customers else 0),
+        'median_lifetime_value': to_money(totals['median_cents']),
+        'reorder_days': reorder_days,
+        'timezone': timezone.get_current_timezone_name(),
+        'engine': state.engine,
+    }
+    return summary, cohorts
+
+
+def customer_values(state):
+    ids, count, cents, first_day, second_day, last_day, first_month = state.customers()
+    for customer_id, order_count, amount, first, last in zip(ids, count, cents, first_day, last_day):
+        yield CustomerValue(
+            customer_id=int(customer_id),
+            first_order_date=date.fromordinal(int(first)),
+            last_order_date=date.fromordinal(int(last)),
+            order_count=int(order_count),
+            lifetime_value=to_money(amount),
+        )
+
+
+def compute(chunk_size=None, reorder_days=None, use_numpy=None, progress=None):
+    """
+    Run the analytics over the whole order history, replace the
+    ``CustomerValue`` rows and store a new report, which is returned.
+    ``progress`` is called with the number of orders read after every chunk.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    reorder_days = reorder_days if reorder_days is not None else get_reorder_days()
+    started = time.monotonic()
+    today = timezone.localdate()
+    end_month = month_number(today.year, today.month)
+
+    state = make_state(use_numpy)
+    orders = 0
+    for columns in order_chunks(chunk_size):
+        state.fold(*columns, end_month=end_month)
+        orders += len(columns[0])
+        if progress is not None:
+            progress(orders)
+
+    summary, cohorts = build_report(state, reorder_days, end_month)
+    summary['elapsed_seconds'] = round(time.monotonic() - started, 3)
+
+    with transaction.atomic():
+        CustomerValue.objects.all().delete()
+        values = customer_values(state) if state.start_month is not None else iter(())
+        while True:
+            batch = list(islice(values, WRITE_BATCH_SIZE))
+            if not batch:
+                break
+            CustomerValue.objects.bulk_create(batch)
+        report = CustomerAnalyticsReport.objects.create(summary=summary, cohorts=cohorts)
+        # Only the latest report is served
+        CustomerAnalyticsReport.objects.exclude(pk=report.pk).delete()
+    return report
+
+
+def latest_report():
+    return CustomerAnalyticsReport.objects.order_by('-generated_at', '-id').first()
+
+
+def run_customer_analytics_job(**options):
+    """Scheduler entry point; returns None when another process is already running it"""
+    if not scheduler.claim(JOB_NAME):
+        return None
+    report = None
+    try:
+        report = compute(**options)
+        logger.info(
+            'Customer analytics: %s customers, %s orders in %.1fs',
+            report.summary['customers'], report.summary['orders'], report.summary['elapsed_seconds']
+        )
+    finally:
+        scheduler.release(JOB_NAME, report.summary if report is not None else None)
+    return report
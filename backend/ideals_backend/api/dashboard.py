@@ -0,0 +1,206 @@
+"""
+Cached dashboard snapshot.
+
+``/api/dashboard/stats/`` serves a snapshot of the dashboard statistics
+from the cache. A snapshot is fresh for ``DASHBOARD_SNAPSHOT_TTL`` seconds;
+after that it is still served while a single request rebuilds it, for up to
+``DASHBOARD_SNAPSHOT_MAX_STALE`` more seconds. The rebuild is single-flight:
+the request that wins ``cache.add`` on the refresh lock recomputes the
+snapshot (in a background thread when ``DASHBOARD_REFRESH_ASYNC``), the
+others keep serving the stale one. When there is no snapshot at all, the
+requests that lose the lock wait for the winner's result instead of
+computing their own.
+
+Every snapshot carries ``generated_at``, so the admin can show how old the
+numbers are. The cache alias is configurable through
+``DASHBOARD_CACHE_ALIAS``; with several worker processes it must be a shared
+backend for the single-flight to hold across them.
+"""
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Customer, Order, Product
+from .serializers import DashboardSerializer
+from . import product_sales, rollups
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'dashboard:snapshot'
+LOCK_KEY = 'dashboard:snapshot:lock'
+WAIT_INTERVAL = 0.05
+
+_executor = None
+
+
+def get_cache():
+    return caches[getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')]
+
+
+def get_ttl():
+    return getattr(settings, 'DASHBOARD_SNAPSHOT_TTL', 30)
+
+
+def get_max_stale():
+    return getattr(settings, 'DASHBOARD_SNAPSHOT_MAX_STALE', 5 * 60)
+
+
+def get_lock_timeout():
+    return getattr(settings, 'DASHBOARD_REFRESH_LOCK_TIMEOUT', 30)
+
+
+def build_snapshot():
+    """Compute the dashboard statistics from the sales rollups"""
+    total_products = Product.objects.count()
+    total_customers = Customer.objects.count()
+    low_stock_products = Product.objects.filter(is_low_stock=True).count()
+
+    total_orders = 0
+    revenue_by_method = {'online': Decimal('0.00'), 'offline': Decimal('0.00'), 'cod': Decimal('0.00')}
+    orders_by_status = {}
+    orders_by_payment_status = {}
+    for row in rollups.totals():
+        total_orders += row['order_count']
+        orders_by_status[row['status']] = orders_by_status.get(row['status'], 0) + row['order_count']
+        orders_by_payment_status[row['payment_status']] = (
+            orders_by_payment_status.get(row['payment_status'], 0) + row['order_count']
+        )
+        if row['payment_status'] == 'verified':
+            revenue_by_method[row['payment_method']] += row['revenue']
+
+    # Recent orders (last 5)
+    recent_orders = Order.objects.select_related('customer').annotate(
+        item_count=Count('items')
+    ).order_by('-created_at', '-id')[:5]
+
+    # Top products of all time, from the product sales rollup
+    top_products_data = [
+        {
+            'product_id': row['product_id'],
+            'product_name': row['product_name'],
+            'total_sold': row['units'],
+            'revenue': row['revenue'],
+        }
+        for row in product_sales.top_products(limit=5)
+    ]
+
+    generated_at = timezone.now()
+    data = {
+        'stats': {
+            'total_products': total_products,
+            'total_orders': total_orders,
+            'total_customers': total_customers,
+            'total_revenue': sum(revenue_by_method.values()),
+            'online_revenue': revenue_by_method['online'],
+            'offline_revenue': revenue_by_method['offline'],
+            'cod_revenue': revenue_by_method['cod'],
+            'pending_orders': orders_by_status.get('pending', 0),
+            'delivered_orders': orders_by_status.get('delivered', 0),
+            'cancelled_orders': orders_by_status.get('cancelled', 0),
+            'verified_payments': orders_by_payment_status.get('verified', 0),
+            'pending_payments': orders_by_payment_status.get('pending', 0),
+            'failed_payments': orders_by_payment_status.get('failed', 0),
+            'low_stock_products': low_stock_products,
+        },
+        'recent_orders': recent_orders,
+        'top_products': top_products_data
+    }
+
+    snapshot = dict(DashboardSerializer(instance=data).data)
+    snapshot['generated_at'] = generated_at.isoformat()
+    return snapshot
+
+
+def store(snapshot):
+    # Kept past its TTL so it can be served while the next one is built
+    entry = {'data': snapshot, 'fresh_until': time.time() + get_ttl()}
+    get_cache().set(SNAPSHOT_KEY, entry, get_ttl() + get_max_stale())
+
+
+def acquire_lock():
+    """Claim the refresh; returns a token for ``release_lock``, or None if another request holds it"""
+    token = uuid.uuid4().hex
+    if get_cache().add(LOCK_KEY, token, get_lock_timeout()):
+        return token
+    return None
+
+
+def release_lock(token):
+    cache = get_cache()
+    # Only drop our own lock, not one taken after ours timed out
+    if cache.get(LOCK_KEY) == token:
+        cache.delete(LOCK_KEY)
+
+
+def refresh(token):
+    """Rebuild and store the snapshot, then give up the refresh lock"""
+    try:
+        snapshot = build_snapshot()
+        store(snapshot)
+        return snapshot
+    finally:
+        release_lock(token)
+
+
+def _refresh_in_background(token):
+    try:
+        refresh(token)
+    except Exception:
+        logger.exception('Dashboard snapshot refresh failed')
+    finally:
+        close_old_connections()
+
+
+def schedule_refresh(token):
+    global _executor
+    if getattr(settings, 'DASHBOARD_REFRESH_ASYNC', True):
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dashboard-snapshot')
+        _executor.submit(_refresh_in_background, token)
+    else:
+        refresh(token)
+
+
+def wait_for_snapshot():
+    """Wait for the request holding the lock to store a snapshot; None if it gave up"""
+    cache = get_cache()
+    deadline = time.monotonic() + get_lock_timeout()
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(SNAPSHOT_KEY)
+        if entry is not None:
+            return entry['data']
+        if cache.get(LOCK_KEY) is None:
+            return None
+    return None
+
+
+def get_snapshot():
+    """The current dashboard snapshot, rebuilding it at most once per TTL"""
+    entry = get_cache().get(SNAPSHOT_KEY)
+    if entry is not None:
+        if entry['fresh_until'] <= time.time():
+            token = acquire_lock()
+            if token is not None:
+                schedule_refresh(token)
+        return entry['data']
+
+    token = acquire_lock()
+    if token is None:
+        snapshot = wait_for_snapshot()
+        if snapshot is not None:
+            return snapshot
+        # The other rebuild failed or timed out; compute this one ourselves
+        token = acquire_lock()
+        if token is None:
+            return build_snapshot()
+    return refresh(token)
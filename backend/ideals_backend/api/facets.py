@@ -0,0 +1,117 @@
+"""
+Facet counts for catalog browsing.
+
+All facet dimensions are computed from a single GROUP BY over the filtered
+product queryset (one row per category/brand/color/price-bucket combination)
+and rolled up per dimension in Python, so the storefront sidebar costs one
+aggregate query instead of one query per dimension.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from .search import tokenize
+from . import catalog_cache
+
+
+FACET_FILTERS = ('category', 'status', 'brand', 'color', 'min_price', 'max_price', 'search')
+
+
+def get_price_buckets():
+    return list(getattr(settings, 'CATALOG_PRICE_BUCKETS', [0, 250, 500, 1000, 2000]))
+
+
+def price_bucket_labels(boundaries):
+    labels = []
+    for index, lower in enumerate(boundaries):
+        if index + 1 < len(boundaries):
+            labels.append({'min': lower, 'max': boundaries[index + 1], 'label': f'{lower}-{boundaries[index + 1]}'})
+        else:
+            labels.append({'min': lower, 'max': None, 'label': f'{lower}+'})
+    return labels
+
+
+def price_bucket_expression(boundaries):
+    whens = [
+        When(price__lt=upper, then=Value(index))
+        for index, upper in enumerate(boundaries[1:])
+    ]
+    return Case(*whens, default=Value(len(boundaries) - 1), output_field=IntegerField())
+
+
+def normalize_filters(query_params):
+    """Reduce request params to a canonical dict so equivalent requests share a cache entry"""
+    normalized = {}
+    for key in FACET_FILTERS:
+        value = query_params.get(key, '').strip()
+        if not value:
+            continue
+        if key == 'search':
+            value = ' '.join(tokenize(value))
+        elif key in ('status', 'brand', 'color'):
+            value = value.lower()
+        if value:
+            normalized[key] = value
+    return normalized
+
+
+def facet_cache_key(filters):
+    digest = hashlib.md5(json.dumps(filters, sort_keys=True).encode('utf-8')).hexdigest()
+    return catalog_cache.cache_key('facets', digest)
+
+
+def compute_facets(queryset):
+    boundaries = get_price_buckets()
+    rows = (
+        queryset.order_by()
+        .annotate(price_bucket=price_bucket_expression(boundaries))
+        .values('category', 'category__name', 'brand', 'color', 'price_bucket')
+        .annotate(count=Count('id'))
+    )
+
+    total = 0
+    categories = {}
+    category_names = {}
+    brands = {}
+    colors = {}
+    buckets = {}
+    for row in rows:
+        count = row['count']
+        total += count
+        categories[row['category']] = categories.get(row['category'], 0) + count
+        category_names[row['category']] = row['category__name']
+        if row['brand']:
+            brands[row['brand']] = brands.get(row['brand'], 0) + count
+        if row['color']:
+            colors[row['color']] = colors.get(row['color'], 0) + count
+        buckets[row['price_bucket']] = buckets.get(row['price_bucket'], 0) + count
+
+    def ranked(counts):
+        return sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+
+    return {
+        'total': total,
+        'categories': [
+            {'id': category_id, 'name': category_names.get(category_id, ''), 'count': count}
+            for category_id, count in ranked(categories)
+        ],
+        'brands': [{'value': brand, 'count': count} for brand, count in ranked(brands)],
+        'colors': [{'value': color, 'count': count} for color, count in ranked(colors)],
+        'price_buckets': [
+            dict(bucket, count=buckets.get(index, 0))
+            for index, bucket in enumerate(price_bucket_labels(boundaries))
+        ],
+    }
+
+
+def get_facets(queryset, query_params):
+    """Facet counts for ``queryset``, cached briefly per catalog version and normalized filter set"""
+    cache = catalog_cache.get_cache()
+    key = facet_cache_key(normalize_filters(query_params))
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, getattr(settings, 'CATALOG_FACET_CACHE_TTL', 60))
+    return facets
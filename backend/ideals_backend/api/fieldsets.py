@@ -0,0 +1,229 @@
+"""
+Sparse fieldsets for API responses.
+
+Clients ask for a subset of a serializer's fields with ``?fields=id,name``
+or drop some with ``?omit=description``. ``SparseFieldsetMixin`` removes the
+other fields from the top-level serializer, and ``SparseQuerysetMixin`` plans
+the queryset from the fields that are left: only their columns are loaded
+with ``.only()``, and only the relations they traverse get
+``select_related``/``prefetch_related``.
+
+Fields the planner cannot map to model fields (properties, method fields)
+keep their model's columns fully loaded, unless the serializer declares what
+they read in ``Meta.sparse_sources``, e.g.
+``sparse_sources = {'image_set': ('images', 'image_variants')}``. A property
+that follows relations must list the columns it reaches through them
+(``'order__customer__name'``): loading its own model in full does not load
+the related rows.
+
+A related object reached through a reverse one-to-one points back at the
+row it was selected from, so paths that walk back (an invoice's ``order``
+inside an order) are planned on that row.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import permissions, serializers
+
+
+def parse_field_list(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+def requested_fields(request):
+    """``(fields, omit)`` from the query string; ``fields`` is None when not restricted"""
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return None, set()
+    fields = parse_field_list(request.query_params.get('fields'))
+    omit = parse_field_list(request.query_params.get('omit'))
+    return fields or None, omit
+
+
+class SparseFieldsetMixin:
+    """Drop the fields not requested through ``?fields=`` / ``?omit=`` from the top-level serializer"""
+
+    def is_sparse_root(self):
+        if self.parent is None:
+            return True
+        return isinstance(self.parent, serializers.ListSerializer) and self.parent.parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_sparse_root():
+            return fields
+
+        wanted, omit = requested_fields(self.context.get('request'))
+        if wanted is None and not omit:
+            return fields
+
+        for name in list(fields):
+            if (wanted is not None and name not in wanted) or name in omit:
+                fields.pop(name)
+        return fields
+
+
+class QueryPlan:
+    def __init__(self):
+        # Column names per select_related prefix ('' is the queryset's own model);
+        # None means every column of that model has to be loaded
+        self.columns = {'': set()}
+        self.models = {}
+        self.root_model = None
+        self.select_related = set()
+        self.prefetch_related = set()
+        # Reverse one-to-one prefix: (prefix of the row it came from, name of the field pointing back)
+        self.back = {}
+
+    def add_column(self, prefix, name):
+        if self.columns.get(prefix, set()) is not None:
+            self.columns.setdefault(prefix, set()).add(name)
+
+    def load_all(self, prefix):
+        self.columns[prefix] = None
+
+    def only_fields(self):
+        """Arguments for ``.only()``, or None when the base model must be loaded in full"""
+        if self.columns[''] is None:
+            return None
+        only = []
+        for prefix, columns in self.columns.items():
+            if columns is None:
+                # Spell out every column: a restricted relation further down
+                # the path would otherwise defer this model's columns as well
+                columns = [field.name for field in self.models[prefix]._meta.concrete_fields]
+            only.extend(_join(prefix, column) for column in columns)
+        return only
+
+
+def _join(prefix, name):
+    return f'{prefix}__{name}' if prefix else name
+
+
+def plan_path(plan, model, parts, prefix='', nested=None, prefetch=False):
+    """Add the columns and relations needed to read ``parts`` (a source path) from ``model``"""
+    parent_prefix, back_name = plan.back.get(prefix, (None, None))
+    if not prefetch and parts[0] == back_name:
+        # Back to the row this one was selected from, which Django sets as the related object
+        parent_model = plan.models.get(parent_prefix) if parent_prefix else plan.root_model
+        if len(parts) > 1:
+            plan_path(plan, parent_model, parts[1:], parent_prefix, nested)
+        elif nested is not None:
+            plan_serializer(plan, nested, parent_prefix)
+        return
+
+    try:
+        field = model._meta.get_field(parts[0])
+    except FieldDoesNotExist:
+        # Property or method: cannot tell what it reads
+        if not prefetch:
+            plan.load_all(prefix)
+        return
+
+    path = _join(prefix, field.name)
+    if not field.is_relation:
+        if not prefetch:
+            plan.add_column(prefix, field.name)
+        return
+
+    if len(parts) == 1 and nested is None and field.concrete:
+        # Foreign key rendered as its id
+        if not prefetch:
+            plan.add_column(prefix, field.name)
+        return
+
+    related_model = field.related_model
+    if prefetch or field.many_to_many or field.one_to_many:
+        plan.prefetch_related.add(path)
+        if not prefetch and field.many_to_one:
+            # The foreign key value is needed to match the prefetched rows
+            plan.add_column(prefix, field.name)
+        child_prefetch = True
+    else:
+        plan.select_related.add(path)
+        plan.models[path] = related_model
+        if not prefetch:
+            plan.add_column(prefix, field.name)
+            plan.columns.setdefault(path, set())
+            if field.one_to_one and not field.concrete:
+                plan.back[path] = (prefix, field.field.name)
+                plan.add_column(path, field.field.name)
+        child_prefetch = False
+
+    if len(parts) > 1:
+        plan_path(plan, related_model, parts[1:], path, nested, child_prefetch)
+    elif nested is not None:
+        plan_serializer(plan, nested, path, child_prefetch)
+    elif not child_prefetch:
+        # Related object rendered by itself (e.g. a reverse one-to-one as its pk)
+        plan.load_all(path)
+
+
+def plan_serializer(plan, serializer, prefix='', prefetch=False):
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if not isinstance(serializer, serializers.ModelSerializer):
+        if not prefetch:
+            plan.load_all(prefix)
+        return
+
+    model = serializer.Meta.model
+    if not prefix:
+        plan.root_model = model
+    sources = getattr(serializer.Meta, 'sparse_sources', {})
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in sources:
+            for source in sources[name]:
+                plan_path(plan, model, source.split('__'), prefix, prefetch=prefetch)
+            continue
+        if field.source == '*':
+            if not prefetch:
+                plan.load_all(prefix)
+            continue
+        nested = field if isinstance(field, serializers.BaseSerializer) else None
+        plan_path(plan, model, field.source.split('.'), prefix, nested, prefetch)
+
+
+def prune_queryset(queryset, serializer, always=(), prefetch_querysets=None):
+    """
+    Restrict ``queryset`` to the columns and relations ``serializer`` will
+    read. ``prefetch_querysets`` maps prefetch lookups to the queryset to
+    prefetch them with (ordering, nested ``select_related``).
+    """
+    plan = QueryPlan()
+    plan_serializer(plan, serializer)
+
+    if plan.select_related:
+        queryset = queryset.select_related(*sorted(plan.select_related))
+    if plan.prefetch_related:
+        prefetch_querysets = prefetch_querysets or {}
+        queryset = queryset.prefetch_related(*(
+            Prefetch(lookup, queryset=prefetch_querysets[lookup]) if lookup in prefetch_querysets else lookup
+            # Sorted, so a lookup's parent is always prefetched before it
+            for lookup in sorted(plan.prefetch_related)
+        ))
+
+    only = plan.only_fields()
+    if only is not None:
+        queryset = queryset.only(*always, *only)
+    return queryset
+
+
+class SparseQuerysetMixin:
+    """
+    View mixin that plans the queryset of read actions from the (sparse)
+    serializer. ``sparse_always_load`` lists columns the view itself needs,
+    such as the ordering used by its paginator, and ``sparse_prefetch``
+    the querysets to use for prefetched relations.
+    """
+    sparse_actions = ('list', 'retrieve')
+    sparse_always_load = ()
+    sparse_prefetch = {}
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in self.sparse_actions:
+            queryset = prune_queryset(
+                queryset, self.get_serializer(), self.sparse_always_load, self.sparse_prefetch
+            )
+        return queryset
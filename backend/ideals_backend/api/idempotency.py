@@ -0,0 +1,176 @@
+"""
+Idempotency-Key support for non-idempotent POST endpoints.
+
+The first request with a given key (per user and endpoint) claims the key by
+inserting an ``IdempotencyKey`` row, runs the view, and stores the response.
+A retry with the same key and the same body gets the stored response back
+without running the view again; the same key with a different body is
+rejected with 422, and a retry that arrives while the first request is
+still running gets 409.
+
+The claim is committed on its own before the view runs. By default the view
+then runs in the same transaction that records its response, so a process
+that dies halfway leaves neither the view's writes nor a stored response
+behind, and a retry after ``IDEMPOTENCY_LOCK_TIMEOUT`` can safely run the
+view again. Views that call an external service pass ``atomic=False``: they
+run outside any transaction, so the database write lock is not held across
+the network round-trip, and the response is stored once the view returns.
+Their side effects outside the database cannot be rolled back, so a process
+that dies between the call and storing the response lets a later retry
+repeat the call. Only final outcomes are stored: successes and the client
+errors in ``FINAL_STATUSES`` (validation errors, unknown objects). Anything
+else (5xx, exceptions, 409 for stock that ran out, ...) releases the key so
+the client can retry. Stored keys expire after ``IDEMPOTENCY_KEY_TTL`` seconds and are deleted by
+``manage.py purge_idempotency_keys``.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# Client errors that a retry of the same request would get again
+FINAL_STATUSES = (400, 404, 422)
+
+
+def get_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def get_lock_timeout():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+
+def request_hash(request):
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def request_owner(request):
+    user = getattr(request, 'user', None)
+    return str(user.pk) if user is not None and user.is_authenticated else ''
+
+
+def _claim(owner, scope, key, body_hash):
+    """Insert the key row; returns ``(record, created)``"""
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                owner=owner, scope=scope, key=key, request_hash=body_hash, expires_at=now + get_ttl()
+            ), True
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.filter(owner=owner, scope=scope, key=key).first()
+    if record is None:
+        # Purged between our insert and our read
+        return _claim(owner, scope, key, body_hash)
+
+    if record.expires_at <= now:
+        IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+        return _claim(owner, scope, key, body_hash)
+
+    if record.response_status is None and record.created_at <= now - get_lock_timeout():
+        # The first attempt died without recording anything: take the key over
+        taken = IdempotencyKey.objects.filter(
+            pk=record.pk, response_status__isnull=True, created_at=record.created_at
+        ).update(created_at=now, request_hash=body_hash, expires_at=now + get_ttl())
+        if taken:
+            record.request_hash = body_hash
+            return record, True
+    return record, False
+
+
+def is_final(response):
+    return 200 <= response.status_code < 300 or response.status_code in FINAL_STATUSES
+
+
+def store_response(record, response):
+    IdempotencyKey.objects.filter(pk=record.pk).update(
+        response_status=response.status_code,
+        response_body=json.loads(json.dumps(response.data, cls=DjangoJSONEncoder)),
+    )
+
+
+def idempotent(scope, atomic=True):
+    """
+    Decorate a view method so requests carrying an ``Idempotency-Key`` header run once.
+
+    With ``atomic=False`` the view runs outside a transaction and its response is
+    stored afterwards; use it for views that wait on an external service.
+    """
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view_method(self, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response({
+                    'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            body_hash = request_hash(request)
+            record, created = _claim(request_owner(request), scope, key, body_hash)
+
+            if not created:
+                if record.request_hash != body_hash:
+                    return Response({
+                        'error': f'{HEADER} was already used with a different request'
+                    }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                if record.response_status is None:
+                    return Response({
+                        'error': f'A request with this {HEADER} is still being processed'
+                    }, status=status.HTTP_409_CONFLICT)
+                response = Response(record.response_body, status=record.response_status)
+                response['Idempotent-Replayed'] = 'true'
+                return response
+
+            try:
+                if atomic:
+                    # The response is recorded in the view's own transaction
+                    with transaction.atomic():
+                        response = view_method(self, request, *args, **kwargs)
+                        final = is_final(response)
+                        if final:
+                            store_response(record, response)
+                else:
+                    response = view_method(self, request, *args, **kwargs)
+                    final = is_final(response)
+                    if final:
+                        store_response(record, response)
+            except Exception:
+                record.delete()
+                raise
+
+            if not final:
+                record.delete()
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired(batch_size=1000):
+    """Delete expired keys in batches; returns the number deleted"""
+    deleted = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
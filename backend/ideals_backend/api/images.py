@@ -0,0 +1,306 @@
+"""
+Product image derivative pipeline.
+
+Original images referenced by ``Product.images`` are fetched (or read from
+MEDIA_ROOT when they already live there), hashed, and resized with Pillow
+into a fixed set of widths in WebP and JPEG. Derivatives are stored under
+``MEDIA_ROOT/products/derived/`` named by content hash, so the same picture
+used by several products or URLs is only processed once. The resulting
+srcset structure is written to ``Product.image_variants`` keyed by the
+original URL, which ``ProductListSerializer`` returns to the clients.
+
+Remote originals are only fetched over http and https, and only from hosts
+that resolve to public addresses. The check is made on every connection,
+redirects included, so no URL can point the fetch at loopback, private or
+link-local hosts.
+
+Pillow is optional: without it the pipeline does nothing and the serializers
+fall back to the original URLs.
+"""
+import hashlib
+import http.client
+import io
+import ipaddress
+import logging
+import socket
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+from .models import ImageAsset, Product
+from .catalog_cache import bump_version_on_commit
+
+
+logger = logging.getLogger(__name__)
+
+DERIVED_DIR = 'products/derived'
+FORMAT_EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+_executor = None
+
+
+def get_widths():
+    return sorted(getattr(settings, 'PRODUCT_IMAGE_WIDTHS', [160, 320, 640, 1024]))
+
+
+def get_formats():
+    return list(getattr(settings, 'PRODUCT_IMAGE_FORMATS', ['webp', 'jpeg']))
+
+
+def pillow_available():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def url_hash(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+FETCH_SCHEMES = ('http', 'https')
+
+
+def is_public_address(address):
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def create_public_connection(address, timeout, source_address=None):
+    """
+    ``socket.create_connection`` for hosts that resolve to public addresses
+    only. It connects to the addresses it checked, so a second DNS answer
+    cannot swap in another one.
+    """
+    host, port = address
+    addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    for ip in addresses:
+        if not is_public_address(ip):
+            raise ValueError(f'Refusing to fetch an image from {host} ({ip}): not a public address')
+
+    error = None
+    for ip in addresses:
+        try:
+            return socket.create_connection((ip, port), timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = create_public_connection
+
+
+class PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = create_public_connection
+
+
+class PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(PublicHTTPConnection, req)
+
+
+class PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(PublicHTTPSConnection, req, context=self._context)
+
+
+def build_opener():
+    """An opener for http and https only, without proxies, that connects to public addresses only"""
+    opener = urllib.request.OpenerDirector()
+    for handler in (
+        urllib.request.ProxyHandler({}), urllib.request.UnknownHandler(), urllib.request.HTTPDefaultErrorHandler(),
+        urllib.request.HTTPRedirectHandler(), urllib.request.HTTPErrorProcessor(),
+        PublicHTTPHandler(), PublicHTTPSHandler(),
+    ):
+        opener.add_handler(handler)
+    return opener
+
+
+def fetch_original(url):
+    """Return the original image bytes for a product image URL"""
+    media_url = settings.MEDIA_URL
+    if url.startswith(media_url):
+        with default_storage.open(url[len(media_url):], 'rb') as f:
+            return f.read()
+
+    if urllib.parse.urlsplit(url).scheme.lower() not in FETCH_SCHEMES:
+        raise ValueError(f'Only {" and ".join(FETCH_SCHEMES)} image URLs can be fetched')
+
+    max_bytes = getattr(settings, 'PRODUCT_IMAGE_MAX_BYTES', 25 * 1024 * 1024)
+    timeout = getattr(settings, 'PRODUCT_IMAGE_FETCH_TIMEOUT', 15)
+    request = urllib.request.Request(url, headers={'User-Agent': 'ideals-image-pipeline'})
+    with build_opener().open(request, timeout=timeout) as response:
+        data = response.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ValueError(f'Image larger than {max_bytes} bytes')
+    return data
+
+
+def build_variants(data, content_hash):
+    """Resize ``data`` into every configured width/format and store the files"""
+    from PIL import Image, ImageOps
+
+    quality = getattr(settings, 'PRODUCT_IMAGE_QUALITY', 80)
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    width, height = image.size
+
+    # Never upscale: widths above the original collapse into the original width
+    widths = sorted({min(w, width) for w in get_widths()})
+    variants = {}
+    for image_format in get_formats():
+        extension = FORMAT_EXTENSIONS[image_format]
+        entries = []
+        for target in widths:
+            name = f'{DERIVED_DIR}/{content_hash[:2]}/{content_hash}-{target}.{extension}'
+            if not default_storage.exists(name):
+                resized = image
+                if target < width:
+                    resized = image.resize((target, max(1, round(height * target / width))), Image.LANCZOS)
+                if image_format == 'jpeg' and resized.mode not in ('RGB', 'L'):
+                    resized = resized.convert('RGB')
+                buffer = io.BytesIO()
+                resized.save(buffer, format=image_format.upper(), quality=quality, optimize=True)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+            entries.append({'url': default_storage.url(name), 'width': target})
+        variants[image_format] = entries
+
+    return width, height, variants
+
+
+def get_asset(url, refresh=False):
+    """Find or create the processed ``ImageAsset`` for an original image URL"""
+    source_hash = url_hash(url)
+    if not refresh:
+        asset = ImageAsset.objects.filter(source_url_hash=source_hash).first()
+        if asset is not None:
+            return asset
+
+    data = fetch_original(url)
+    content_hash = hashlib.sha256(data).hexdigest()
+
+    # Same bytes already processed under another URL: reuse its derivatives
+    twin = ImageAsset.objects.filter(content_hash=content_hash).first()
+    if twin is not None and not refresh:
+        width, height, variants = twin.width, twin.height, twin.variants
+    else:
+        width, height, variants = build_variants(data, content_hash)
+
+    asset, _ = ImageAsset.objects.update_or_create(
+        source_url_hash=source_hash,
+        defaults={
+            'source_url': url,
+            'content_hash': content_hash,
+            'width': width,
+            'height': height,
+            'variants': variants,
+        }
+    )
+    return asset
+
+
+def srcset_entry(asset):
+    return {
+        'width': asset.width,
+        'height': asset.height,
+        'variants': asset.variants,
+    }
+
+
+def build_image_set(images, image_variants, absolute_uri=None):
+    """
+    srcset-style description of a product's images for the API: the
+    largest JPEG as ``src``, the smallest as ``thumbnail`` and one srcset
+    string per format. Unprocessed images fall back to their original URL.
+    """
+    absolute_uri = absolute_uri or (lambda url: url)
+    image_set = []
+    for url in images or []:
+        entry = (image_variants or {}).get(url)
+        if not entry or not entry.get('variants'):
+            image_set.append({'src': url, 'thumbnail': url, 'srcset': {}})
+            continue
+        variants = entry['variants']
+        fallback = variants.get('jpeg') or next(iter(variants.values()))
+        image_set.append({
+            'src': absolute_uri(fallback[-1]['url']),
+            'thumbnail': absolute_uri(fallback[0]['url']),
+            'width': entry['width'],
+            'height': entry['height'],
+            'srcset': {
+                image_format: ', '.join(f"{absolute_uri(v['url'])} {v['width']}w" for v in candidates)
+                for image_format, candidates in variants.items()
+            },
+        })
+    return image_set
+
+
+def process_product_images(product_id, refresh=False):
+    """Generate derivatives for every image of a product and store the srcset map"""
+    if not pillow_available():
+        logger.warning('Pillow is not installed, skipping image processing for product %s', product_id)
+        return None
+
+    product = Product.objects.filter(pk=product_id).only('id', 'images', 'image_variants').first()
+    if product is None:
+        return None
+
+    image_variants = {}
+    for url in product.images or []:
+        if not refresh and url in product.image_variants:
+            image_variants[url] = product.image_variants[url]
+            continue
+        try:
+            image_variants[url] = srcset_entry(get_asset(url, refresh=refresh))
+        except Exception as e:
+            logger.warning('Failed to process image %s for product %s: %s', url, product_id, e)
+
+    if image_variants != product.image_variants:
+        with transaction.atomic():
+            # Plain UPDATE: no save signals, so this does not re-trigger processing
+            Product.objects.filter(pk=product_id).update(image_variants=image_variants)
+            bump_version_on_commit()
+    return image_variants
+
+
+def needs_processing(product):
+    variants = product.image_variants or {}
+    return any(url not in variants for url in product.images or [])
+
+
+def _run_in_background(product_id):
+    try:
+        process_product_images(product_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_product_images(product_id):
+    """Process a product's images once the current transaction commits"""
+    if not getattr(settings, 'PRODUCT_IMAGE_PIPELINE_ENABLED', True) or not pillow_available():
+        return
+
+    def run():
+        global _executor
+        if getattr(settings, 'PRODUCT_IMAGE_ASYNC', True):
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='product-images')
+            _executor.submit(_run_in_background, product_id)
+        else:
+            process_product_images(product_id)
+
+    transaction.on_commit(run)
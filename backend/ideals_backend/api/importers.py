@@ -0,0 +1,377 @@
+"""
+Streaming bulk import (upsert) of products from CSV or JSONL.
+
+Rows are read lazily and processed in fixed-size chunks. Each chunk resolves
+its existing products with one query (by SKU or brand+model+color), then
+writes new rows with ``bulk_create`` and changed rows with batched prepared
+UPDATEs inside its own transaction. Invalid rows are reported with their line number and skipped;
+they never abort the rest of the import. Values are checked against the
+model's field limits before writing, and if a chunk's bulk write still fails
+at the database (a unique SKU taken in the meantime, ...) the chunk is
+written again product by product, each in its own savepoint, so only the
+offending rows are reported. Chunks commit as they go, so an upload is
+decoded once up front (``check_encoding``) and a file that is not UTF-8 is
+refused before any row is written.
+"""
+import codecs
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Category, Product
+from . import search
+from .catalog_cache import bump_version_on_commit
+from .inventory import refresh_low_stock
+
+
+IMPORT_FIELDS = (
+    'sku', 'name', 'description', 'price', 'wholesale_price', 'category', 'stock',
+    'is_active', 'brand', 'model', 'color', 'images',
+)
+MAX_REPORTED_ERRORS = 1000
+MAX_INTEGER = 2147483647  # PositiveIntegerField's range on every supported database
+ENCODING = 'utf-8-sig'
+
+
+class RowError(Exception):
+    pass
+
+
+class ImportResult:
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def check_encoding(stream, chunk_size=64 * 1024):
+    """Decode a binary stream to the end and rewind it; raises ``UnicodeDecodeError``"""
+    decoder = codecs.getincrementaldecoder(ENCODING)()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        decoder.decode(chunk)
+    decoder.decode(b'', final=True)
+    stream.seek(0)
+
+
+def iter_csv_rows(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        # DictReader line_num is the physical line the row ended on
+        yield reader.line_num, row
+
+
+def iter_jsonl_rows(stream):
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, RowError(f'Invalid JSON: {e}')
+            continue
+        if not isinstance(row, dict):
+            yield line_number, RowError('Each line must be a JSON object')
+            continue
+        yield line_number, row
+
+
+def iter_rows(lines, file_format):
+    """Iterate ``(line_number, row)`` pairs from an iterable of text lines"""
+    if file_format == 'csv':
+        return iter_csv_rows(lines)
+    if file_format == 'jsonl':
+        return iter_jsonl_rows(lines)
+    raise ValueError(f'Unsupported import format: {file_format}')
+
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+def _text(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def _decimal(value, field):
+    value = _text(value)
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise RowError(f'{field} must be a number')
+    if not number.is_finite():
+        raise RowError(f'{field} must be a number')
+    if number < 0:
+        raise RowError(f'{field} cannot be negative')
+    model_field = Product._meta.get_field(field)
+    integer_digits = model_field.max_digits - model_field.decimal_places
+    if number and number.adjusted() >= integer_digits:
+        raise RowError(f'{field} must be less than {10 ** integer_digits}')
+    return number.quantize(Decimal(1).scaleb(-model_field.decimal_places))
+
+
+def _int(value, field):
+    value = _text(value)
+    try:
+        number = int(value)
+    except ValueError:
+        raise RowError(f'{field} must be an integer')
+    if number < 0:
+        raise RowError(f'{field} cannot be negative')
+    if number > MAX_INTEGER:
+        raise RowError(f'{field} must be at most {MAX_INTEGER}')
+    return number
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    return _text(value).lower() in ('1', 'true', 'yes', 'y', 'active')
+
+
+def _images(value):
+    if isinstance(value, list):
+        return [_text(url) for url in value if _text(url)]
+    return [url.strip() for url in _text(value).split('|') if url.strip()]
+
+
+def clean_row(row, categories):
+    """
+    Convert a raw input row to model field values. Blank or missing cells are
+    left out, so they keep their current value on update (or the model
+    default on create).
+    """
+    data = {}
+    for field in IMPORT_FIELDS:
+        value = row.get(field)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        if field in ('price', 'wholesale_price'):
+            data[field] = _decimal(value, field)
+        elif field == 'stock':
+            data[field] = _int(value, field)
+        elif field == 'is_active':
+            data[field] = _bool(value)
+        elif field == 'images':
+            data[field] = _images(value)
+        elif field == 'category':
+            key = _text(value)
+            category_id = categories.get(key) or categories.get(key.lower())
+            if category_id is None:
+                raise RowError(f'Unknown category: {key}')
+            data['category_id'] = category_id
+        else:
+            text = _text(value)
+            max_length = Product._meta.get_field(field).max_length
+            if max_length and len(text) > max_length:
+                raise RowError(f'{field} must be at most {max_length} characters')
+            data[field] = text
+    return data
+
+
+def natural_key(data):
+    if data.get('sku'):
+        return ('sku', data['sku'])
+    if data.get('brand') and data.get('model'):
+        return ('bmc', data['brand'], data['model'], data.get('color', ''))
+    return None
+
+
+def _load_categories():
+    categories = {}
+    for category_id, name in Category.objects.values_list('id', 'name'):
+        categories[str(category_id)] = category_id
+        categories.setdefault(name.lower(), category_id)
+    return categories
+
+
+def _fetch_existing(keys):
+    skus = [key[1] for key in keys if key[0] == 'sku']
+    triples = [key[1:] for key in keys if key[0] == 'bmc']
+
+    condition = Q()
+    if skus:
+        condition |= Q(sku__in=skus)
+    if triples:
+        condition |= Q(brand__in={t[0] for t in triples}, model__in={t[1] for t in triples})
+    if not condition:
+        return {}
+
+    existing = {}
+    wanted = set(keys)
+    for product in Product.objects.filter(condition):
+        for key in (('sku', product.sku), ('bmc', product.brand, product.model, product.color)):
+            if key in wanted:
+                existing.setdefault(key, product)
+    return existing
+
+
+def _bulk_update(changes):
+    """
+    Write ``(product, changed_fields)`` pairs with one prepared UPDATE per
+    distinct field set, executed with ``executemany``. ``bulk_update``'s
+    CASE WHEN statements degrade quadratically with batch size on SQLite,
+    where the parameter limit forces tiny batches.
+    """
+    groups = {}
+    for product, fields in changes:
+        groups.setdefault(tuple(sorted(fields)) + ('updated_at',), []).append(product)
+
+    qn = connection.ops.quote_name
+    table = qn(Product._meta.db_table)
+    with connection.cursor() as cursor:
+        for names, products in groups.items():
+            model_fields = [Product._meta.get_field(name) for name in names]
+            sql = 'UPDATE %s SET %s WHERE %s = %%s' % (
+                table,
+                ', '.join('%s = %%s' % qn(field.column) for field in model_fields),
+                qn(Product._meta.pk.column),
+            )
+            cursor.executemany(sql, [
+                [field.get_db_prep_save(getattr(product, field.attname), connection) for field in model_fields]
+                + [product.pk]
+                for product in products
+            ])
+
+
+def _write(created, changes):
+    if created:
+        Product.objects.bulk_create(created)
+    _bulk_update(changes)
+
+
+def _write_one_by_one(created, changes, lines, result):
+    """Write each product in its own savepoint; returns the created and updated products that were saved"""
+    saved_created, saved_updated = [], []
+    for product, fields in [(product, None) for product in created] + changes:
+        if fields is None:
+            # bulk_create may have assigned a primary key before the chunk was rolled back
+            product.pk = None
+            product._state.adding = True
+        try:
+            with transaction.atomic():
+                _write([product] if fields is None else [], [] if fields is None else [(product, fields)])
+        except DatabaseError as e:
+            for line in lines[id(product)]:
+                result.add_error(line, f'Could not be saved: {e}')
+            continue
+        (saved_created if fields is None else saved_updated).append(product)
+    return saved_created, saved_updated
+
+
+def _apply_chunk(chunk, result):
+    keys = [key for _, key, _ in chunk if key is not None]
+    existing = _fetch_existing(keys)
+
+    to_create = {}
+    new_rows = []
+    to_update = {}
+    lines = {}
+    now = timezone.now()
+
+    for line, key, data in chunk:
+        product = existing.get(key) if key is not None else None
+        if product is None and key is not None:
+            product = to_create.get(key)
+
+        if product is not None:
+            lines.setdefault(id(product), []).append(line)
+            for field, value in data.items():
+                setattr(product, field, value)
+            if product.pk:
+                product.updated_at = now
+                fields = to_update.setdefault(product.pk, (product, set()))[1]
+                fields.update(data)
+            continue
+
+        missing = [field for field in ('name', 'price', 'category_id') if field not in data]
+        if missing:
+            result.add_error(line, 'Missing required fields for a new product: %s' % ', '.join(
+                'category' if field == 'category_id' else field for field in missing
+            ))
+            continue
+        product = Product(**data)
+        lines[id(product)] = [line]
+        if key is not None:
+            to_create[key] = product
+        else:
+            new_rows.append(product)
+
+    created = list(to_create.values()) + new_rows
+    changes = list(to_update.values())
+    updated = [product for product, _ in changes]
+    try:
+        with transaction.atomic():
+            _write(created, changes)
+            search.index_products(created + updated)
+            refresh_low_stock(Product.objects.filter(pk__in=[product.pk for product in created + updated]))
+    except DatabaseError:
+        created, updated = _write_one_by_one(created, changes, lines, result)
+        with transaction.atomic():
+            search.index_products(created + updated)
+            refresh_low_stock(Product.objects.filter(pk__in=[product.pk for product in created + updated]))
+
+    result.created += len(created)
+    result.updated += len(updated)
+
+
+def import_products(rows, batch_size=1000):
+    """
+    Upsert products from an iterable of ``(line_number, row)`` pairs.
+
+    Existing products are matched on ``sku`` when given, otherwise on
+    brand+model+color. Returns an ``ImportResult``.
+    """
+    result = ImportResult()
+    categories = _load_categories()
+    chunk = []
+
+    for line, row in rows:
+        result.processed += 1
+        if isinstance(row, RowError):
+            result.add_error(line, str(row))
+            continue
+        try:
+            data = clean_row(row, categories)
+        except RowError as e:
+            result.add_error(line, str(e))
+            continue
+        chunk.append((line, natural_key(data), data))
+        if len(chunk) >= batch_size:
+            _apply_chunk(chunk, result)
+            chunk = []
+
+    if chunk:
+        _apply_chunk(chunk, result)
+
+    if result.created or result.updated:
+        bump_version_on_commit()
+    return result
@@ -0,0 +1,152 @@
+"""
+Set-based price and stock maintenance for products, and the low-stock index.
+
+``Product.is_low_stock`` is kept up to date whenever stock or a reorder
+threshold changes (single saves through signals, bulk paths through
+``refresh_low_stock``), and every flip of the flag is appended to
+``StockAlert`` so the admin UI can poll for new alerts with a cursor
+instead of scanning the product table.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import Product, StockAlert
+from .catalog_cache import bump_version_on_commit
+
+
+BULK_UPDATE_FIELDS = ('price', 'wholesale_price', 'stock', 'is_active')
+
+
+def _batches(entries):
+    """Split entries so each CASE-based UPDATE stays under the backend's parameter limit"""
+    max_params = connection.features.max_query_params
+    if not max_params:
+        yield entries
+        return
+    # Each row costs two parameters per CASE branch plus one in the IN () list
+    per_row = 2 * len(BULK_UPDATE_FIELDS) + 1
+    size = max(1, (max_params - 1) // per_row)
+    for start in range(0, len(entries), size):
+        yield entries[start:start + size]
+
+
+def bulk_update_products(entries):
+    """
+    Apply many ``{id, price, wholesale_price, stock, is_active,
+    expected_updated_at}`` entries in one transaction.
+
+    Every entry must carry ``expected_updated_at``. Rows are locked and
+    checked against it first; rows whose ``updated_at`` has moved are
+    reported as conflicts and left untouched. Accepted rows are written with one UPDATE per batch, each
+    field set through a CASE over the primary key.
+
+    Returns ``(updated_ids, conflicts, updated_at)``.
+    """
+    # The last entry wins when an id is repeated
+    by_id = {}
+    for entry in entries:
+        by_id[entry['id']] = entry
+
+    now = timezone.now()
+    conflicts = []
+    accepted = []
+
+    with transaction.atomic():
+        current = dict(
+            Product.objects.select_for_update()
+            .filter(pk__in=list(by_id))
+            .values_list('id', 'updated_at')
+        )
+        for pk, entry in by_id.items():
+            if pk not in current:
+                conflicts.append({'id': pk, 'reason': 'not_found'})
+                continue
+            if entry['expected_updated_at'] != current[pk]:
+                conflicts.append({
+                    'id': pk,
+                    'reason': 'modified',
+                    'current_updated_at': current[pk],
+                })
+                continue
+            accepted.append(entry)
+
+        for batch in _batches(accepted):
+            updates = {}
+            for field in BULK_UPDATE_FIELDS:
+                whens = [
+                    When(pk=entry['id'], then=Value(entry[field]))
+                    for entry in batch if field in entry
+                ]
+                if whens:
+                    updates[field] = Case(
+                        *whens,
+                        default=F(field),
+                        output_field=Product._meta.get_field(field)
+                    )
+            Product.objects.filter(pk__in=[entry['id'] for entry in batch]).update(updated_at=now, **updates)
+
+        if accepted:
+            stock_changed = [entry['id'] for entry in accepted if 'stock' in entry]
+            if stock_changed:
+                refresh_low_stock(Product.objects.filter(pk__in=stock_changed))
+            bump_version_on_commit()
+
+    return [entry['id'] for entry in accepted], conflicts, now
+
+
+def default_threshold():
+    return getattr(settings, 'DEFAULT_REORDER_THRESHOLD', 10)
+
+
+def resolve_threshold(product_threshold, category_threshold):
+    if product_threshold is not None:
+        return product_threshold
+    if category_threshold is not None:
+        return category_threshold
+    return default_threshold()
+
+
+def effective_threshold(product):
+    """Reorder threshold for a product: its own, else its category's, else the default"""
+    category_threshold = product.category.reorder_threshold if product.category_id else None
+    return resolve_threshold(product.reorder_threshold, category_threshold)
+
+
+def make_alert(product_id, is_low, stock, threshold):
+    return StockAlert(
+        product_id=product_id,
+        alert_type='low_stock' if is_low else 'restocked',
+        stock=stock,
+        threshold=threshold
+    )
+
+
+def refresh_low_stock(products):
+    """
+    Recompute ``is_low_stock`` for a queryset of products after a bulk
+    change, flipping the flag with set-based UPDATEs and logging a
+    ``StockAlert`` for every product that crossed its threshold.
+    """
+    rows = products.values_list(
+        'id', 'stock', 'is_low_stock', 'reorder_threshold', 'category__reorder_threshold'
+    )
+    went_low = []
+    recovered = []
+    alerts = []
+    for pk, stock, flagged, own_threshold, category_threshold in rows.iterator(chunk_size=2000):
+        threshold = resolve_threshold(own_threshold, category_threshold)
+        is_low = stock < threshold
+        if is_low == flagged:
+            continue
+        (went_low if is_low else recovered).append(pk)
+        alerts.append(make_alert(pk, is_low, stock, threshold))
+
+    if went_low:
+        Product.objects.filter(pk__in=went_low).update(is_low_stock=True)
+    if recovered:
+        Product.objects.filter(pk__in=recovered).update(is_low_stock=False)
+    if alerts:
+        StockAlert.objects.bulk_create(alerts, batch_size=1000)
+    return len(alerts)
@@ -0,0 +1,77 @@
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api import renderers
+
+
+class Command(BaseCommand):
+    help = 'Compare JSON renderers on a synthetic order listing (no database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--orders',
+            type=int,
+            default=10000,
+            help='Number of orders in the listing (default: 10000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Renders per renderer; the best time is reported (default: 5)'
+        )
+
+    def build_orders(self, count):
+        """Rows shaped like the order list endpoint, with native Decimal/datetime/UUID values"""
+        now = timezone.now()
+        statuses = ['pending', 'payment_verified', 'dispatched', 'delivered', 'cancelled']
+        orders = []
+        for i in range(count):
+            created_at = now - timedelta(minutes=i)
+            orders.append({
+                'id': i + 1,
+                'order_number': f'ORD-{uuid.UUID(int=i).hex[:8].upper()}',
+                'customer': {'id': i % 500 + 1, 'name': f'Customer {i % 500}', 'email': f'customer{i % 500}@example.com'},
+                'total': Decimal('1499.00') + i % 100,
+                'status': statuses[i % len(statuses)],
+                'payment_status': 'verified' if i % 3 else 'pending',
+                'payment_method': ['online', 'offline', 'cod'][i % 3],
+                'advance_amount': Decimal('200.00') if i % 3 == 2 else None,
+                'shipping_city': 'Bengaluru',
+                'tracking_number': str(uuid.UUID(int=i)),
+                'created_at': created_at,
+                'updated_at': created_at,
+                'items': [
+                    {'id': i * 2 + n, 'product_name': f'Product {n}', 'quantity': n + 1, 'price': Decimal('749.50'), 'total': Decimal('749.50') * (n + 1)}
+                    for n in range(2)
+                ],
+            })
+        return {'status_code': 302, 'message': 'List of orders', 'results': orders}
+
+    def handle(self, *args, **options):
+        data = self.build_orders(options['orders'])
+        candidates = [
+            ('DRF JSONRenderer', JSONRenderer()),
+            ('FastJSONRenderer' + ('' if renderers.orjson else ' (orjson not installed)'), renderers.FastJSONRenderer()),
+            ('CompactJSONRenderer', renderers.CompactJSONRenderer()),
+        ]
+
+        self.stdout.write(f"Rendering {options['orders']} orders, best of {options['repeat']}")
+        baseline = None
+        for name, renderer in candidates:
+            best = None
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                body = renderer.render(data, renderer.media_type, {})
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            baseline = baseline or best
+            self.stdout.write(
+                f'  {name:<45} {best * 1000:8.1f} ms  {len(body) / 1024:9.1f} KiB  {baseline / best:5.1f}x'
+            )
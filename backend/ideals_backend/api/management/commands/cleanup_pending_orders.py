@@ -1,18 +1,36 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
-from api.models import Order
+from api import cleanup
 
 
 class Command(BaseCommand):
-    help = 'Clean up old pending orders (older than 1 hour)'
+    help = 'Clean up old pending orders in batches (the scheduler also runs this periodically)'
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--hours',
             type=int,
-            default=1,
-            help='Number of hours after which to consider orders as old (default: 1)'
+            default=None,
+            help='Number of hours after which to consider orders as old (default: ORDER_CLEANUP_AGE_HOURS)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Number of orders to delete per transaction (default: ORDER_CLEANUP_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=None,
+            help='Seconds to sleep between batches (default: ORDER_CLEANUP_BATCH_PAUSE)'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help='Stop after this many batches; the next run resumes where this one stopped'
         )
         parser.add_argument(
             '--dry-run',
@@ -21,40 +39,38 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
-        hours = options['hours']
-        dry_run = options['dry_run']
-        
-        cutoff_time = timezone.now() - timedelta(hours=hours)
-        old_pending_orders = Order.objects.filter(
-            status='pending',
-            payment_status='pending',
-            created_at__lt=cutoff_time
-        )
-        
-        count = old_pending_orders.count()
-        
-        if dry_run:
+        hours = options['hours'] if options['hours'] is not None else cleanup.get_age_hours()
+
+        if options['dry_run']:
+            old_pending_orders = cleanup.stale_orders(timezone.now() - timedelta(hours=hours)).order_by('id')
             self.stdout.write(
-                self.style.WARNING(
-                    f'DRY RUN: Would delete {count} pending orders older than {hours} hour(s)'
-                )
+                self.style.WARNING(f'DRY RUN: Would delete pending orders older than {hours} hour(s), e.g.:')
             )
             for order in old_pending_orders[:5]:  # Show first 5 as examples
                 self.stdout.write(f'  - Order {order.order_number} created at {order.created_at}')
-            if count > 5:
-                self.stdout.write(f'  ... and {count - 5} more')
-        else:
-            if count > 0:
-                old_pending_orders.delete()
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'Successfully deleted {count} pending orders older than {hours} hour(s)'
-                    )
-                )
-            else:
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'No pending orders older than {hours} hour(s) found'
-                    )
-                )
+            return
+
+        def report(result):
+            self.stdout.write(f'  Batch {result.batches}: {result.deleted} orders deleted so far (up to id {result.last_id})')
 
+        result = cleanup.run_cleanup_job(
+            hours=hours,
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            max_batches=options['max_batches'],
+            progress=report,
+        )
+        if result is None:
+            self.stdout.write(self.style.WARNING('Another cleanup run is in progress, nothing to do'))
+            return
+
+        if result.resumed_from:
+            self.stdout.write(f'Resumed after order id {result.resumed_from}')
+        summary = (
+            f'Deleted {result.deleted} pending orders older than {hours} hour(s) '
+            f'in {result.batches} batch(es), {result.elapsed:.1f}s ({result.rate:.1f} orders/s)'
+        )
+        if result.finished:
+            self.stdout.write(self.style.SUCCESS(summary))
+        else:
+            self.stdout.write(self.style.WARNING(f'{summary}; stopped early, run again to continue'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from api import customer_analytics
+
+
+class Command(BaseCommand):
+    help = 'Compute customer cohort retention and lifetime values (the scheduler also runs this periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Number of orders loaded per query (default: CUSTOMER_ANALYTICS_CHUNK_SIZE)'
+        )
+        parser.add_argument(
+            '--reorder-days',
+            type=int,
+            default=None,
+            help='Window for the per-cohort reorder rate (default: CUSTOMER_ANALYTICS_REORDER_DAYS)'
+        )
+
+    def handle(self, *args, **options):
+        def report(orders):
+            self.stdout.write(f'  {orders} orders read')
+
+        result = customer_analytics.run_customer_analytics_job(
+            chunk_size=options['chunk_size'],
+            reorder_days=options['reorder_days'],
+            progress=report,
+        )
+        if result is None:
+            self.stdout.write(self.style.WARNING('Another customer analytics run is in progress, nothing to do'))
+            return
+
+        summary = result.summary
+        self.stdout.write(self.style.SUCCESS(
+            f"Computed analytics for {summary['customers']} customers and {summary['orders']} orders "
+            f"in {summary['elapsed_seconds']:.1f}s ({summary['engine']})"
+        ))
@@ -0,0 +1,45 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from api.importers import detect_format, import_products, iter_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk create or update products from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to a .csv or .jsonl file')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Input format (default: detected from the file extension)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows written per transaction (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+        if file_format is None:
+            raise CommandError('Cannot detect the file format, pass --format csv or --format jsonl')
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+
+        with open(path, encoding='utf-8-sig', newline='') as stream:
+            result = import_products(iter_rows(stream, file_format), batch_size=options['batch_size'])
+
+        for error in result.errors:
+            self.stdout.write(self.style.WARNING(f"  Line {error['line']}: {error['error']}"))
+        if result.failed > len(result.errors):
+            self.stdout.write(f'  ... and {result.failed - len(result.errors)} more errors')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Processed {result.processed} rows: {result.created} created, '
+                f'{result.updated} updated, {result.failed} failed'
+            )
+        )
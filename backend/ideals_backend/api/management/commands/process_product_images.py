@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Product
+from api.images import needs_processing, pillow_available, process_product_images
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnails and responsive variants for product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Re-fetch and re-process images that already have variants'
+        )
+        parser.add_argument(
+            '--product',
+            type=int,
+            action='append',
+            help='Only process the given product id (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        if not pillow_available():
+            raise CommandError('Pillow is required for image processing (pip install Pillow)')
+
+        refresh = options['refresh']
+        products = Product.objects.order_by('id').only('id', 'images', 'image_variants')
+        if options['product']:
+            products = products.filter(id__in=options['product'])
+
+        processed = 0
+        for product in products.iterator(chunk_size=500):
+            if not refresh and not needs_processing(product):
+                continue
+            variants = process_product_images(product.id, refresh=refresh) or {}
+            processed += 1
+            self.stdout.write(f'  Product {product.id}: {len(variants)}/{len(product.images)} images processed')
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully processed images for {processed} products'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from api.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of keys to delete per query (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        deleted = purge_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api import product_sales, rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily and per-product sales rollups behind the dashboard from the order history'
+
+    def handle(self, *args, **options):
+        count = rollups.rebuild()
+        product_count = product_sales.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully rebuilt the sales rollup ({count} rows) and the product sales rollup ({product_count} rows)'
+        ))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from api.models import Customer, Product
+from api import order_search, search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text index and the customer trigram index used by order search'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Number of rows to index per transaction (default: 2000)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if connection.vendor != 'sqlite':
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{connection.vendor} keeps its search index up to date automatically, nothing to rebuild'
+                )
+            )
+            return
+
+        search.clear_index()
+
+        indexed = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Product.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .only('id', *search.SEARCH_FIELDS)[:batch_size]
+            )
+            if not batch:
+                break
+            with transaction.atomic():
+                search.index_products(batch)
+            indexed += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'  Indexed {indexed} products')
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully indexed {indexed} products'))
+
+        order_search.clear_index()
+
+        indexed = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Customer.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .only('id', 'name', 'email')[:batch_size]
+            )
+            if not batch:
+                break
+            with transaction.atomic():
+                order_search.index_customers(batch)
+            indexed += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'  Indexed {indexed} customers')
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully indexed {indexed} customers'))
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+
+FTS_COLUMNS = 'name, brand, model, color, description'
+
+PG_DOCUMENT = (
+    "(setweight(to_tsvector('simple', coalesce(\"api_product\".\"name\", '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(\"api_product\".\"brand\", '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(\"api_product\".\"model\", '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(\"api_product\".\"color\", '')), 'C') || "
+    "setweight(to_tsvector('simple', coalesce(\"api_product\".\"description\", '')), 'D'))"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS api_product_fts USING fts5("
+            f"{FTS_COLUMNS}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        schema_editor.execute(
+            "INSERT INTO api_product_fts (api_product_fts, rank) "
+            "VALUES ('rank', 'bm25(10.0, 6.0, 6.0, 2.0, 1.0)')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO api_product_fts (rowid, {FTS_COLUMNS}) "
+            f"SELECT id, {FTS_COLUMNS} FROM api_product"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS api_product_search_idx ON api_product USING GIN ({PG_DOCUMENT})"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS api_product_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS api_product_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_product_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
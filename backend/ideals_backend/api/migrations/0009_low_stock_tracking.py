@@ -0,0 +1,50 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_low_stock(apps, schema_editor):
+    Product = apps.get_model('api', 'Product')
+    threshold = getattr(settings, 'DEFAULT_REORDER_THRESHOLD', 10)
+    Product.objects.filter(stock__lt=threshold).update(is_low_stock=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_product_sku_natural_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='reorder_threshold',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reorder_threshold',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='is_low_stock',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_low_stock', True)), fields=['id'], name='product_low_stock_idx'),
+        ),
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alert_type', models.CharField(choices=[('low_stock', 'Low Stock'), ('restocked', 'Restocked')], max_length=20)),
+                ('stock', models.PositiveIntegerField()),
+                ('threshold', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='api.product')),
+            ],
+        ),
+        migrations.RunPython(mark_low_stock, migrations.RunPython.noop),
+    ]
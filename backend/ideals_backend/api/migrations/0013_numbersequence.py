@@ -0,0 +1,43 @@
+from django.db import migrations, models
+
+
+# (sequence name, model, field, prefix) for the numbers api.numbering allocates
+SEQUENCES = [
+    ('order', 'Order', 'order_number', 'ORD'),
+    ('invoice', 'Invoice', 'invoice_number', 'INV'),
+]
+
+
+def seed_sequences(apps, schema_editor):
+    # Existing random numbers (ORD-1A2B3C4D) never match the zero-padded
+    # sequence format and stay as they are. Start after any number that
+    # already has the new format so re-running on a copied database is safe.
+    NumberSequence = apps.get_model('api', 'NumberSequence')
+    for name, model_name, field, prefix in SEQUENCES:
+        model = apps.get_model('api', model_name)
+        latest = (
+            model.objects.filter(**{f'{field}__regex': rf'^{prefix}-[0-9]{{10}}$'})
+            .order_by(f'-{field}')
+            .values_list(field, flat=True)
+            .first()
+        )
+        next_value = int(latest.split('-', 1)[1]) + 1 if latest else 1
+        NumberSequence.objects.update_or_create(name=name, defaults={'next_value': next_value})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('next_value', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
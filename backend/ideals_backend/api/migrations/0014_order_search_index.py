@@ -0,0 +1,68 @@
+import re
+
+from django.db import migrations
+
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def document_trigrams(*values):
+    # Must produce the same trigrams as api.order_search.document_trigrams
+    trigrams = set()
+    for value in values:
+        for word in WORD_RE.findall((value or '').lower()):
+            padded = f'  {word} '
+            trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def create_order_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE TABLE IF NOT EXISTS api_customer_trigram ("
+            "trigram TEXT NOT NULL, customer_id INTEGER NOT NULL, "
+            "PRIMARY KEY (trigram, customer_id)) WITHOUT ROWID"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS api_customer_trigram_customer_idx "
+            "ON api_customer_trigram (customer_id)"
+        )
+        Customer = apps.get_model('api', 'Customer')
+        rows = [
+            (trigram, pk)
+            for pk, name, email in Customer.objects.values_list('pk', 'name', 'email').iterator()
+            for trigram in document_trigrams(name, email)
+        ]
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO api_customer_trigram (trigram, customer_id) VALUES (%s, %s)", rows
+            )
+    elif vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS api_customer_name_trgm_idx ON api_customer USING GIN (name gin_trgm_ops)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS api_customer_email_trgm_idx ON api_customer USING GIN (email gin_trgm_ops)"
+        )
+
+
+def drop_order_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS api_customer_trigram")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS api_customer_name_trgm_idx")
+        schema_editor.execute("DROP INDEX IF EXISTS api_customer_email_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_numbersequence'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_order_search_index, drop_order_search_index),
+    ]
@@ -0,0 +1,23 @@
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_jobstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.BigIntegerField(db_index=True)),
+                ('order_number', models.CharField(max_length=20)),
+                ('event_type', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('shipment', 'Shipment'), ('deleted', 'Deleted')], max_length=20)),
+                ('changes', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
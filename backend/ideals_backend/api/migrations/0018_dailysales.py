@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_rollup(apps, schema_editor):
+    # Same computation as api.rollups.rebuild
+    Order = apps.get_model('api', 'Order')
+    DailySales = apps.get_model('api', 'DailySales')
+    DailySales.objects.bulk_create([
+        DailySales(
+            date=row['date'], payment_method=row['payment_method'], status=row['status'],
+            payment_status=row['payment_status'], order_count=row['order_count'],
+            revenue=row['revenue'] or Decimal('0.00'),
+        )
+        for row in Order.objects.annotate(date=TruncDate('created_at'))
+        .values('date', 'payment_method', 'status', 'payment_status')
+        .annotate(order_count=Count('id'), revenue=Sum('total'))
+        .order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_orderevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('payment_method', models.CharField(choices=[('online', 'Online Payment'), ('offline', 'Offline Payment'), ('cod', 'Cash on Delivery')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('out_for_delivery', 'Out for Delivery'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('rejected', 'Rejected')], max_length=20)),
+                ('payment_status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('verified', 'Verified'), ('failed', 'Failed'), ('rejected', 'Rejected')], max_length=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales',
+                'constraints': [models.UniqueConstraint(fields=('date', 'payment_method', 'status', 'payment_status'), name='daily_sales_bucket_unique')],
+            },
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_rollup(apps, schema_editor):
+    # Same computation as api.product_sales.rebuild
+    OrderItem = apps.get_model('api', 'OrderItem')
+    ProductDailySales = apps.get_model('api', 'ProductDailySales')
+    ProductDailySales.objects.bulk_create([
+        ProductDailySales(
+            date=row['date'], product_id=row['product_id'], units=row['units'],
+            revenue=row['revenue'] or Decimal('0.00'), order_count=row['order_count'],
+        )
+        for row in OrderItem.objects.exclude(order__status__in=('cancelled', 'rejected'))
+        .annotate(date=TruncDate('order__created_at'))
+        .values('date', 'product_id')
+        .annotate(units=Sum('quantity'), revenue=Sum('total'), order_count=Count('order_id', distinct=True))
+        .order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_dailysales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='api.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product daily sales',
+                'constraints': [models.UniqueConstraint(fields=('date', 'product'), name='product_daily_sales_unique')],
+            },
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
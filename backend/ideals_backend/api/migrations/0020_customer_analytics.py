@@ -0,0 +1,35 @@
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_productdailysales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerAnalyticsReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generated_at', models.DateTimeField(auto_now_add=True)),
+                ('summary', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('cohorts', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CustomerValue',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='value', serialize=False, to='api.customer')),
+                ('first_order_date', models.DateField()),
+                ('last_order_date', models.DateField()),
+                ('order_count', models.IntegerField()),
+                ('lifetime_value', models.DecimalField(decimal_places=2, max_digits=14)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-lifetime_value'], name='customer_value_ltv_idx')],
+            },
+        ),
+    ]
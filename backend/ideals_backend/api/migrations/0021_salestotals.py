@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_totals(apps, schema_editor):
+    # Same computation as api.rollups.rebuild, from the daily rollup
+    DailySales = apps.get_model('api', 'DailySales')
+    SalesTotals = apps.get_model('api', 'SalesTotals')
+    SalesTotals.objects.bulk_create([
+        SalesTotals(
+            payment_method=row['payment_method'], status=row['status'], payment_status=row['payment_status'],
+            order_count=row['order_count'], revenue=row['revenue'] or Decimal('0.00'),
+        )
+        for row in DailySales.objects.values('payment_method', 'status', 'payment_status')
+        .annotate(order_count=Sum('order_count'), revenue=Sum('revenue'))
+        .order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_customer_analytics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_method', models.CharField(choices=[('online', 'Online Payment'), ('offline', 'Offline Payment'), ('cod', 'Cash on Delivery')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('out_for_delivery', 'Out for Delivery'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('rejected', 'Rejected')], max_length=20)),
+                ('payment_status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('verified', 'Verified'), ('failed', 'Failed'), ('rejected', 'Rejected')], max_length=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Sales totals',
+                'constraints': [models.UniqueConstraint(fields=('payment_method', 'status', 'payment_status'), name='sales_totals_bucket_unique')],
+            },
+        ),
+        migrations.RunPython(populate_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,471 @@
+import api.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Labels of the category choices Product.category had before it became a foreign key
+CATEGORY_NAMES = {'mobile': 'Mobile', 'laptop': 'Laptop', 'headphones': 'Headphones'}
+
+
+def link_categories(apps, schema_editor):
+    """Point every product at the Category row named after its old category choice"""
+    Category = apps.get_model('api', 'Category')
+    Product = apps.get_model('api', 'Product')
+    for slug in Product.objects.order_by().values_list('category_slug', flat=True).distinct():
+        name = CATEGORY_NAMES.get(slug, slug)
+        category = Category.objects.filter(name=name).order_by('id').first()
+        if category is None:
+            category = Category.objects.create(name=name)
+        Product.objects.filter(category_slug=slug).update(category=category)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_salestotals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='invoice',
+            options={},
+        ),
+        migrations.AlterModelOptions(
+            name='order',
+            options={},
+        ),
+        migrations.AlterModelOptions(
+            name='product',
+            options={},
+        ),
+        migrations.RenameField(
+            model_name='payment',
+            old_name='created_at',
+            new_name='payment_date',
+        ),
+        migrations.AlterUniqueTogether(
+            name='address',
+            unique_together=set(),
+        ),
+        migrations.RemoveField(
+            model_name='adminuser',
+            name='is_active',
+        ),
+        migrations.RemoveField(
+            model_name='adminuser',
+            name='last_login',
+        ),
+        migrations.RemoveField(
+            model_name='codpayment',
+            name='advance_amount',
+        ),
+        migrations.RemoveField(
+            model_name='codpayment',
+            name='advance_screenshot',
+        ),
+        migrations.RemoveField(
+            model_name='codpayment',
+            name='advance_verified',
+        ),
+        migrations.RemoveField(
+            model_name='codpayment',
+            name='delivery_charges',
+        ),
+        migrations.RemoveField(
+            model_name='offlinepayment',
+            name='notes',
+        ),
+        migrations.RemoveField(
+            model_name='offlinepayment',
+            name='screenshot',
+        ),
+        migrations.RemoveField(
+            model_name='offlinepayment',
+            name='transaction_reference',
+        ),
+        migrations.RemoveField(
+            model_name='onlinepayment',
+            name='refund_amount',
+        ),
+        migrations.RemoveField(
+            model_name='onlinepayment',
+            name='refund_id',
+        ),
+        migrations.RemoveField(
+            model_name='onlinepayment',
+            name='refund_status',
+        ),
+        migrations.RemoveField(
+            model_name='onlinepayment',
+            name='transaction_id',
+        ),
+        migrations.RemoveField(
+            model_name='orderitem',
+            name='created_at',
+        ),
+        migrations.RemoveField(
+            model_name='payment',
+            name='payment_id',
+        ),
+        migrations.RemoveField(
+            model_name='payment',
+            name='payment_status',
+        ),
+        migrations.RemoveField(
+            model_name='payment',
+            name='updated_at',
+        ),
+        migrations.RemoveField(
+            model_name='payment',
+            name='verified_at',
+        ),
+        migrations.RemoveField(
+            model_name='payment',
+            name='verified_by',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='battery',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='connectivity',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='is_deleted',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='ram',
+        ),
+        migrations.RemoveField(
+            model_name='product',
+            name='storage',
+        ),
+        migrations.AddField(
+            model_name='adminuser',
+            name='phone',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='codpayment',
+            name='collected_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='codpayment',
+            name='collected_by',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='codpayment',
+            name='collected_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='offlinepayment',
+            name='payment_method',
+            field=models.CharField(default='bank_transfer', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='offlinepayment',
+            name='payment_proof',
+            field=models.FileField(blank=True, upload_to='payment_proofs/'),
+        ),
+        migrations.AddField(
+            model_name='offlinepayment',
+            name='reference_number',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='onlinepayment',
+            name='gateway_transaction_id',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='payment_rejection_reason',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='payment_verified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='payment_verified_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='verified_orders', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='notes',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='payment_type',
+            field=models.CharField(choices=[('online', 'Online Payment'), ('offline', 'Offline Payment'), ('cod', 'Cash on Delivery')], default='cod', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('verified', 'Verified'), ('failed', 'Failed'), ('rejected', 'Rejected')], default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='transaction_id',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='address',
+            name='address_type',
+            field=models.CharField(choices=[('billing', 'Billing'), ('shipping', 'Shipping')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='adminuser',
+            name='role',
+            field=models.CharField(default='admin', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='codpayment',
+            name='notes',
+            field=models.TextField(blank=True, default=''),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='codpayment',
+            name='payment',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='api.payment'),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='address',
+            field=models.TextField(blank=True, default=''),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='phone',
+            field=models.CharField(blank=True, default='', max_length=20),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='company_address',
+            field=models.TextField(default='Your Company Address'),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='company_email',
+            field=models.EmailField(default='info@ideals.com', max_length=254),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='company_gst',
+            field=models.CharField(default='GST123456789', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='company_name',
+            field=models.CharField(default='iDeals', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='company_phone',
+            field=models.CharField(default='+91 1234567890', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='invoice_number',
+            field=models.CharField(default=api.models.generate_invoice_number, max_length=20, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='notes',
+            field=models.TextField(blank=True, default=''),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='terms_conditions',
+            field=models.TextField(blank=True, default=''),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='offlinepayment',
+            name='account_number',
+            field=models.CharField(blank=True, default='', max_length=50),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='offlinepayment',
+            name='bank_name',
+            field=models.CharField(blank=True, default='', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='offlinepayment',
+            name='payment',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='api.payment'),
+        ),
+        migrations.AlterField(
+            model_name='onlinepayment',
+            name='gateway',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='onlinepayment',
+            name='payment',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='api.payment'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='advance_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='order_number',
+            field=models.CharField(default=api.models.generate_order_number, max_length=20, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='payment_method',
+            field=models.CharField(choices=[('online', 'Online Payment'), ('offline', 'Offline Payment'), ('cod', 'Cash on Delivery')], default='cod', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='payment_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('verified', 'Verified'), ('failed', 'Failed'), ('rejected', 'Rejected')], default='pending', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='shipping_address_text',
+            field=models.TextField(blank=True, default=''),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='shipping_city',
+            field=models.CharField(blank=True, default='', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='shipping_country',
+            field=models.CharField(blank=True, default='', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='shipping_state',
+            field=models.CharField(blank=True, default='', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='shipping_zip_code',
+            field=models.CharField(blank=True, default='', max_length=20),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('out_for_delivery', 'Out for Delivery'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('rejected', 'Rejected')], default='pending', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='tracking_number',
+            field=models.CharField(blank=True, default='', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='product_image',
+            field=models.URLField(blank=True, default=''),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='brand',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RenameField(
+            model_name='product',
+            old_name='category',
+            new_name='category_slug',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='products', to='api.category'),
+        ),
+        migrations.RunPython(link_categories, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='product',
+            name='category_slug',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='products', to='api.category'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='color',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='model',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='wholesale_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.CreateModel(
+            name='ShipmentDetails',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shipment_method', models.CharField(choices=[('porter', 'Porter'), ('bus_agency', 'Bus Agency'), ('courier', 'Courier Service'), ('local_delivery', 'Local Delivery'), ('pickup', 'Customer Pickup'), ('truck', 'Truck'), ('bike', 'Bike'), ('car', 'Car'), ('other', 'Other')], max_length=20)),
+                ('vehicle_number', models.CharField(blank=True, max_length=20)),
+                ('vehicle_type', models.CharField(blank=True, max_length=50)),
+                ('driver_name', models.CharField(max_length=100)),
+                ('driver_phone', models.CharField(max_length=20)),
+                ('tracking_number', models.CharField(max_length=100)),
+                ('estimated_delivery', models.DateTimeField()),
+                ('actual_delivery', models.DateTimeField(blank=True, null=True)),
+                ('delivery_notes', models.TextField(blank=True)),
+                ('pickup_date', models.DateTimeField(blank=True, null=True)),
+                ('pickup_location', models.CharField(blank=True, max_length=200)),
+                ('delivery_location', models.CharField(blank=True, max_length=200)),
+                ('shipment_status', models.CharField(choices=[('pending', 'Pending'), ('picked_up', 'Picked Up'), ('in_transit', 'In Transit'), ('out_for_delivery', 'Out for Delivery'), ('delivered', 'Delivered'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='shipment_details', to='api.order')),
+            ],
+            options={
+                'verbose_name_plural': 'Shipment Details',
+            },
+        ),
+        migrations.RemoveField(
+            model_name='address',
+            name='updated_at',
+        ),
+    ]
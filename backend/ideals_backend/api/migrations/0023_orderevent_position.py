@@ -0,0 +1,27 @@
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_existing_events(apps, schema_editor):
+    # Existing events keep their id as position, so consumers' cursors stay valid
+    OrderEvent = apps.get_model('api', 'OrderEvent')
+    NumberSequence = apps.get_model('api', 'NumberSequence')
+    OrderEvent.objects.update(position=F('id'))
+    last = OrderEvent.objects.aggregate(last=Max('id'))['last'] or 0
+    NumberSequence.objects.update_or_create(name='order_events', defaults={'next_value': last + 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_sync_models_with_migrations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderevent',
+            name='position',
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.RunPython(number_existing_events, migrations.RunPython.noop),
+    ]
@@ -1,17 +1,19 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
+from django.core.serializers.json import DjangoJSONEncoder
 from decimal import Decimal
-import uuid
 import os
 
+from .numbering import format_number, next_number
+
 
 def generate_order_number():
-    return f"ORD-{uuid.uuid4().hex[:8].upper()}"
+    return format_number('ORD', next_number('order'))
 
 
 def generate_invoice_number():
-    return f"INV-{uuid.uuid4().hex[:8].upper()}"
+    return format_number('INV', next_number('invoice'))
 
 
 def product_image_path(instance, filename):
@@ -21,6 +23,7 @@ def product_image_path(instance, filename):
 class Category(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
+    reorder_threshold = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -32,6 +35,7 @@ class Category(models.Model):
 
 
 class Product(models.Model):
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -43,12 +47,54 @@ class Product(models.Model):
     model = models.CharField(max_length=100, blank=True)
     color = models.CharField(max_length=50, blank=True)
     images = models.JSONField(default=list, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True)
+    reorder_threshold = models.PositiveIntegerField(null=True, blank=True)
+    is_low_stock = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+            models.Index(fields=['brand', 'model', 'color'], name='product_natural_key_idx'),
+            models.Index(fields=['id'], condition=models.Q(is_low_stock=True), name='product_low_stock_idx'),
+        ]
+
+
+class ImageAsset(models.Model):
+    """Processed original image and its resized derivatives, deduplicated by content hash"""
+    source_url = models.TextField()
+    source_url_hash = models.CharField(max_length=64, unique=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    variants = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.source_url
+
+
+class StockAlert(models.Model):
+    """Append-only log of products crossing their reorder threshold"""
+    ALERT_TYPES = [
+        ('low_stock', 'Low Stock'),
+        ('restocked', 'Restocked'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_alerts')
+    alert_type = models.CharField(max_length=20, choices=ALERT_TYPES)
+    stock = models.PositiveIntegerField()
+    threshold = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_alert_type_display()} - {self.product_id} ({self.stock}/{self.threshold})"
+
 
 class Customer(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
@@ -62,11 +108,21 @@ class Customer(models.Model):
     def __str__(self):
         return self.name
 
+    def get_default_address(self, address_type):
+        # Resolve from prefetched addresses when available (order listings) instead of querying per customer
+        if 'addresses' in getattr(self, '_prefetched_objects_cache', {}):
+            defaults = [
+                address for address in self.addresses.all()
+                if address.address_type == address_type and address.is_default
+            ]
+            return min(defaults, key=lambda address: address.pk) if defaults else None
+        return self.addresses.filter(address_type=address_type, is_default=True).first()
+
     def get_default_billing_address(self):
-        return self.addresses.filter(address_type='billing', is_default=True).first()
+        return self.get_default_address('billing')
 
     def get_default_shipping_address(self):
-        return self.addresses.filter(address_type='shipping', is_default=True).first()
+        return self.get_default_address('shipping')
 
 
 class Address(models.Model):
@@ -156,10 +212,24 @@ class Order(models.Model):
     def __str__(self):
         return f"Order {self.order_number} - {self.customer.name}"
 
+    class Meta:
+        # Match the admin work queues (see OrderViewSet.QUEUES): equality on
+        # the status columns, newest first
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+            models.Index(fields=['status', 'payment_status', '-created_at', '-id'], name='order_status_payment_idx'),
+            models.Index(fields=['payment_status', '-created_at', '-id'], name='order_payment_created_idx'),
+            models.Index(fields=['payment_method', 'payment_status', '-created_at', '-id'], name='order_method_payment_idx'),
+            models.Index(fields=['customer', '-created_at'], name='order_customer_created_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.order_number:
             self.order_number = generate_order_number()
-        super().save(*args, **kwargs)
+        # The save signals write the order's change events and settle its
+        # stock; they must commit or roll back together with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     @property
     def requires_payment_verification(self):
@@ -206,6 +276,30 @@ class OrderItem(models.Model):
         super().save(*args, **kwargs)
 
 
+class StockReservation(models.Model):
+    """Stock held for an order: taken at checkout, committed on payment, returned on release"""
+    STATUS_CHOICES = [
+        ('reserved', 'Reserved'),
+        ('committed', 'Committed'),
+        ('released', 'Released'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='reserved')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.order_id} - {self.product_id} x {self.quantity} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'status'], name='reservation_order_status_idx'),
+        ]
+
+
 class Payment(models.Model):
     PAYMENT_TYPES = [
         ('online', 'Online Payment'),
@@ -356,5 +450,163 @@ class ShipmentDetails(models.Model):
     def __str__(self):
         return f"Shipment {self.tracking_number} - Order {self.order.order_number}"
 
+    def save(self, *args, **kwargs):
+        # Commit together with the order change event written on save
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
         verbose_name_plural = "Shipment Details"
+
+
+class IdempotencyKey(models.Model):
+    """Outcome of a request sent with an Idempotency-Key header, replayed for retries"""
+    owner = models.CharField(max_length=50)
+    scope = models.CharField(max_length=100)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    # Null while the first request is still being processed
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'scope', 'key'], name='idempotency_key_unique'),
+        ]
+
+
+class NumberSequence(models.Model):
+    """Next free value of a document number sequence (see api.numbering)"""
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+class JobState(models.Model):
+    """Lease, resume point and last-run metrics of a background job (see api.scheduler)"""
+    name = models.CharField(max_length=100, primary_key=True)
+    # Last primary key a chunked job has finished; 0 when no pass is in progress
+    cursor = models.BigIntegerField(default=0)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_started_at = models.DateTimeField(null=True, blank=True)
+    last_finished_at = models.DateTimeField(null=True, blank=True)
+    stats = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return self.name
+
+
+class OrderEvent(models.Model):
+    """Append-only order change feed; the position is the consumers' cursor (see api.order_events)"""
+    EVENT_TYPE_CHOICES = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('shipment', 'Shipment'),
+        ('deleted', 'Deleted'),
+    ]
+
+    # Not a foreign key: events outlive the orders they describe
+    order_id = models.BigIntegerField(db_index=True)
+    order_number = models.CharField(max_length=20)
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPE_CHOICES)
+    # {field: [old, new]}
+    changes = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Assigned after commit, in the order events become visible; None until then
+    position = models.BigIntegerField(null=True, blank=True, unique=True)
+
+    def __str__(self):
+        return f"{self.event_type} {self.order_number}"
+
+
+class DailySales(models.Model):
+    """Order count and order value per day and order state, kept up to date by api.rollups"""
+    date = models.DateField()
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHOD_CHOICES)
+    status = models.CharField(max_length=20, choices=Order.ORDER_STATUS_CHOICES)
+    payment_status = models.CharField(max_length=20, choices=Order.PAYMENT_STATUS_CHOICES)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    def __str__(self):
+        return f"{self.date} {self.payment_method}/{self.status}/{self.payment_status}"
+
+    class Meta:
+        verbose_name_plural = "Daily sales"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'payment_method', 'status', 'payment_status'], name='daily_sales_bucket_unique'
+            ),
+        ]
+
+
+class SalesTotals(models.Model):
+    """All-time order count and order value per order state, kept up to date by api.rollups next to DailySales"""
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHOD_CHOICES)
+    status = models.CharField(max_length=20, choices=Order.ORDER_STATUS_CHOICES)
+    payment_status = models.CharField(max_length=20, choices=Order.PAYMENT_STATUS_CHOICES)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    def __str__(self):
+        return f"{self.payment_method}/{self.status}/{self.payment_status}"
+
+    class Meta:
+        verbose_name_plural = "Sales totals"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['payment_method', 'status', 'payment_status'], name='sales_totals_bucket_unique'
+            ),
+        ]
+
+
+class ProductDailySales(models.Model):
+    """Units and revenue per product and day of the orders that still count as sales, kept up to date by api.product_sales"""
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    order_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date} {self.product_id}"
+
+    class Meta:
+        verbose_name_plural = "Product daily sales"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='product_daily_sales_unique'),
+        ]
+
+
+class CustomerValue(models.Model):
+    """Lifetime order count and value of a customer, written by api.customer_analytics"""
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='value')
+    first_order_date = models.DateField()
+    last_order_date = models.DateField()
+    order_count = models.IntegerField()
+    lifetime_value = models.DecimalField(max_digits=14, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.customer_id}: {self.lifetime_value}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-lifetime_value'], name='customer_value_ltv_idx'),
+        ]
+
+
+class CustomerAnalyticsReport(models.Model):
+    """Cohort retention and repeat purchase figures of one customer analytics run"""
+    generated_at = models.DateTimeField(auto_now_add=True)
+    summary = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    cohorts = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return f"Customer analytics {self.generated_at}"
@@ -0,0 +1,78 @@
+"""
+Human-friendly, increasing document numbers (``ORD-0000000042``).
+
+Numbers come from a ``NumberSequence`` row per prefix. Each process reserves
+a block of ``NUMBER_BLOCK_SIZE`` values with one atomic UPDATE and hands
+them out from memory, so allocating a number usually costs no query, never
+needs a collision retry, and new numbers land at the right-hand end of the
+unique index instead of at random positions. Unused values of a block are
+lost when the process exits; numbers are unique and increasing per
+process, not gap-free.
+
+The numeric part is zero-padded to ``DIGITS`` digits, so numbers sort in
+allocation order and can never equal the legacy random eight-character
+numbers (``ORD-1A2B3C4D``) already stored.
+"""
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+DIGITS = 10
+
+_lock = threading.Lock()
+_blocks = {}
+
+
+def get_block_size():
+    return getattr(settings, 'NUMBER_BLOCK_SIZE', 50)
+
+
+def reserve_block(name, size):
+    """Atomically take ``size`` values from the named sequence; returns ``(first, end)``"""
+    NumberSequence = apps.get_model('api', 'NumberSequence')
+    with transaction.atomic():
+        updated = NumberSequence.objects.filter(name=name).update(next_value=F('next_value') + size)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    NumberSequence.objects.create(name=name, next_value=1 + size)
+                return 1, 1 + size
+            except IntegrityError:
+                # Created concurrently: take a block from the existing row
+                NumberSequence.objects.filter(name=name).update(next_value=F('next_value') + size)
+        end = NumberSequence.objects.filter(name=name).values_list('next_value', flat=True).get()
+    return end - size, end
+
+
+def _cache_block(name, current, end):
+    with _lock:
+        cached = _blocks.get(name)
+        if current < end and (cached is None or cached[0] >= cached[1]):
+            _blocks[name] = (current, end)
+
+
+def next_number(name):
+    """Next value of the named sequence, from this process's block when possible"""
+    with _lock:
+        current, end = _blocks.get(name, (0, 0))
+        if current < end:
+            _blocks[name] = (current + 1, end)
+            return current
+
+    # Refill outside the lock: the UPDATE may wait on another transaction
+    current, end = reserve_block(name, get_block_size())
+    if transaction.get_connection().in_atomic_block:
+        # The reservation rolls back with the surrounding transaction, so the
+        # rest of the block is only ours once that transaction commits
+        transaction.on_commit(lambda: _cache_block(name, current + 1, end))
+    else:
+        _cache_block(name, current + 1, end)
+    return current
+
+
+def format_number(prefix, value):
+    return f'{prefix}-{value:0{DIGITS}d}'
@@ -0,0 +1,77 @@
+"""
+Order change feed (transactional outbox).
+
+Every order creation, deletion, status/payment/tracking change and
+shipment update appends an ``OrderEvent`` in the same transaction as the
+change itself (``Order.save`` and ``ShipmentDetails.save`` are atomic, the
+signals in ``api.signals`` write the events, ``api.transitions`` and
+``api.cleanup`` write them for bulk changes).
+
+Ids are assigned at insert time, so a long transaction can commit a lower
+id after a higher one was already read; ids cannot be the cursor. Instead
+``publish`` numbers the committed events that have no ``position`` yet,
+one publisher at a time (the ``order_events`` ``NumberSequence`` row is
+locked for the pass). An event that commits later gets a later position,
+whatever its id. Consumers poll ``/api/orders/changes/?since=<cursor>``
+with the last position they have seen; every poll publishes first, then
+range-scans the positions.
+"""
+from django.db import transaction
+
+from .models import NumberSequence, OrderEvent
+
+
+SEQUENCE_NAME = 'order_events'
+TRACKED_FIELDS = ('status', 'payment_status', 'payment_method', 'total', 'tracking_number', 'estimated_delivery')
+SHIPMENT_FIELDS = ('shipment_status', 'tracking_number', 'estimated_delivery', 'actual_delivery')
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def diff(previous, instance, fields):
+    """``{field: [old, new]}`` for the fields whose value changed"""
+    changes = {}
+    for field in fields:
+        old = previous.get(field) if previous else None
+        new = getattr(instance, field)
+        if old != new:
+            changes[field] = [old, new]
+    return changes
+
+
+def make_event(order_id, order_number, event_type, changes):
+    return OrderEvent(order_id=order_id, order_number=order_number, event_type=event_type, changes=changes)
+
+
+def record(order, event_type, changes):
+    make_event(order.pk, order.order_number, event_type, changes).save()
+
+
+def record_many(events):
+    OrderEvent.objects.bulk_create(events)
+
+
+def publish(batch_size=MAX_LIMIT):
+    """Give up to ``batch_size`` committed, unpublished events the next positions, oldest id first; returns how many"""
+    with transaction.atomic():
+        sequence, _ = NumberSequence.objects.select_for_update().get_or_create(name=SEQUENCE_NAME)
+        ids = list(
+            OrderEvent.objects.filter(position__isnull=True).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        OrderEvent.objects.bulk_update([
+            OrderEvent(pk=pk, position=sequence.next_value + offset) for offset, pk in enumerate(ids)
+        ], ['position'], batch_size=500)
+        sequence.next_value += len(ids)
+        sequence.save(update_fields=['next_value'])
+    return len(ids)
+
+
+def events_since(since, limit=DEFAULT_LIMIT):
+    """Up to ``limit`` events after position ``since``, in position order; returns ``(events, has_more)``"""
+    # Publish at least a page, so a backlog of unpublished events drains as consumers poll
+    backlog = publish(limit + 1) > limit
+    events = list(OrderEvent.objects.filter(position__gt=since).order_by('position')[:limit + 1])
+    return events[:limit], backlog or len(events) > limit
@@ -0,0 +1,196 @@
+"""
+Admin order search.
+
+A query is looked up two ways, each through an index:
+
+* order number: exact match, or prefix match as a range scan on the unique
+  ``order_number`` index (``ORD-00000123`` finds ``ORD-0000012345``),
+* customer name and email: trigram matching, so partial words and small
+  typos still find the customer. PostgreSQL uses ``pg_trgm`` GIN indexes
+  (``word_similarity``); SQLite keeps a side table of trigrams per customer
+  (``api_customer_trigram``) that the signals in ``api.signals`` keep in
+  sync and ``manage.py rebuild_search_index`` can rebuild.
+
+At most ``ORDER_SEARCH_LIMIT`` order numbers and customers are taken from
+each lookup, then their orders are fetched by primary key and customer id.
+Results carry a ``search_rank`` annotation: 3 for an exact order number, 2
+for a prefix, the customer similarity (0-1] otherwise. Other backends fall
+back to ``icontains`` filtering.
+"""
+import math
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+
+from .models import Order
+from .numbering import DIGITS, format_number
+
+
+TRIGRAM_TABLE = 'api_customer_trigram'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+ORDER_NUMBER_RE = re.compile(r'^[A-Z0-9-]+$')
+
+EXACT_RANK = 3.0
+PREFIX_RANK = 2.0
+
+
+def get_limit():
+    return getattr(settings, 'ORDER_SEARCH_LIMIT', 100)
+
+
+def get_similarity():
+    return getattr(settings, 'ORDER_SEARCH_SIMILARITY', 0.6)
+
+
+def document_trigrams(*values):
+    """Trigrams of every word, padded like pg_trgm (two spaces before, one after)"""
+    trigrams = set()
+    for value in values:
+        for word in WORD_RE.findall((value or '').lower()):
+            padded = f'  {word} '
+            trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def query_trigrams(query):
+    # No trailing pad: the last word may still be being typed
+    trigrams = set()
+    for word in WORD_RE.findall(query.lower()):
+        padded = f'  {word}'
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def match_order_numbers(query):
+    """``(exact_ids, prefix_ids)`` of orders whose number equals or starts with ``query``"""
+    number = query.upper()
+    if not ORDER_NUMBER_RE.match(number):
+        return [], []
+
+    exact = {number}
+    if number.isdigit() and len(number) <= DIGITS:
+        # Bare sequence value: "42" means ORD-0000000042
+        exact.add(format_number('ORD', int(number)))
+    exact_ids = list(Order.objects.filter(order_number__in=exact).values_list('id', flat=True))
+
+    # A range scan on the unique index; startswith only re-checks the range
+    prefix_ids = list(
+        Order.objects.filter(
+            order_number__gte=number,
+            order_number__lt=number + '\uffff',
+            order_number__startswith=number,
+        )
+        .exclude(id__in=exact_ids)
+        .order_by('order_number')
+        .values_list('id', flat=True)[:get_limit()]
+    )
+    return exact_ids, prefix_ids
+
+
+def match_customers(query):
+    """``{customer_id: similarity}`` for the customers whose name or email resemble ``query``"""
+    if connection.vendor == 'sqlite':
+        trigrams = sorted(query_trigrams(query))
+        if not trigrams:
+            return {}
+        needed = max(1, math.ceil(len(trigrams) * get_similarity()))
+        placeholders = ', '.join(['%s'] * len(trigrams))
+        sql = (
+            f'SELECT customer_id, COUNT(*) FROM {TRIGRAM_TABLE} '
+            f'WHERE trigram IN ({placeholders}) '
+            f'GROUP BY customer_id HAVING COUNT(*) >= %s '
+            f'ORDER BY COUNT(*) DESC, customer_id DESC LIMIT %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, trigrams + [needed, get_limit()])
+            return {customer_id: matched / len(trigrams) for customer_id, matched in cursor.fetchall()}
+
+    if connection.vendor == 'postgresql':
+        # <% is the indexable word_similarity operator of pg_trgm
+        sql = (
+            'SELECT id, GREATEST(word_similarity(%s, name), word_similarity(%s, email)) AS score '
+            'FROM api_customer WHERE %s <%% name OR %s <%% email '
+            'ORDER BY score DESC, id DESC LIMIT %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [query, query, query, query, get_limit()])
+            return dict(cursor.fetchall())
+
+    return None
+
+
+def search_orders(queryset, query):
+    """
+    Filter ``queryset`` to orders matching ``query`` by order number or
+    customer, ranked best first.
+    """
+    query = query.strip()
+    if not query:
+        return queryset.none()
+
+    customers = match_customers(query)
+    if customers is None:
+        return queryset.filter(
+            Q(order_number__icontains=query) |
+            Q(customer__name__icontains=query) |
+            Q(customer__email__icontains=query)
+        )
+
+    exact_ids, prefix_ids = match_order_numbers(query)
+    if not (exact_ids or prefix_ids or customers):
+        return queryset.none()
+
+    # One WHEN per distinct similarity, not per customer
+    by_score = {}
+    for customer_id, score in customers.items():
+        by_score.setdefault(round(score, 2), []).append(customer_id)
+
+    whens = []
+    if exact_ids:
+        whens.append(When(pk__in=exact_ids, then=Value(EXACT_RANK)))
+    if prefix_ids:
+        whens.append(When(pk__in=prefix_ids, then=Value(PREFIX_RANK)))
+    for score in sorted(by_score, reverse=True):
+        whens.append(When(customer_id__in=by_score[score], then=Value(score)))
+
+    return queryset.filter(
+        Q(pk__in=exact_ids + prefix_ids) | Q(customer_id__in=list(customers))
+    ).annotate(
+        search_rank=Case(*whens, default=Value(0.0), output_field=FloatField())
+    ).order_by('-search_rank', '-created_at', '-id')
+
+
+def index_customers(customers):
+    """Insert or refresh the trigram rows for the given customers"""
+    if connection.vendor != 'sqlite':
+        return
+    customers = list(customers)
+    if not customers:
+        return
+    rows = [
+        (trigram, customer.pk)
+        for customer in customers
+        for trigram in document_trigrams(customer.name, customer.email)
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {TRIGRAM_TABLE} WHERE customer_id = %s', [(customer.pk,) for customer in customers]
+        )
+        cursor.executemany(f'INSERT INTO {TRIGRAM_TABLE} (trigram, customer_id) VALUES (%s, %s)', rows)
+
+
+def unindex_customers(customer_ids):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {TRIGRAM_TABLE} WHERE customer_id = %s', [(pk,) for pk in customer_ids])
+
+
+def clear_index():
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TRIGRAM_TABLE}')
@@ -0,0 +1,80 @@
+"""
+Order creation as a single unit of work.
+
+Cart lines are priced on the server from the ``Product`` rows (client-sent
+prices are ignored), all products are loaded with one ``in_bulk`` query and
+the ``OrderItem`` rows are written with one ``bulk_create``, so checkout
+costs the same number of queries whatever the cart size. Stock is reserved
+in the same transaction (see ``api.reservations``): a bad line or a product
+that ran out leaves no order behind. The lines are added to the product
+sales rollup (see ``api.product_sales``) in the same transaction.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import OrderItem, Product
+from .reservations import reserve_items
+from . import product_sales
+
+
+CENT = Decimal('0.01')
+
+
+class OrderError(Exception):
+    pass
+
+
+def get_tax_rate():
+    return Decimal(str(getattr(settings, 'ORDER_TAX_RATE', '0.18')))
+
+
+def build_items(items_data, products):
+    """Unsaved ``OrderItem`` rows for validated ``{product, quantity}`` lines"""
+    items = []
+    for line, item_data in enumerate(items_data, start=1):
+        product = products.get(item_data['product'])
+        if product is None:
+            raise OrderError(f"Line {line}: product {item_data['product']} does not exist")
+        if not product.is_active:
+            raise OrderError(f'Line {line}: {product.name} is not available')
+        quantity = item_data['quantity']
+        items.append(OrderItem(
+            product=product,
+            product_name=product.name,
+            product_image=product.images[0] if product.images else '',
+            quantity=quantity,
+            price=product.price,
+            total=(product.price * quantity).quantize(CENT, ROUND_HALF_UP),
+        ))
+    return items
+
+
+def order_total(items):
+    subtotal = sum((item.total for item in items), Decimal('0.00'))
+    tax = (subtotal * get_tax_rate()).quantize(CENT, ROUND_HALF_UP)
+    return subtotal + tax
+
+
+def create_order(serializer, items_data):
+    """
+    Save the validated ``OrderSerializer`` together with its items.
+
+    ``items_data`` are validated ``{product, quantity}`` lines. Raises
+    ``OrderError`` when a line cannot be ordered and ``InsufficientStock``
+    when a product runs out; either way everything is rolled back.
+    """
+    if not items_data:
+        raise OrderError('Order must contain at least one item')
+
+    with transaction.atomic():
+        products = Product.objects.in_bulk({item_data['product'] for item_data in items_data})
+        items = build_items(items_data, products)
+        order = serializer.save(total=order_total(items))
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+        reserve_items(order, items)
+        product_sales.record_order_items(order, items)
+    return order
@@ -0,0 +1,160 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over (created_at, id), newest first.
+
+    The cursor is an opaque base64 token holding the key of the last row on
+    the previous page, so every page is a single indexed range scan no matter
+    how deep the client has scrolled.
+
+    Relevance-ranked search results keep their own ordering; their rank is
+    computed per query and has no index to seek on, so their cursor holds
+    the offset into the ranked results instead.
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        self.offset = None
+        if self.is_ranked(queryset):
+            self.offset = self.decode_offset(request)
+            results = list(queryset[self.offset:self.offset + self.page_size + 1])
+            self.has_next = len(results) > self.page_size
+            self.page = results[:self.page_size]
+            return self.page
+
+        position = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            created_at, pk = position
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) |
+                Q(created_at=created_at, id__lt=pk)
+            )
+
+        # Fetch one extra row to know whether another page exists
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def is_ranked(self, queryset):
+        # Product search selects the rank as an extra column, order search
+        # annotates it
+        query = queryset.query
+        return 'search_rank' in query.extra or 'search_rank' in query.annotations
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_cursor(self):
+        if not self.has_next or not self.page:
+            return None
+        if self.offset is not None:
+            return self.encode_payload(self.offset + len(self.page))
+        last = self.page[-1]
+        return self.encode_cursor(last.created_at, last.pk)
+
+    def get_next_link(self):
+        cursor = self.get_next_cursor()
+        if cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_first_link(self):
+        return remove_query_param(self.base_url, self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'next_cursor': self.get_next_cursor(),
+            'page_size': self.page_size,
+            'results': data,
+        }
+
+    def encode_payload(self, value):
+        payload = json.dumps(value, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_payload(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        except (ValueError, binascii.Error, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, created_at, pk):
+        return self.encode_payload([created_at.isoformat(), pk])
+
+    def decode_cursor(self, request):
+        payload = self.decode_payload(request)
+        if payload is None:
+            return None
+        try:
+            created_at, pk = payload
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+    def decode_offset(self, request):
+        """Offset into ranked results; 0 without a cursor"""
+        offset = self.decode_payload(request)
+        if offset is None:
+            return 0
+        if type(offset) is not int or offset < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return offset
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
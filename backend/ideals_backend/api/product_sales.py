@@ -0,0 +1,183 @@
+"""
+Per-product daily sales rollup.
+
+``ProductDailySales`` holds, per product and order creation day (in the
+current time zone), the units, revenue and number of orders from order
+lines of orders that still count as sales (any status but cancelled or
+rejected). It is kept up to date in the same transaction as the change:
+``api.orders.create_order`` adds a new order's lines, the ``Order`` signals
+take an order out when it is cancelled, rejected or deleted, and
+``api.transitions`` does the same for bulk moves.
+``manage.py rebuild_sales_rollup`` recomputes it from the order lines.
+
+Product analytics then aggregate rollup rows for the requested window
+instead of scanning every order line.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import OrderItem, ProductDailySales
+
+
+EXCLUDED_STATUSES = ('cancelled', 'rejected')
+SORT_FIELDS = ('units', 'revenue')
+
+
+def counts(status):
+    """Whether orders in ``status`` count as product sales"""
+    return status not in EXCLUDED_STATUSES
+
+
+def item_rows(order_ids=None):
+    """Order lines summed per creation day and product, for the given orders or all counted ones"""
+    items = OrderItem.objects.all()
+    if order_ids is None:
+        items = items.exclude(order__status__in=EXCLUDED_STATUSES)
+    else:
+        items = items.filter(order_id__in=order_ids)
+    return (
+        items.annotate(date=TruncDate('order__created_at'))
+        .values('date', 'product_id')
+        .annotate(units=Sum('quantity'), revenue=Sum('total'), order_count=Count('order_id', distinct=True))
+        .order_by()
+    )
+
+
+def apply(deltas):
+    """Write ``{(date, product_id): (units, revenue, order_count)}`` deltas to the rollup table"""
+    with transaction.atomic():
+        for (date, product_id), (units, revenue, order_count) in sorted(deltas.items()):
+            if not units and not revenue and not order_count:
+                continue
+            rows = ProductDailySales.objects.filter(date=date, product_id=product_id)
+            changes = {
+                'units': F('units') + units,
+                'revenue': F('revenue') + revenue,
+                'order_count': F('order_count') + order_count,
+            }
+            if rows.update(**changes):
+                continue
+            try:
+                with transaction.atomic():
+                    ProductDailySales.objects.create(
+                        date=date, product_id=product_id, units=units, revenue=revenue, order_count=order_count
+                    )
+            except IntegrityError:
+                # Created by a concurrent transaction in the meantime
+                rows.update(**changes)
+
+
+def record_order_items(order, items):
+    """Count the lines of a newly created order"""
+    if not counts(order.status):
+        return
+    date = timezone.localdate(order.created_at)
+    deltas = {}
+    for item in items:
+        units, revenue, order_count = deltas.get((date, item.product_id), (0, Decimal('0.00'), 0))
+        # A product listed on several lines is still one order
+        deltas[(date, item.product_id)] = (units + item.quantity, revenue + item.total, 1)
+    apply(deltas)
+
+
+def move_orders(order_ids, sign):
+    """Count (``sign`` 1) or uncount (``sign`` -1) the lines of existing orders"""
+    if not order_ids:
+        return
+    apply({
+        (row['date'], row['product_id']): (
+            sign * row['units'], sign * (row['revenue'] or Decimal('0.00')), sign * row['order_count']
+        )
+        for row in item_rows(order_ids)
+    })
+
+
+def record_status_change(order, previous_status):
+    if counts(previous_status) != counts(order.status):
+        move_orders([order.pk], 1 if counts(order.status) else -1)
+
+
+def rebuild():
+    """Recompute the whole rollup from the order lines; returns the number of rollup rows"""
+    with transaction.atomic():
+        ProductDailySales.objects.all().delete()
+        rows = ProductDailySales.objects.bulk_create([
+            ProductDailySales(
+                date=row['date'], product_id=row['product_id'], units=row['units'],
+                revenue=row['revenue'] or Decimal('0.00'), order_count=row['order_count'],
+            )
+            for row in item_rows()
+        ], batch_size=1000)
+    return len(rows)
+
+
+def change_percent(current, previous):
+    if not previous:
+        return None
+    return round(float((current - previous) * 100 / previous), 1)
+
+
+def top_products(start=None, end=None, sort='units', limit=10, category_id=None, compare=False):
+    """
+    The ``limit`` best-selling products by ``sort`` between the local dates
+    ``start`` and ``end`` (inclusive, either may be None for an open end),
+    with their sales velocity in units per day. With ``compare``, also the
+    sales of the window of the same length just before ``start`` and the
+    change since. One grouped query over the rollup.
+    """
+    days = (end - start).days + 1 if start and end else None
+    previous_start = start - timedelta(days=days) if compare and days else None
+
+    rows = ProductDailySales.objects.all()
+    if previous_start or start:
+        rows = rows.filter(date__gte=previous_start or start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    if category_id is not None:
+        rows = rows.filter(product__category_id=category_id)
+
+    current = Q(date__gte=start) if previous_start else None
+    previous = Q(date__lt=start)
+    # Named apart from the rollup columns they sum
+    aggregates = {
+        'total_units': Sum('units', filter=current),
+        'total_revenue': Sum('revenue', filter=current),
+        'total_orders': Sum('order_count', filter=current),
+    }
+    if previous_start:
+        aggregates.update(previous_units=Sum('units', filter=previous), previous_revenue=Sum('revenue', filter=previous))
+    rows = (
+        rows.values('product_id', 'product__name')
+        .annotate(**aggregates)
+        .filter(total_units__gt=0)
+        .order_by(f'-total_{sort}', 'product_id')[:limit]
+    )
+
+    results = []
+    for row in rows:
+        result = {
+            'product_id': row['product_id'],
+            'product_name': row['product__name'],
+            'units': row['total_units'],
+            'revenue': row['total_revenue'] or Decimal('0.00'),
+            'order_count': row['total_orders'],
+            'velocity': round(row['total_units'] / days, 2) if days else None,
+        }
+        if previous_start:
+            previous_units = row['previous_units'] or 0
+            previous_revenue = row['previous_revenue'] or Decimal('0.00')
+            result.update(
+                previous_units=previous_units,
+                previous_revenue=previous_revenue,
+                units_change=result['units'] - previous_units,
+                revenue_change=result['revenue'] - previous_revenue,
+                units_change_percent=change_percent(result['units'], previous_units),
+                revenue_change_percent=change_percent(result['revenue'], previous_revenue),
+            )
+        results.append(result)
+    return results
@@ -0,0 +1,76 @@
+"""
+JSON renderers for the API.
+
+``FastJSONRenderer`` renders with orjson when it is installed, which handles
+datetime, date, UUID and containers natively, and with DRF's stdlib encoder
+otherwise, producing the same JSON either way.
+
+``CompactJSONRenderer`` is opt-in through
+``Accept: application/vnd.ideals.compact+json`` (or ``?format=compact``):
+every list of objects sharing the same keys is emitted column-oriented as
+``{"columns": [...], "rows": [[...], ...]}``, so large listings do not
+repeat every key on every row.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Decimal, lazy translations, querysets and the other types orjson leaves to
+# Python get DRF's own handling, so both code paths emit identical JSON
+_encoder = JSONEncoder()
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+        if self.get_indent(accepted_media_type, renderer_context):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_encoder.default, option=option)
+
+
+_CONTAINERS = (dict, list, tuple)
+
+
+def to_columns(data):
+    """Recursively turn lists of same-shaped dicts into ``{"columns", "rows"}`` tables"""
+    if isinstance(data, dict):
+        return {
+            key: to_columns(value) if isinstance(value, _CONTAINERS) else value
+            for key, value in data.items()
+        }
+    if data and all(isinstance(row, dict) for row in data):
+        keys = data[0].keys()
+        if all(row.keys() == keys for row in data):
+            columns = list(keys)
+            return {
+                'columns': columns,
+                'rows': [
+                    [
+                        to_columns(value) if isinstance(value, _CONTAINERS) else value
+                        for value in map(row.__getitem__, columns)
+                    ]
+                    for row in data
+                ],
+            }
+    return [to_columns(item) if isinstance(item, _CONTAINERS) else item for item in data]
+
+
+class CompactJSONRenderer(FastJSONRenderer):
+    media_type = 'application/vnd.ideals.compact+json'
+    format = 'compact'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, _CONTAINERS):
+            data = to_columns(data)
+        return super().render(data, accepted_media_type, renderer_context)
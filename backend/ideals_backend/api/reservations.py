@@ -0,0 +1,153 @@
+"""
+Stock reservations for orders.
+
+Checkout takes stock with one conditional UPDATE per product
+(``stock = stock - n WHERE stock >= n``), so the database decides whether
+enough stock is left and concurrent checkouts can never oversell. Products
+are always updated in primary-key order, so two checkouts touching the same
+products lock them in the same order and cannot deadlock.
+
+Each taken quantity is recorded as a ``StockReservation``:
+
+* payment verification commits it (the stock stays taken),
+* cancellation, rejection and pending-order cleanup release it, returning
+  the quantity to ``Product.stock``.
+
+Releases lock and flip the reservation rows before returning their
+quantities, so the same order released twice, even concurrently, gives its
+stock back once.
+
+Stock moves only invalidate the catalog cache when a product runs out, comes
+back in stock or crosses its low-stock threshold; in between, the stock
+counts in cached catalog payloads can lag behind by up to
+``CATALOG_CACHE_TTL`` (checkout always works on the real stock).
+"""
+import logging
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Product, StockReservation
+from .catalog_cache import bump_version_on_commit
+from .inventory import refresh_low_stock
+
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('reserved', 'committed')
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id):
+        self.product_id = product_id
+        super().__init__(f'Not enough stock for product {product_id}')
+
+
+def _quantities(lines):
+    """Sum ``(product_id, quantity)`` pairs per product"""
+    quantities = {}
+    for product_id, quantity in lines:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def _after_stock_change(product_ids, availability_changed):
+    flipped = refresh_low_stock(Product.objects.filter(pk__in=product_ids))
+    if flipped or availability_changed:
+        bump_version_on_commit()
+
+
+def take_stock(quantities):
+    """Decrement stock for ``{product_id: quantity}``; raises ``InsufficientStock`` if any product runs short"""
+    now = timezone.now()
+    with transaction.atomic():
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            updated = Product.objects.filter(pk=product_id, stock__gte=quantity).update(
+                stock=F('stock') - quantity, updated_at=now
+            )
+            if not updated:
+                raise InsufficientStock(product_id)
+        # Taking stock can only change availability by emptying a product
+        _after_stock_change(list(quantities), Product.objects.filter(pk__in=list(quantities), stock=0).exists())
+
+
+def return_stock(quantities):
+    if not quantities:
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        restocked = Product.objects.filter(pk__in=list(quantities), stock=0).exists()
+        for product_id in sorted(quantities):
+            Product.objects.filter(pk=product_id).update(
+                stock=F('stock') + quantities[product_id], updated_at=now
+            )
+        _after_stock_change(list(quantities), restocked)
+
+
+def reserve_items(order, items):
+    """Take stock for an order's ``OrderItem`` rows and record the reservations"""
+    quantities = _quantities((item.product_id, item.quantity) for item in items)
+    with transaction.atomic():
+        take_stock(quantities)
+        StockReservation.objects.bulk_create([
+            StockReservation(order=order, product_id=product_id, quantity=quantity)
+            for product_id, quantity in quantities.items()
+        ])
+
+
+def commit_orders(order_ids):
+    """Payment is in: keep the reserved stock of these orders for good"""
+    with transaction.atomic():
+        now = timezone.now()
+        StockReservation.objects.filter(order_id__in=order_ids, status='reserved').update(
+            status='committed', updated_at=now
+        )
+
+        # Lines released earlier (e.g. a rejected payment that was later
+        # accepted) have to take their stock again
+        released = {}
+        for pk, order_id, product_id, quantity in (
+            StockReservation.objects.select_for_update()
+            .filter(order_id__in=order_ids, status='released')
+            .values_list('id', 'order_id', 'product_id', 'quantity')
+        ):
+            released.setdefault(order_id, []).append((pk, product_id, quantity))
+
+        for order_id, lines in released.items():
+            try:
+                take_stock(_quantities((product_id, quantity) for _, product_id, quantity in lines))
+            except InsufficientStock as e:
+                logger.warning('Order %s was paid but product %s is out of stock', order_id, e.product_id)
+                continue
+            StockReservation.objects.filter(pk__in=[pk for pk, _, _ in lines]).update(
+                status='committed', updated_at=now
+            )
+
+
+def release_orders(order_ids, statuses=ACTIVE_STATUSES):
+    """
+    Return the stock held by the given orders' reservations in ``statuses``.
+    Returns the number of reservations released.
+    """
+    with transaction.atomic():
+        rows = list(
+            StockReservation.objects.select_for_update()
+            .filter(order_id__in=order_ids, status__in=statuses)
+            .values_list('id', 'product_id', 'quantity')
+        )
+        if not rows:
+            return 0
+        now = timezone.now()
+        if connection.features.has_select_for_update:
+            # The rows are locked until we commit, nobody else can release them
+            StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(status='released', updated_at=now)
+        else:
+            # No row locks: flip each row conditionally and keep the ones we flipped
+            rows = [
+                row for row in rows
+                if StockReservation.objects.filter(pk=row[0], status__in=statuses).update(status='released', updated_at=now)
+            ]
+        return_stock(_quantities((product_id, quantity) for _, product_id, quantity in rows))
+    return len(rows)
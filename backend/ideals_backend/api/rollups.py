@@ -0,0 +1,190 @@
+"""
+Daily sales rollup.
+
+``DailySales`` holds, per creation day (in the current time zone), payment
+method, status and payment status, how many orders are in that state and
+their summed ``total``. Every order change moves the order from its old
+bucket to its new one with ``F()`` increments, in the same
+transaction as the change (``Order`` signals for single saves,
+``api.transitions`` for bulk moves). ``manage.py rebuild_sales_rollup``
+recomputes the table from the orders.
+
+``SalesTotals`` keeps the same counts summed over all days, one row per
+order state, and is moved with the same deltas. Dashboard totals read those
+few rows; the revenue chart aggregates daily rows, whose number grows with
+the number of days rather than the number of orders.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import Trunc, TruncDate
+from django.utils import timezone
+
+from .models import DailySales, Order, SalesTotals
+
+
+BUCKET_FIELDS = ('payment_method', 'status', 'payment_status')
+
+
+def bucket(created_at, values):
+    return (timezone.localdate(created_at),) + tuple(values[field] for field in BUCKET_FIELDS)
+
+
+def add(deltas, created_at, values, sign):
+    """Count an order (``sign`` 1) or uncount it (``sign`` -1) in ``deltas``"""
+    key = bucket(created_at, values)
+    count, revenue = deltas.get(key, (0, Decimal('0.00')))
+    deltas[key] = (count + sign, revenue + sign * Decimal(str(values['total'] or 0)))
+
+
+def move(deltas, created_at, previous, current):
+    """Move an order from its ``previous`` values to its ``current`` ones (either may be None)"""
+    if previous is not None:
+        add(deltas, created_at, previous, -1)
+    if current is not None:
+        add(deltas, created_at, current, 1)
+
+
+def increment(model, key, count, revenue):
+    """Add ``count`` and ``revenue`` to the ``model`` row for ``key`` (a field lookup), creating it if needed"""
+    rows = model.objects.filter(**key)
+    if rows.update(order_count=F('order_count') + count, revenue=F('revenue') + revenue):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(order_count=count, revenue=revenue, **key)
+    except IntegrityError:
+        # Created by a concurrent transaction in the meantime
+        rows.update(order_count=F('order_count') + count, revenue=F('revenue') + revenue)
+
+
+def apply(deltas):
+    """Write ``{bucket: (count, revenue)}`` deltas to the rollup table and the all-time totals"""
+    totals = {}
+    with transaction.atomic():
+        for key, (count, revenue) in sorted(deltas.items()):
+            if not count and not revenue:
+                continue
+            state = key[1:]
+            increment(DailySales, dict(zip(('date',) + BUCKET_FIELDS, key)), count, revenue)
+            total_count, total_revenue = totals.get(state, (0, Decimal('0.00')))
+            totals[state] = (total_count + count, total_revenue + revenue)
+
+        for state, (count, revenue) in sorted(totals.items()):
+            if count or revenue:
+                increment(SalesTotals, dict(zip(BUCKET_FIELDS, state)), count, revenue)
+
+
+def order_values(order):
+    return {field: getattr(order, field) for field in BUCKET_FIELDS + ('total',)}
+
+
+def record_order_change(order, previous):
+    """Single-order hook for the ``Order`` save signal; ``previous`` is None for new orders"""
+    current = order_values(order)
+    if previous is not None and all(previous[field] == current[field] for field in current):
+        return
+    deltas = {}
+    move(deltas, order.created_at, previous, current)
+    apply(deltas)
+
+
+def record_order_deletion(order):
+    deltas = {}
+    move(deltas, order.created_at, order_values(order), None)
+    apply(deltas)
+
+
+def rollup_rows():
+    """Unsaved ``DailySales`` rows computed from the orders"""
+    return [
+        DailySales(
+            date=row['date'], payment_method=row['payment_method'], status=row['status'],
+            payment_status=row['payment_status'], order_count=row['order_count'],
+            revenue=row['revenue'] or Decimal('0.00'),
+        )
+        for row in Order.objects.annotate(date=TruncDate('created_at'))
+        .values('date', *BUCKET_FIELDS)
+        .annotate(order_count=Count('id'), revenue=Sum('total'))
+        .order_by()
+    ]
+
+
+def rebuild():
+    """Recompute the whole rollup and the totals from the orders; returns the number of rollup rows"""
+    with transaction.atomic():
+        DailySales.objects.all().delete()
+        SalesTotals.objects.all().delete()
+        rows = DailySales.objects.bulk_create(rollup_rows(), batch_size=1000)
+        totals = {}
+        for row in rows:
+            state = tuple(getattr(row, field) for field in BUCKET_FIELDS)
+            count, revenue = totals.get(state, (0, Decimal('0.00')))
+            totals[state] = (count + row.order_count, revenue + row.revenue)
+        SalesTotals.objects.bulk_create([
+            SalesTotals(order_count=count, revenue=revenue, **dict(zip(BUCKET_FIELDS, state)))
+            for state, (count, revenue) in totals.items()
+        ])
+    return len(rows)
+
+
+def totals():
+    """Order counts and values summed over all days, per bucket state"""
+    return list(SalesTotals.objects.values(*BUCKET_FIELDS, 'order_count', 'revenue'))
+
+
+GRANULARITIES = ('day', 'week', 'month')
+PAYMENT_METHODS = tuple(method for method, _ in Order.PAYMENT_METHOD_CHOICES)
+
+
+def bucket_start(day, granularity):
+    """First day of the bucket holding ``day``, as ``Trunc`` computes it (weeks start on Monday)"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_starts(start, end, granularity):
+    day = bucket_start(start, granularity)
+    while day <= end:
+        yield day
+        if granularity == 'month':
+            day = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            day += timedelta(days=7 if granularity == 'week' else 1)
+
+
+def revenue_series(start, end, granularity='day'):
+    """
+    Verified revenue and order count per bucket between the local dates
+    ``start`` and ``end`` (inclusive), split by payment method, with empty
+    buckets filled with zeros. One grouped query over the rollup.
+    """
+    rows = (
+        DailySales.objects.filter(payment_status='verified', date__range=(start, end))
+        .annotate(bucket=Trunc('date', granularity, output_field=DateField()))
+        .values('bucket', 'payment_method')
+        .annotate(revenue=Sum('revenue'), order_count=Sum('order_count'))
+        .order_by()
+    )
+    found = {(row['bucket'], row['payment_method']): row for row in rows}
+
+    series = []
+    for day in bucket_starts(start, end, granularity):
+        by_method = {}
+        order_count = 0
+        for method in PAYMENT_METHODS:
+            row = found.get((day, method))
+            by_method[method] = row['revenue'] if row else Decimal('0.00')
+            order_count += row['order_count'] if row else 0
+        series.append({
+            'date': day,
+            'revenue': sum(by_method.values()),
+            'order_count': order_count,
+            'by_payment_method': by_method,
+        })
+    return series
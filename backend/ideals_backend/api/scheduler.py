@@ -0,0 +1,118 @@
+"""
+In-process periodic scheduler for maintenance jobs.
+
+``start()`` (called from ``wsgi.py`` / ``asgi.py`` when ``SCHEDULER_ENABLED``)
+runs a daemon thread that calls every job in ``get_jobs()`` on its interval.
+Each run first claims the job's ``JobState`` lease with a conditional
+UPDATE, so when several worker processes run the scheduler a job still runs
+in one of them at a time; a worker that dies mid-run loses its lease after
+``SCHEDULER_LEASE_SECONDS`` and another worker picks the job up again.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import JobState
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_thread = None
+_stop = threading.Event()
+
+
+class Job:
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = 0
+
+
+def get_jobs():
+    from .cleanup import run_cleanup_job
+    from .customer_analytics import run_customer_analytics_job
+
+    return [
+        Job('cleanup_pending_orders', getattr(settings, 'ORDER_CLEANUP_INTERVAL', 5 * 60), run_cleanup_job),
+        Job(
+            'customer_analytics', getattr(settings, 'CUSTOMER_ANALYTICS_INTERVAL', 24 * 60 * 60),
+            run_customer_analytics_job
+        ),
+    ]
+
+
+def get_lease():
+    return timedelta(seconds=getattr(settings, 'SCHEDULER_LEASE_SECONDS', 10 * 60))
+
+
+def claim(name):
+    """Take the job's lease; returns False while another run holds it"""
+    now = timezone.now()
+    JobState.objects.get_or_create(name=name)
+    return bool(
+        JobState.objects.filter(Q(locked_until__isnull=True) | Q(locked_until__lte=now), name=name)
+        .update(locked_until=now + get_lease(), last_started_at=now)
+    )
+
+
+def renew(name):
+    """Extend the lease of a long run"""
+    JobState.objects.filter(name=name).update(locked_until=timezone.now() + get_lease())
+
+
+def release(name, stats=None):
+    changes = {'locked_until': None}
+    if stats is not None:
+        changes.update(stats=stats, last_finished_at=timezone.now())
+    JobState.objects.filter(name=name).update(**changes)
+
+
+def run_job(job):
+    try:
+        job.func()
+    except Exception:
+        logger.exception('Scheduled job %s failed', job.name)
+    finally:
+        close_old_connections()
+
+
+def _loop(jobs, tick):
+    while not _stop.is_set():
+        now = time.monotonic()
+        for job in jobs:
+            if now >= job.next_run:
+                job.next_run = now + job.interval
+                run_job(job)
+        _stop.wait(tick)
+
+
+def start():
+    """Start the scheduler thread once per process"""
+    global _thread
+    if not getattr(settings, 'SCHEDULER_ENABLED', False):
+        return
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _stop.clear()
+        jobs = get_jobs()
+        # First runs happen one interval after start-up, not during it
+        for job in jobs:
+            job.next_run = time.monotonic() + job.interval
+        _thread = threading.Thread(
+            target=_loop, args=(jobs, getattr(settings, 'SCHEDULER_TICK_SECONDS', 5)),
+            name='api-scheduler', daemon=True
+        )
+        _thread.start()
+
+
+def stop():
+    _stop.set()
@@ -0,0 +1,111 @@
+"""
+Full-text product search.
+
+SQLite keeps a separate FTS5 table (``api_product_fts``) that mirrors the
+searchable product columns; it is kept in sync by the signals in
+``api.signals`` and can be rebuilt with ``manage.py rebuild_search_index``.
+PostgreSQL uses a GIN expression index over a weighted tsvector of the same
+columns, so no side table has to be maintained there. Any other backend falls
+back to the old ``icontains`` filtering.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+
+FTS_TABLE = 'api_product_fts'
+SEARCH_FIELDS = ('name', 'brand', 'model', 'color', 'description')
+
+# Must stay identical to the expression indexed by migration 0007, otherwise
+# PostgreSQL will not use the GIN index.
+PG_DOCUMENT = (
+    "(setweight(to_tsvector('simple', coalesce(\"api_product\".\"name\", '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(\"api_product\".\"brand\", '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(\"api_product\".\"model\", '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(\"api_product\".\"color\", '')), 'C') || "
+    "setweight(to_tsvector('simple', coalesce(\"api_product\".\"description\", '')), 'D'))"
+)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    """Split a raw search string into lowercase word tokens"""
+    return TOKEN_RE.findall(query.lower())
+
+
+def search_products(queryset, query):
+    """
+    Filter ``queryset`` to products matching ``query`` and order them by
+    relevance. Every token is prefix-matched and all tokens must match.
+    Matching rows carry an extra ``search_rank`` column (higher is better).
+    """
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none()
+
+    if connection.vendor == 'sqlite':
+        # Join the FTS table so the MATCH drives the query and bm25 is
+        # computed once per matching row
+        match = ' '.join('"%s"*' % term for term in terms)
+        queryset = queryset.extra(
+            select={'search_rank': f'-{FTS_TABLE}.rank'},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = "api_product"."id"', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+        )
+    elif connection.vendor == 'postgresql':
+        tsquery = ' & '.join('%s:*' % term for term in terms)
+        queryset = queryset.extra(
+            select={'search_rank': f"ts_rank({PG_DOCUMENT}, to_tsquery('simple', %s))"},
+            select_params=[tsquery],
+            where=[f"{PG_DOCUMENT} @@ to_tsquery('simple', %s)"],
+            params=[tsquery],
+        )
+    else:
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(name__icontains=term) |
+                Q(description__icontains=term) |
+                Q(brand__icontains=term) |
+                Q(model__icontains=term) |
+                Q(color__icontains=term)
+            )
+        return queryset.filter(condition).order_by('-created_at', '-id')
+
+    return queryset.order_by('-search_rank', '-id')
+
+
+def index_products(products):
+    """Insert or refresh the search index rows for the given products"""
+    if connection.vendor != 'sqlite':
+        return
+    rows = [
+        (product.pk,) + tuple(getattr(product, field) or '' for field in SEARCH_FIELDS)
+        for product in products
+    ]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, {", ".join(SEARCH_FIELDS)}) VALUES (%s, %s, %s, %s, %s, %s)',
+            rows
+        )
+
+
+def unindex_products(product_ids):
+    """Remove the search index rows for the given product ids"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in product_ids])
+
+
+def clear_index():
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
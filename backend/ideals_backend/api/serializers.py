@@ -1,8 +1,12 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Product, Order, OrderItem, Customer, AdminUser, Category, Payment, OnlinePayment, OfflinePayment, CODPayment, Address, Invoice, ShipmentDetails
+from .models import Product, StockAlert, Order, OrderItem, Customer, AdminUser, Category, Payment, OnlinePayment, OfflinePayment, CODPayment, Address, Invoice, ShipmentDetails, OrderEvent, CustomerValue
 from django.contrib.auth.password_validation import validate_password
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .images import build_image_set
+from .fieldsets import SparseFieldsetMixin
+from .importers import MAX_INTEGER
+from .transitions import MAX_BULK_ORDERS, check_transition
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -15,27 +19,59 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
+        read_only_fields = ['is_low_stock', 'image_variants']
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    image_set = serializers.SerializerMethodField()
+
     class Meta:
         model = Product
-        fields = ['id', 'name', 'description', 'price', 'wholesale_price', 'category', 'images', 'stock', 'is_active', 'brand', 'model', 'color', 'created_at']
+        fields = ['id', 'name', 'description', 'price', 'wholesale_price', 'category', 'images', 'image_set', 'stock', 'is_active', 'brand', 'model', 'color', 'created_at']
+        sparse_sources = {'image_set': ('images', 'image_variants')}
+
+    def get_image_set(self, obj):
+        request = self.context.get('request')
+        return build_image_set(obj.images, obj.image_variants, request.build_absolute_uri if request else None)
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
 
 
+class StockAlertSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    current_stock = serializers.IntegerField(source='product.stock', read_only=True)
+
+    class Meta:
+        model = StockAlert
+        fields = ['id', 'product', 'product_name', 'alert_type', 'stock', 'threshold', 'current_stock', 'created_at']
+
+
+class ProductBulkUpdateItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    wholesale_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False, allow_null=True)
+    stock = serializers.IntegerField(min_value=0, max_value=MAX_INTEGER, required=False)
+    is_active = serializers.BooleanField(required=False)
+    # The updated_at the client last read; there are no blind writes
+    expected_updated_at = serializers.DateTimeField()
+
+    def validate(self, attrs):
+        if not set(attrs) & {'price', 'wholesale_price', 'stock', 'is_active'}:
+            raise serializers.ValidationError('Nothing to update')
+        return attrs
+
+
 class AddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = Address
         fields = ['id', 'address_type', 'street_address', 'city', 'state', 'zip_code', 'country', 'is_default', 'created_at']
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     addresses = AddressSerializer(many=True, read_only=True)
     default_billing_address = serializers.SerializerMethodField()
     default_shipping_address = serializers.SerializerMethodField()
@@ -59,6 +95,11 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class OrderItemCreateSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
 class OrderItemListSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
@@ -72,7 +113,7 @@ class ShipmentDetailsSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
-class InvoiceSerializer(serializers.ModelSerializer):
+class InvoiceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     order_number = serializers.CharField(source='order.order_number', read_only=True)
     customer_name = serializers.CharField(read_only=True)
     customer_email = serializers.CharField(read_only=True)
@@ -88,6 +129,15 @@ class InvoiceSerializer(serializers.ModelSerializer):
             'pdf_file', 'shipping_address', 'created_at', 'updated_at'
         ]
         read_only_fields = ['invoice_number', 'invoice_date', 'created_at', 'updated_at']
+        sparse_sources = {
+            'customer_name': ('order__customer__name',),
+            'customer_email': ('order__customer__email',),
+            'shipping_address': (
+                'order__shipping_address__street_address', 'order__shipping_address__city',
+                'order__shipping_address__state', 'order__shipping_address__zip_code',
+                'order__shipping_address__country', 'order__shipping_address_text',
+            ),
+        }
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -107,9 +157,11 @@ class OrderSerializer(serializers.ModelSerializer):
             'shipping_zip_code', 'shipping_country', 'tracking_number', 'estimated_delivery', 
             'created_at', 'updated_at', 'items', 'customer_name', 'customer_email'
         ]
+        # Computed from the items on the server, see api.orders
+        read_only_fields = ['total']
 
 
-class OrderListSerializer(serializers.ModelSerializer):
+class OrderListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     customer_name = serializers.CharField(source='customer.name', read_only=True)
     customer_email = serializers.CharField(source='customer.email', read_only=True)
     items_count = serializers.SerializerMethodField()
@@ -119,6 +171,8 @@ class OrderListSerializer(serializers.ModelSerializer):
         fields = ['id', 'order_number', 'customer_name', 'customer_email', 'total', 'status', 'payment_status', 'payment_method', 'created_at', 'items_count']
 
     def get_items_count(self, obj):
+        if hasattr(obj, 'item_count'):
+            return obj.item_count  # annotated by the queryset
         try:
             # Use the reverse relationship directly
             return OrderItem.objects.filter(order=obj).count()
@@ -127,7 +181,7 @@ class OrderListSerializer(serializers.ModelSerializer):
             return 0
 
 
-class OrderDetailSerializer(serializers.ModelSerializer):
+class OrderDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     items = OrderItemListSerializer(many=True, read_only=True)
     customer = CustomerSerializer(read_only=True)
     billing_address = AddressSerializer(read_only=True)
@@ -154,6 +208,32 @@ class OrderUpdateSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['status', 'payment_status', 'tracking_number', 'estimated_delivery', 'generate_invoice']
 
+    def validate(self, attrs):
+        if self.instance is not None:
+            reason = check_transition(self.instance, attrs.get('status'), attrs.get('payment_status'))
+            if reason:
+                raise serializers.ValidationError({'status': reason})
+        return attrs
+
+
+class OrderBulkTransitionSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=MAX_BULK_ORDERS
+    )
+    status = serializers.ChoiceField(choices=Order.ORDER_STATUS_CHOICES, required=False)
+    payment_status = serializers.ChoiceField(choices=Order.PAYMENT_STATUS_CHOICES, required=False)
+
+    def validate(self, attrs):
+        if 'status' not in attrs and 'payment_status' not in attrs:
+            raise serializers.ValidationError('status or payment_status is required')
+        return attrs
+
+
+class OrderEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderEvent
+        fields = ['id', 'position', 'order_id', 'order_number', 'event_type', 'changes', 'created_at']
+
 
 class AdminUserSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
@@ -182,7 +262,7 @@ class CODPaymentSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     order_number = serializers.CharField(source='order.order_number', read_only=True)
     customer_name = serializers.CharField(source='order.customer.name', read_only=True)
     payment_method = serializers.CharField(read_only=True)
@@ -202,7 +282,7 @@ class PaymentSerializer(serializers.ModelSerializer):
         ]
 
 
-class PaymentListSerializer(serializers.ModelSerializer):
+class PaymentListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     order_number = serializers.CharField(source='order.order_number', read_only=True)
     customer_name = serializers.CharField(source='order.customer.name', read_only=True)
     payment_method = serializers.CharField(read_only=True)
@@ -263,6 +343,31 @@ class TopProductSerializer(serializers.Serializer):
     revenue = serializers.DecimalField(max_digits=10, decimal_places=2)
 
 
+class ProductSalesSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    product_name = serializers.CharField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    order_count = serializers.IntegerField()
+    velocity = serializers.FloatField()
+    previous_units = serializers.IntegerField()
+    previous_revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units_change = serializers.IntegerField()
+    revenue_change = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units_change_percent = serializers.FloatField(allow_null=True)
+    revenue_change_percent = serializers.FloatField(allow_null=True)
+
+
+class CustomerValueSerializer(serializers.ModelSerializer):
+    customer_name = serializers.CharField(source='customer.name', read_only=True)
+    customer_email = serializers.CharField(source='customer.email', read_only=True)
+
+    class Meta:
+        model = CustomerValue
+        fields = ['customer', 'customer_name', 'customer_email', 'first_order_date', 'last_order_date',
+                  'order_count', 'lifetime_value']
+
+
 class DashboardSerializer(serializers.Serializer):
     stats = DashboardStatsSerializer()
     recent_orders = serializers.SerializerMethodField()
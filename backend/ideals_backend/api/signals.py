@@ -0,0 +1,203 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import Product, Category, Customer, Order, ShipmentDetails
+from . import order_events, order_search, product_sales, rollups, search
+from .catalog_cache import bump_version_on_commit
+from .inventory import effective_threshold, make_alert, refresh_low_stock
+from .images import needs_processing, schedule_product_images
+from .transitions import settle_stock
+
+
+_state = threading.local()
+
+
+@contextmanager
+def bulk_order_deletion():
+    """
+    Within this block the ``Order`` delete receivers do nothing: the caller
+    records the deletion events and takes the orders out of the sales
+    rollups for the whole batch itself.
+    """
+    previous = getattr(_state, 'bulk_order_deletion', False)
+    _state.bulk_order_deletion = True
+    try:
+        yield
+    finally:
+        _state.bulk_order_deletion = previous
+
+
+def in_bulk_order_deletion():
+    return getattr(_state, 'bulk_order_deletion', False)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """Keep the full-text search index in sync with product edits"""
+    if raw:
+        return
+    search.index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.unindex_products([instance.pk])
+
+
+@receiver(post_save, sender=Customer)
+def index_customer(sender, instance, raw=False, **kwargs):
+    """Keep the order search trigrams in sync with customer names and emails"""
+    if raw:
+        return
+    order_search.index_customers([instance])
+
+
+@receiver(post_delete, sender=Customer)
+def unindex_customer(sender, instance, **kwargs):
+    order_search.unindex_customers([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Any product or category change starts a new catalog cache version"""
+    bump_version_on_commit()
+
+
+@receiver(pre_save, sender=Product)
+def track_low_stock(sender, instance, raw=False, **kwargs):
+    """Keep is_low_stock in step with stock and remember threshold crossings"""
+    if raw:
+        return
+    threshold = effective_threshold(instance)
+    is_low = instance.stock < threshold
+    instance._stock_alert = None
+    if is_low != instance.is_low_stock:
+        instance.is_low_stock = is_low
+        instance._stock_alert = (is_low, threshold)
+
+
+@receiver(post_save, sender=Product)
+def log_stock_alert(sender, instance, raw=False, **kwargs):
+    alert = getattr(instance, '_stock_alert', None)
+    if raw or alert is None:
+        return
+    is_low, threshold = alert
+    make_alert(instance.pk, is_low, instance.stock, threshold).save()
+    instance._stock_alert = None
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_low_stock(sender, instance, raw=False, **kwargs):
+    """A category threshold change can move every product in it across the line"""
+    if raw:
+        return
+    refresh_low_stock(Product.objects.filter(category=instance))
+
+
+@receiver(post_save, sender=Product)
+def process_new_images(sender, instance, raw=False, **kwargs):
+    """Generate thumbnails for image URLs that have not been processed yet"""
+    if raw or not needs_processing(instance):
+        return
+    schedule_product_images(instance.pk)
+
+
+@receiver(pre_save, sender=Order)
+def track_order_transition(sender, instance, raw=False, **kwargs):
+    """Remember the previous values so post_save can settle stock and record the change"""
+    instance._previous_status = None
+    instance._previous_values = None
+    if raw or instance.pk is None:
+        return
+    previous = Order.objects.filter(pk=instance.pk).values(*order_events.TRACKED_FIELDS).first()
+    if previous is not None:
+        instance._previous_values = previous
+        instance._previous_status = (previous['status'], previous['payment_status'])
+
+
+@receiver(post_save, sender=Order)
+def settle_reservations(sender, instance, raw=False, **kwargs):
+    """Commit reserved stock on payment, release it on cancellation or rejection"""
+    previous = getattr(instance, '_previous_status', None)
+    if raw or previous is None:
+        return
+    old_status, old_payment_status = previous
+    settle_stock([(instance.pk, old_status, old_payment_status, instance.status, instance.payment_status)])
+
+
+@receiver(post_save, sender=Order)
+def record_order_change(sender, instance, created=False, raw=False, **kwargs):
+    """Append the order's change to the change feed"""
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_previous_values', None)
+    changes = order_events.diff(previous, instance, order_events.TRACKED_FIELDS)
+    if created or changes:
+        order_events.record(instance, 'created' if created else 'updated', changes)
+
+
+@receiver(post_delete, sender=Order)
+def record_order_deletion(sender, instance, **kwargs):
+    if in_bulk_order_deletion():
+        return
+    order_events.record(instance, 'deleted', {})
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollup(sender, instance, created=False, raw=False, **kwargs):
+    """Move the order between daily sales buckets as its state changes"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_values', None)
+    if created or previous is not None:
+        rollups.record_order_change(instance, None if created else previous)
+
+
+@receiver(post_delete, sender=Order)
+def remove_from_sales_rollup(sender, instance, **kwargs):
+    if in_bulk_order_deletion():
+        return
+    rollups.record_order_deletion(instance)
+
+
+@receiver(post_save, sender=Order)
+def update_product_sales(sender, instance, created=False, raw=False, **kwargs):
+    """Take cancelled and rejected orders out of the product sales rollup (new orders are added by create_order)"""
+    previous = getattr(instance, '_previous_values', None)
+    if raw or created or previous is None:
+        return
+    product_sales.record_status_change(instance, previous['status'])
+
+
+@receiver(pre_delete, sender=Order)
+def remove_from_product_sales(sender, instance, **kwargs):
+    # Before the delete cascades to the order lines the rollup is computed from
+    if not in_bulk_order_deletion() and product_sales.counts(instance.status):
+        product_sales.move_orders([instance.pk], -1)
+
+
+@receiver(pre_save, sender=ShipmentDetails)
+def track_shipment_change(sender, instance, raw=False, **kwargs):
+    instance._previous_values = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_values = ShipmentDetails.objects.filter(pk=instance.pk).values(
+        *order_events.SHIPMENT_FIELDS
+    ).first()
+
+
+@receiver(post_save, sender=ShipmentDetails)
+def record_shipment_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    changes = order_events.diff(
+        getattr(instance, '_previous_values', None), instance, order_events.SHIPMENT_FIELDS
+    )
+    if changes:
+        order_events.record(instance.order, 'shipment', changes)
@@ -1 +1,463 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .models import (
+    Product, Category, Customer, Address, Order, OrderItem, Invoice, ShipmentDetails, StockReservation, CustomerValue,
+    OrderEvent, IdempotencyKey,
+)
+from . import customer_analytics
+from .reservations import release_orders
+from .views import OrderViewSet
+
+
+class OrderListQueryCountTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Mobiles')
+        self.product = Product.objects.create(name='Phone', description='Phone', price=100, category=category, stock=1000)
+
+    def create_orders(self, count):
+        for i in range(count):
+            customer = Customer.objects.create(name=f'Customer {i}', email=f'customer{i}-{Customer.objects.count()}@example.com')
+            billing = Address.objects.create(
+                customer=customer, address_type='billing', street_address='1 Main St',
+                city='Bengaluru', state='KA', zip_code='560001', is_default=True
+            )
+            shipping = Address.objects.create(
+                customer=customer, address_type='shipping', street_address='2 Side St',
+                city='Bengaluru', state='KA', zip_code='560002', is_default=True
+            )
+            order = Order.objects.create(customer=customer, total=200, billing_address=billing, shipping_address=shipping)
+            for _ in range(2):
+                OrderItem.objects.create(order=order, product=self.product, quantity=1, price=100)
+            Invoice.objects.create(order=order, subtotal=200, total_amount=200)
+            ShipmentDetails.objects.create(
+                order=order, shipment_method='porter', driver_name='Driver', driver_phone='9999999999',
+                tracking_number=f'TRK{order.id}', estimated_delivery=timezone.now()
+            )
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.data['results']
+
+    def test_list_query_count_does_not_grow_with_orders(self):
+        self.create_orders(2)
+        small, _ = self.count_list_queries()
+
+        self.create_orders(20)
+        large, results = self.count_list_queries()
+
+        self.assertEqual(small, large)
+        self.assertEqual(len(results), 22)
+
+    def test_default_addresses_come_from_prefetch(self):
+        self.create_orders(3)
+        _, results = self.count_list_queries()
+        for order in results:
+            customer = order['customer']
+            self.assertEqual(customer['default_billing_address']['address_type'], 'billing')
+            self.assertEqual(customer['default_shipping_address']['address_type'], 'shipping')
+            self.assertEqual(len(order['items']), 2)
+
+    def test_sparse_fieldsets_load_what_nested_properties_read(self):
+        self.create_orders(5)
+        # The invoice's customer and shipping address properties read the order's relations
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/', {'fields': 'id,invoice'})
+        invoice = response.data['results'][0]['invoice']
+        self.assertTrue(invoice['customer_name'].startswith('Customer '))
+        self.assertTrue(invoice['shipping_address'].startswith('2 Side St'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/', {'omit': 'items,customer'})
+        self.assertNotIn('customer', response.data['results'][0])
+        self.assertTrue(response.data['results'][0]['invoice']['customer_email'].endswith('@example.com'))
+
+
+class StockReservationConcurrencyTest(TransactionTestCase):
+    """Simultaneous checkouts on one hot product must never oversell"""
+    # Enough threads to race for the last units, more buyers than stock
+    checkouts = 16
+    initial_stock = 5
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        category = Category.objects.create(name='Mobiles')
+        self.product = Product.objects.create(
+            name='Hot phone', description='Hot phone', price=100, category=category, stock=self.initial_stock
+        )
+        self.customers = [
+            Customer.objects.create(name=f'Customer {i}', email=f'buyer{i}@example.com')
+            for i in range(self.checkouts)
+        ]
+
+    def checkout(self, customer, barrier, results):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        barrier.wait()
+        try:
+            response = client.post('/api/orders/', {
+                'customer': customer.id,
+                'payment_method': 'cod',
+                'items': [{'product': self.product.id, 'quantity': 1}],
+            }, format='json')
+            results.append(response.status_code)
+        except Exception as e:
+            results.append(repr(e))
+        finally:
+            connection.close()
+
+    def test_concurrent_checkouts_do_not_oversell(self):
+        barrier = threading.Barrier(self.checkouts)
+        results = []
+        threads = [
+            threading.Thread(target=self.checkout, args=(customer, barrier, results))
+            for customer in self.customers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.product.refresh_from_db()
+        created = results.count(201)
+        self.assertEqual(len(results), self.checkouts)
+        self.assertEqual(created, Order.objects.count())
+        self.assertEqual(self.product.stock, self.initial_stock - created)
+        self.assertGreaterEqual(self.product.stock, 0)
+        self.assertEqual(
+            StockReservation.objects.filter(product=self.product, status='reserved').count(), created
+        )
+        # Every failed checkout was turned away for lack of stock, not by an error
+        self.assertEqual(set(results) - {201}, {409} if created < self.checkouts else set())
+        self.assertEqual(created, self.initial_stock)
+
+    def test_cancel_and_cleanup_return_stock_once(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/orders/', {
+            'customer': self.customers[0].id,
+            'payment_method': 'cod',
+            'items': [{'product': self.product.id, 'quantity': 3}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data['order']['id'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, self.initial_stock - 3)
+
+        order.payment_status = 'verified'
+        order.save()
+        self.assertEqual(StockReservation.objects.get(order=order).status, 'committed')
+
+        order.status = 'cancelled'
+        order.save()
+        order.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, self.initial_stock)
+        self.assertEqual(release_orders([order.pk]), 0)
+
+
+class IdempotencyKeyTest(TransactionTestCase):
+    """A request sent again with the same Idempotency-Key runs once"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Mobiles')
+        self.product = Product.objects.create(name='Phone', description='Phone', price=100, category=category, stock=10)
+        self.customer = Customer.objects.create(name='Customer', email='customer@example.com')
+
+    def checkout(self, key, quantity=1):
+        return self.client.post('/api/orders/', {
+            'customer': self.customer.id,
+            'payment_method': 'cod',
+            'items': [{'product': self.product.id, 'quantity': quantity}],
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.checkout('checkout-1')
+        self.assertEqual(first.status_code, 201)
+        retry = self.checkout('checkout-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['order']['id'], first.data['order']['id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_with_a_different_body_is_rejected(self):
+        self.assertEqual(self.checkout('checkout-1').status_code, 201)
+        response = self.checkout('checkout-1', quantity=2)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_retry_while_the_first_request_runs_gets_409(self):
+        # The first request's response_status stays null until it finishes
+        self.checkout('checkout-1')
+        IdempotencyKey.objects.update(response_status=None, response_body=None)
+        response = self.checkout('checkout-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_gateway_call_runs_outside_a_transaction(self):
+        calls = []
+
+        def create_order(data):
+            calls.append(connection.in_atomic_block)
+            return {'id': 'order_gateway_1'}
+
+        body = {'amount': '100.00', 'order_id': 1}
+        with mock.patch('api.views.razorpay_client') as client:
+            client.order.create.side_effect = create_order
+            first = self.client.post(
+                '/api/payments/create_razorpay_order/', body, format='json', HTTP_IDEMPOTENCY_KEY='pay-1'
+            )
+            retry = self.client.post(
+                '/api/payments/create_razorpay_order/', body, format='json', HTTP_IDEMPOTENCY_KEY='pay-1'
+            )
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(calls, [False])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['razorpay_order_id'], 'order_gateway_1')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class OrderQueueIndexTest(TestCase):
+    """The admin work queues must be served by an index, without a table scan or a sort"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.customer = Customer.objects.create(name='Customer', email='customer@example.com')
+
+    def assertIndexScan(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f'INDEX {index_name}', plan)
+        self.assertNotIn('SCAN api_order', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_queues_use_indexes(self):
+        indexes = {
+            'awaiting_payment': 'order_status_payment_idx',
+            'payment_verification': 'order_method_payment_idx',
+            'ready_to_dispatch': 'order_status_payment_idx',
+            'out_for_delivery': 'order_status_payment_idx',
+        }
+        for queue, filters in OrderViewSet.QUEUES.items():
+            with self.subTest(queue=queue):
+                queryset = Order.objects.filter(**filters).order_by('-created_at', '-id')[:21]
+                self.assertIndexScan(queryset, indexes[queue])
+
+    def test_list_filters_use_indexes(self):
+        since = timezone.now() - timedelta(days=7)
+        self.assertIndexScan(
+            Order.objects.filter(payment_status='pending').order_by('-created_at', '-id'),
+            'order_payment_created_idx'
+        )
+        self.assertIndexScan(
+            Order.objects.filter(created_at__gte=since).order_by('-created_at', '-id'),
+            'order_created_id_idx'
+        )
+        self.assertIndexScan(
+            Order.objects.filter(customer=self.customer).order_by('-created_at'),
+            'order_customer_created_idx'
+        )
+
+    def test_queue_endpoint_pages_and_filters_by_date(self):
+        orders = [
+            Order.objects.create(customer=self.customer, total=100, status='processing', payment_status='verified')
+            for _ in range(3)
+        ]
+        Order.objects.create(customer=self.customer, total=100)
+        Order.objects.filter(pk=orders[0].pk).update(created_at=timezone.now() - timedelta(days=10))
+
+        response = self.client.get('/api/orders/queues/ready_to_dispatch/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([order['id'] for order in response.data['results']], [orders[2].id, orders[1].id])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([order['id'] for order in response.data['results']], [orders[0].id])
+        self.assertIsNone(response.data['next'])
+
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response = self.client.get('/api/orders/queues/ready_to_dispatch/', {'created_after': since})
+        self.assertEqual(len(response.data['results']), 2)
+
+        response = self.client.get('/api/orders/', {'created_before': since})
+        self.assertEqual([order['id'] for order in response.data['results']], [orders[0].id])
+
+        self.assertEqual(self.client.get('/api/orders/', {'created_after': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/orders/queues/unknown/').status_code, 404)
+
+    def test_queue_search_pages_in_rank_order(self):
+        exact = Order.objects.create(customer=self.customer, total=100, status='processing', payment_status='verified')
+        # A customer whose name looks like the order number matches by similarity only
+        namesake = Customer.objects.create(name=exact.order_number, email='namesake@example.com')
+        similar = [
+            Order.objects.create(customer=namesake, total=100, status='processing', payment_status='verified')
+            for _ in range(2)
+        ]
+
+        url = '/api/orders/queues/ready_to_dispatch/'
+        response = self.client.get(url, {'search': exact.order_number, 'page_size': 2})
+        self.assertEqual([order['id'] for order in response.data['results']], [exact.id, similar[1].id])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([order['id'] for order in response.data['results']], [similar[0].id])
+        self.assertIsNone(response.data['next'])
+
+
+class ProductBulkUpdateTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        category = Category.objects.create(name='Mobiles')
+        self.product = Product.objects.create(name='Phone', description='Phone', price=100, category=category, stock=5)
+
+    def test_stock_beyond_the_column_range_is_rejected(self):
+        response = self.client.post('/api/products/bulk_update/', {'updates': [{
+            'id': self.product.id, 'stock': 2147483648, 'expected_updated_at': self.product.updated_at,
+        }]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], [])
+        self.assertIn('stock', response.data['errors'][0]['errors'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+
+class ProductImportTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        Category.objects.create(name='Mobiles')
+
+    def upload(self, content):
+        return self.client.post('/api/products/import_products/', {
+            'file': SimpleUploadedFile('products.csv', content, content_type='text/csv'),
+        }, format='multipart')
+
+    def test_file_that_is_not_utf8_is_refused_before_any_chunk_is_written(self):
+        rows = [f'SKU-{i},Phone {i},100,Mobiles,5' for i in range(1500)]
+        content = ('sku,name,price,category,stock\n' + '\n'.join(rows) + '\n').encode('utf-8')
+        response = self.upload(content + b'SKU-X,Caf\xe9,100,Mobiles,5\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Product.objects.count(), 0)
+
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1500)
+
+
+class OrderChangeFeedTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def poll(self, since):
+        response = self.client.get('/api/orders/changes/', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return [event['order_number'] for event in response.data['results']], response.data['next_cursor']
+
+    def test_events_committed_late_with_a_lower_id_are_still_delivered(self):
+        for pk in (10, 11):
+            OrderEvent.objects.create(id=pk, order_id=pk, order_number=f'ORD-{pk}', event_type='created')
+        numbers, cursor = self.poll(0)
+        self.assertEqual(numbers, ['ORD-10', 'ORD-11'])
+
+        # Inserted before the others but committed after the consumer read them
+        OrderEvent.objects.create(id=5, order_id=5, order_number='ORD-5', event_type='created')
+        numbers, cursor = self.poll(cursor)
+        self.assertEqual(numbers, ['ORD-5'])
+        self.assertEqual(self.poll(cursor), ([], cursor))
+
+
+class RestockAlertFeedTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        category = Category.objects.create(name='Mobiles')
+        # Created below the reorder threshold, so each one logs an alert
+        for i in range(3):
+            Product.objects.create(name=f'Phone {i}', description='Phone', price=100, category=category, stock=1)
+
+    def test_limit_is_clamped_so_polling_always_advances(self):
+        for limit in (0, -3):
+            with self.subTest(limit=limit):
+                response = self.client.get('/api/products/restock_alerts/', {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), 1)
+                self.assertTrue(response.data['has_more'])
+                self.assertGreater(response.data['next_cursor'], 0)
+
+        response = self.client.get('/api/products/restock_alerts/', {'limit': 'many'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CustomerAnalyticsEngineTest(TestCase):
+    """The NumPy and the pure Python folds must produce the same report"""
+
+    def setUp(self):
+        customers = [
+            Customer.objects.create(name=f'Customer {i}', email=f'customer{i}@example.com') for i in range(3)
+        ]
+        # Far above the other ids, which must not size the per-customer arrays
+        customers.append(Customer.objects.create(id=1000000, name='Late', email='late@example.com'))
+        now = timezone.now()
+        # (customer, days ago, total, status)
+        history = [
+            (0, 200, '100.00', 'delivered'), (0, 150, '50.50', 'delivered'), (0, 10, '20.00', 'pending'),
+            (1, 120, '300.00', 'delivered'), (1, 100, '10.00', 'delivered'), (2, 40, '75.25', 'processing'),
+            (2, 30, '5.00', 'cancelled'), (3, 65, '12.00', 'delivered'), (3, 5, '8.00', 'pending'),
+        ]
+        for customer, days_ago, total, status in history:
+            order = Order.objects.create(customer=customers[customer], total=total, status=status)
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=days_ago))
+        self.customers = customers
+
+    def run_engine(self, use_numpy):
+        # Small chunks, so customers span several folds
+        report = customer_analytics.compute(chunk_size=3, use_numpy=use_numpy)
+        summary = {key: value for key, value in report.summary.items() if key not in ('engine', 'elapsed_seconds')}
+        values = list(CustomerValue.objects.order_by('customer_id').values_list(
+            'customer_id', 'first_order_date', 'last_order_date', 'order_count', 'lifetime_value'
+        ))
+        return summary, report.cohorts, values
+
+    def test_python_engine(self):
+        summary, cohorts, values = self.run_engine(use_numpy=False)
+        self.assertEqual(summary['customers'], 4)
+        self.assertEqual(summary['orders'], 8)
+        self.assertEqual(summary['repeat_customers'], 3)
+        self.assertEqual(str(summary['total_revenue']), '575.75')
+        self.assertEqual(
+            [(customer_id, order_count, str(value)) for customer_id, _, _, order_count, value in values],
+            [(self.customers[0].id, 3, '170.50'), (self.customers[1].id, 2, '310.00'),
+             (self.customers[2].id, 1, '75.25'), (self.customers[3].id, 2, '20.00')]
+        )
+        self.assertEqual(sum(cohort['customers'] for cohort in cohorts), 4)
+
+    @skipUnless(customer_analytics.np is not None, 'NumPy is not installed')
+    def test_numpy_engine_matches_python(self):
+        self.assertEqual(self.run_engine(use_numpy=True), self.run_engine(use_numpy=False))
+
+        today = timezone.localdate()
+        state = customer_analytics.NumpyState()
+        for columns in customer_analytics.order_chunks(3):
+            state.fold(*columns, end_month=customer_analytics.month_number(today.year, today.month))
+        self.assertLess(state.size, len(self.customers) * 2)
@@ -0,0 +1,175 @@
+"""
+Order state machine.
+
+``STATUS_TRANSITIONS`` and ``PAYMENT_TRANSITIONS`` list the moves allowed
+from each ``Order.status`` / ``Order.payment_status``; moves into a state
+listed in ``STATUS_GUARDS`` must also pass the ``Order`` guard properties.
+``check_transition`` validates one order (``OrderUpdateSerializer`` uses it),
+``bulk_transition`` validates and applies one transition to many orders with
+a handful of set-based UPDATEs, and reports the orders it had to reject.
+
+Bulk updates skip ``Order.save``, so they append the batch's change events
+and move the orders between sales rollup buckets (daily and per product)
+themselves, and
+``settle_stock``, which the ``Order`` signals also use, settles the stock
+reservations of the whole batch.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order
+from . import order_events, product_sales, rollups
+from .reservations import commit_orders, release_orders
+
+
+MAX_BULK_ORDERS = 1000
+
+STATUS_TRANSITIONS = {
+    'pending': {'processing', 'cancelled', 'rejected'},
+    'processing': {'out_for_delivery', 'cancelled', 'rejected'},
+    'out_for_delivery': {'delivered', 'cancelled'},
+    'delivered': set(),
+    'cancelled': set(),
+    'rejected': set(),
+}
+
+PAYMENT_TRANSITIONS = {
+    'pending': {'processing', 'verified', 'failed', 'rejected'},
+    'processing': {'verified', 'failed', 'rejected'},
+    'failed': {'pending', 'processing', 'verified'},
+    'rejected': {'processing', 'verified'},
+    'verified': set(),
+}
+
+# Target status: (guard, reason given when it fails)
+STATUS_GUARDS = {
+    'out_for_delivery': (
+        lambda order: order.can_move_to_dispatch or order.can_move_to_out_for_delivery,
+        'Order must be processing with a verified payment, and offline orders need shipment details',
+    ),
+}
+
+
+def check_transition(order, status=None, payment_status=None):
+    """Reason the order cannot move to the given state, or None if it can"""
+    if payment_status is not None and payment_status != order.payment_status:
+        if payment_status not in PAYMENT_TRANSITIONS.get(order.payment_status, ()):
+            return f'Payment status cannot change from {order.payment_status} to {payment_status}'
+
+    if status is not None and status != order.status:
+        if status not in STATUS_TRANSITIONS.get(order.status, ()):
+            return f'Status cannot change from {order.status} to {status}'
+        if status in STATUS_GUARDS:
+            guard, reason = STATUS_GUARDS[status]
+            # Guards see the payment status the order is about to get
+            current_payment_status = order.payment_status
+            if payment_status is not None:
+                order.payment_status = payment_status
+            try:
+                if not guard(order):
+                    return reason
+            finally:
+                order.payment_status = current_payment_status
+    return None
+
+
+def bulk_transition(order_ids, status=None, payment_status=None, user=None):
+    """
+    Move the given orders to ``status`` and/or ``payment_status``.
+    Returns ``(updated_ids, rejected)`` where ``rejected`` is a list of
+    ``{'id', 'order_number', 'reason'}``.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    with transaction.atomic():
+        orders = {
+            order.pk: order
+            for order in Order.objects.select_for_update(of=('self',))
+            .select_related('invoice', 'shipment_details')
+            .filter(pk__in=order_ids)
+            .only(
+                'id', 'order_number', 'status', 'payment_status', 'payment_method', 'total', 'created_at',
+                'invoice__id', 'shipment_details__id',
+            )
+        }
+
+        updated, rejected = [], []
+        for pk in order_ids:
+            order = orders.get(pk)
+            if order is None:
+                rejected.append({'id': pk, 'order_number': None, 'reason': 'Order not found'})
+                continue
+            reason = check_transition(order, status, payment_status)
+            if reason:
+                rejected.append({'id': pk, 'order_number': order.order_number, 'reason': reason})
+            else:
+                updated.append(pk)
+
+        if not updated:
+            return updated, rejected
+
+        now = timezone.now()
+        changes = {'updated_at': now}
+        if status is not None:
+            changes['status'] = status
+        if payment_status is not None:
+            changes['payment_status'] = payment_status
+            if payment_status == 'verified':
+                changes.update(payment_verified_by=user, payment_verified_at=now)
+        Order.objects.filter(pk__in=updated).update(**changes)
+        order_events.record_many([
+            order_events.make_event(pk, orders[pk].order_number, 'updated', {
+                field: [getattr(orders[pk], field), value]
+                for field, value in (('status', status), ('payment_status', payment_status))
+                if value is not None and value != getattr(orders[pk], field)
+            })
+            for pk in updated
+            if (status or orders[pk].status, payment_status or orders[pk].payment_status)
+            != (orders[pk].status, orders[pk].payment_status)
+        ])
+
+        deltas = {}
+        for pk in updated:
+            previous = rollups.order_values(orders[pk])
+            current = dict(previous)
+            if status is not None:
+                current['status'] = status
+            if payment_status is not None:
+                current['payment_status'] = payment_status
+            rollups.move(deltas, orders[pk].created_at, previous, current)
+        rollups.apply(deltas)
+
+        if status is not None and not product_sales.counts(status):
+            # Cancelled and rejected orders stop counting as product sales (and never leave those states)
+            product_sales.move_orders([pk for pk in updated if product_sales.counts(orders[pk].status)], -1)
+
+        settle_stock([
+            (pk, orders[pk].status, orders[pk].payment_status, status or orders[pk].status,
+             payment_status or orders[pk].payment_status)
+            for pk in updated
+        ])
+    return updated, rejected
+
+
+def settle_stock(changes):
+    """
+    Commit or release the stock reservations of orders that changed state.
+    ``changes`` are ``(order_id, old_status, old_payment_status, status,
+    payment_status)`` tuples.
+    """
+    release_all, release_reserved, commit = [], [], []
+    for order_id, old_status, old_payment_status, status, payment_status in changes:
+        if status in ('cancelled', 'rejected'):
+            if old_status not in ('cancelled', 'rejected'):
+                release_all.append(order_id)
+        elif payment_status in ('failed', 'rejected'):
+            if old_payment_status not in ('failed', 'rejected'):
+                release_reserved.append(order_id)
+        elif payment_status == 'verified' and old_payment_status != 'verified':
+            commit.append(order_id)
+
+    if release_all:
+        release_orders(release_all)
+    if release_reserved:
+        release_orders(release_reserved, statuses=('reserved',))
+    if commit:
+        commit_orders(commit)
@@ -2,27 +2,46 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
-from datetime import timedelta
-from .models import Product, Order, OrderItem, Customer, AdminUser, Category, Payment, OnlinePayment, OfflinePayment, CODPayment, Address, Invoice
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+import codecs
+from .models import Product, StockAlert, Order, OrderItem, Customer, AdminUser, Category, Payment, OnlinePayment, OfflinePayment, CODPayment, Address, Invoice, CustomerValue
 from .serializers import (
-    ProductSerializer, ProductListSerializer, ProductDetailSerializer,
-    OrderSerializer, OrderListSerializer, OrderDetailSerializer, OrderUpdateSerializer,
-    CustomerSerializer, AdminUserSerializer, DashboardSerializer,
+    ProductSerializer, ProductListSerializer, ProductDetailSerializer, ProductBulkUpdateItemSerializer, StockAlertSerializer,
+    OrderSerializer, OrderListSerializer, OrderDetailSerializer, OrderUpdateSerializer, OrderBulkTransitionSerializer, OrderItemCreateSerializer, OrderEventSerializer,
+    CustomerSerializer, AdminUserSerializer, DashboardSerializer, ProductSalesSerializer, CustomerValueSerializer,
     CategorySerializer,PaymentListSerializer,PaymentSerializer,OnlinePayment,OnlinePaymentSerializer,OfflinePaymentSerializer,CODPaymentSerializer,CODPaymentSerializer,
     CustomTokenObtainPairSerializer, RegisterSerializer, CustomerProfileSerializer, AddressSerializer
 )
-
-
-class ProductViewSet(viewsets.ModelViewSet):
+from .pagination import KeysetPagination
+from .fieldsets import SparseQuerysetMixin
+from .search import search_products
+from .order_search import search_orders
+from .facets import get_facets
+from .catalog_cache import cached_response
+from .importers import ENCODING, check_encoding, detect_format, import_products, iter_rows
+from .inventory import bulk_update_products
+from .orders import OrderError, create_order
+from .reservations import InsufficientStock, release_orders
+from .transitions import bulk_transition
+from . import customer_analytics, dashboard, order_events, product_sales, rollups
+from .idempotency import idempotent
+
+
+class ProductViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = None  # Disable pagination for this viewset
+    pagination_class = KeysetPagination
+    sparse_always_load = ('created_at',)
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -34,24 +53,38 @@ class ProductViewSet(viewsets.ModelViewSet):
         return ProductSerializer
 
     def retrieve(self, request, *args, **kwargs):
+        return cached_response(request, f"detail:{kwargs['pk']}", self._build_detail)
+
+    def _build_detail(self):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
-        return Response({
+        return {
             "product": serializer.data,
             "message": "Successfully retrieved product"
-        })
+        }
     
     def list(self, request, *args, **kwargs):
-        response = super().list(request, *args, **kwargs) 
-        
-        print("response before:", response.data)  
-        response.data = {
+        return cached_response(request, 'list', self._build_list)
+
+    def _build_list(self):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        # Legacy unpaginated listing (?paginate=false) for clients not yet using cursors
+        if self.request.query_params.get('paginate', '').lower() in ('false', '0', 'no'):
+            serializer = self.get_serializer(queryset, many=True)
+            return {
+                "status_code": status.HTTP_302_FOUND,
+                "message": "List of products",
+                "results": serializer.data
+            }
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return {
             "status_code": status.HTTP_302_FOUND,
             "message": "List of products",
-            "results": response.data
+            **self.paginator.get_paginated_data(serializer.data)
         }
-        return response
-    
 
     def get_queryset(self):
         queryset = Product.objects.all()
@@ -68,17 +101,121 @@ class ProductViewSet(viewsets.ModelViewSet):
         elif status_filter == 'inactive':
             queryset = queryset.filter(is_active=False)
         
-        # Search by name or description
-        search = self.request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | 
-                Q(description__icontains=search) |
-                Q(brand__icontains=search)
-            )
+        # Filter by brand / color
+        brand = self.request.query_params.get('brand', None)
+        if brand:
+            queryset = queryset.filter(brand__iexact=brand)
+
+        color = self.request.query_params.get('color', None)
+        if color:
+            queryset = queryset.filter(color__iexact=color)
+
+        # Filter by price range: min_price <= price < max_price, the same
+        # half-open ranges as the facet price buckets
+        min_price = self.parse_price_param('min_price')
+        if min_price is not None:
+            queryset = queryset.filter(price__gte=min_price)
+
+        max_price = self.parse_price_param('max_price')
+        if max_price is not None:
+            queryset = queryset.filter(price__lt=max_price)
+
+        # Full-text search over name, brand, model, color and description
+        search_query = self.request.query_params.get('search', None)
+        if search_query:
+            queryset = search_products(queryset, search_query)
         
         return queryset
 
+    def parse_price_param(self, name):
+        """Non-negative decimal query parameter, or None when absent"""
+        value = self.request.query_params.get(name, None)
+        if not value:
+            return None
+        try:
+            price = Decimal(value)
+        except ArithmeticError:
+            price = None
+        if price is None or not price.is_finite() or price < 0:
+            raise ValidationError({name: 'Enter a valid non-negative price.'})
+        return price
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Matching products plus category/brand/color/price facet counts for the current filters"""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = ProductListSerializer(page, many=True, context=self.get_serializer_context())
+        return Response({
+            "status_code": status.HTTP_200_OK,
+            "message": "Product facets",
+            "facets": get_facets(queryset, request.query_params),
+            **self.paginator.get_paginated_data(serializer.data)
+        })
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser],
+            parser_classes=[MultiPartParser, FormParser])
+    def import_products(self, request):
+        """Bulk create/update products from an uploaded CSV or JSONL file (admin only)"""
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({
+                'error': 'A CSV or JSONL file is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = request.data.get('format') or detect_format(upload.name)
+        if file_format not in ('csv', 'jsonl'):
+            return Response({
+                'error': 'Unsupported file format. Upload a .csv or .jsonl file'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Chunks commit as they are imported, so refuse a bad file before writing anything
+        try:
+            check_encoding(upload)
+        except UnicodeDecodeError:
+            return Response({
+                'error': 'File must be UTF-8 encoded'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        result = import_products(iter_rows(codecs.iterdecode(upload, ENCODING), file_format))
+
+        return Response({
+            'message': 'Product import finished',
+            **result.as_dict()
+        })
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk_update(self, request):
+        """Update price/stock/status of many products at once with optimistic concurrency"""
+        entries = request.data.get('updates') if isinstance(request.data, dict) else request.data
+        if not isinstance(entries, list) or not entries:
+            return Response({
+                'error': 'A non-empty list of updates is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        valid = []
+        errors = []
+        for index, entry in enumerate(entries):
+            serializer = ProductBulkUpdateItemSerializer(data=entry)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+            else:
+                errors.append({
+                    'index': index,
+                    'id': entry.get('id') if isinstance(entry, dict) else None,
+                    'errors': serializer.errors
+                })
+
+        updated_ids, conflicts, updated_at = bulk_update_products(valid) if valid else ([], [], None)
+
+        return Response({
+            'message': f'Updated {len(updated_ids)} products',
+            'updated': updated_ids,
+            'updated_at': updated_at,
+            'conflicts': conflicts,
+            'errors': errors
+        }, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'])
     def categories(self, request):
         categories = Product.objects.values_list('category', flat=True).distinct()
@@ -86,11 +223,49 @@ class ProductViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
-        threshold = int(self.request.query_params.get('threshold', 10))
-        products = Product.objects.filter(stock__lt=threshold)
+        threshold = self.request.query_params.get('threshold', None)
+        if threshold is not None:
+            try:
+                threshold = int(threshold)
+            except ValueError:
+                threshold = None
+            # Stock is a positive 32-bit integer, so larger thresholds mean nothing more
+            if threshold is None or not 0 <= threshold <= 2147483647:
+                raise ValidationError({'threshold': 'Enter a whole number between 0 and 2147483647.'})
+            # Ad-hoc threshold, scans stock directly
+            products = Product.objects.filter(stock__lt=threshold)
+        else:
+            # Products below their own/category reorder threshold (partial index)
+            products = Product.objects.filter(is_low_stock=True)
         serializer = ProductListSerializer(products, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def restock_alerts(self, request):
+        """Stock threshold crossings after the ?since= cursor, oldest first"""
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            return Response({
+                'error': 'since and limit must be integers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(limit, 1), 500)
+
+        alerts = StockAlert.objects.filter(id__gt=since).select_related('product').order_by('id')
+        alert_type = request.query_params.get('type', None)
+        if alert_type:
+            alerts = alerts.filter(alert_type=alert_type)
+
+        alerts = list(alerts[:limit + 1])
+        has_more = len(alerts) > limit
+        alerts = alerts[:limit]
+        return Response({
+            'results': StockAlertSerializer(alerts, many=True).data,
+            'next_cursor': alerts[-1].id if alerts else since,
+            'has_more': has_more
+        })
+
     def perform_create(self, serializer):
         # Process image field to convert newline-separated URLs to list
         data = serializer.validated_data
@@ -112,13 +287,34 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer.save()
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = None  # Disable pagination for this viewset
 
+    # Prefetch plan for OrderDetailSerializer. Foreign keys and one-to-ones
+    # (customer, billing/shipping address, invoice, shipment details) are
+    # joined by SparseQuerysetMixin; items and customer addresses are
+    # prefetched with these querysets, and the customer's default addresses
+    # are then picked from the prefetched set
+    sparse_prefetch = {
+        'items': OrderItem.objects.order_by('id'),
+        'customer__addresses': Address.objects.order_by('id'),
+    }
+    sparse_actions = ('list', 'retrieve', 'queue')
+    sparse_always_load = ('created_at',)
+
+    # Admin work queues, served newest first with keyset pagination. Each
+    # one is an equality match on a prefix of an Order index
+    QUEUES = {
+        'awaiting_payment': {'status': 'pending', 'payment_status': 'pending'},
+        'payment_verification': {'payment_method': 'offline', 'payment_status': 'processing'},
+        'ready_to_dispatch': {'status': 'processing', 'payment_status': 'verified'},
+        'out_for_delivery': {'status': 'out_for_delivery', 'payment_status': 'verified'},
+    }
+
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in ['list', 'queue']:
             return OrderDetailSerializer  # Use detail serializer to include items
         elif self.action == 'retrieve':
             return OrderDetailSerializer
@@ -137,7 +333,6 @@ class OrderViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         response = super().list(request, *args, **kwargs) 
         
-        print("response before:", response.data)  
         response.data = {
             "status_code": status.HTTP_302_FOUND,
             "message": "List of orders",
@@ -158,17 +353,63 @@ class OrderViewSet(viewsets.ModelViewSet):
         if payment_status:
             queryset = queryset.filter(payment_status=payment_status)
         
-        # Search by order number or customer
+        # Filter by creation time: created_after <= created_at < created_before
+        created_after = self.parse_created_param('created_after')
+        if created_after:
+            queryset = queryset.filter(created_at__gte=created_after)
+        created_before = self.parse_created_param('created_before')
+        if created_before:
+            queryset = queryset.filter(created_at__lt=created_before)
+
+        # Search by order number or customer, best matches first
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(order_number__icontains=search) |
-                Q(customer__name__icontains=search) |
-                Q(customer__email__icontains=search)
-            )
+            queryset = search_orders(queryset, search)
         
         return queryset
 
+    def parse_created_param(self, name):
+        """Datetime (ISO 8601) or date query parameter; a date means midnight in the current timezone"""
+        value = self.request.query_params.get(name, None)
+        if not value:
+            return None
+        try:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                day = parse_date(value)
+                parsed = datetime.combine(day, time.min) if day else None
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: 'Enter a valid date or datetime.'})
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    @action(detail=False, methods=['get'], url_path=r'queues/(?P<queue>[a-z_]+)')
+    def queue(self, request, queue=None):
+        """One of the admin work queues, a page at a time"""
+        filters = self.QUEUES.get(queue)
+        if filters is None:
+            return Response({
+                'error': f'Unknown queue {queue}. Available: {", ".join(self.QUEUES)}'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        queryset = self.filter_queryset(self.get_queryset().filter(**filters))
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return Response({
+            "status_code": status.HTTP_302_FOUND,
+            "message": f"Orders in queue {queue}",
+            **paginator.get_paginated_data(serializer.data)
+        })
+
+    def perform_destroy(self, instance):
+        # Stock held for an unpaid order goes back on the shelf
+        release_orders([instance.pk], statuses=('reserved',))
+        instance.delete()
+
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
         order = self.get_object()
@@ -217,6 +458,42 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'])
+    def bulk_transition(self, request):
+        """Move many orders to a new status and/or payment status; invalid moves are reported per order"""
+        serializer = OrderBulkTransitionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        updated_ids, rejected = bulk_transition(
+            data['ids'], data.get('status'), data.get('payment_status'), user=request.user
+        )
+        return Response({
+            'message': f'Updated {len(updated_ids)} orders',
+            'updated': updated_ids,
+            'rejected': rejected
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """Order change events after ?since=<cursor>, oldest first; pass next_cursor to the next poll"""
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', order_events.DEFAULT_LIMIT))
+        except ValueError:
+            return Response({
+                'error': 'since and limit must be integers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(limit, 1), order_events.MAX_LIMIT)
+
+        events, has_more = order_events.events_since(since, limit)
+        return Response({
+            'results': OrderEventSerializer(events, many=True).data,
+            'next_cursor': events[-1].position if events else since,
+            'has_more': has_more
+        })
+
     @action(detail=False, methods=['get'])
     def status_counts(self, request):
         counts = Order.objects.values('status').annotate(count=Count('id'))
@@ -227,26 +504,6 @@ class OrderViewSet(viewsets.ModelViewSet):
         counts = Order.objects.values('payment_status').annotate(count=Count('id'))
         return Response(counts)
 
-    @action(detail=False, methods=['post'])
-    def cleanup_pending_orders(self, request):
-        """Clean up old pending orders (older than 1 hour)"""
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        cutoff_time = timezone.now() - timedelta(hours=1)
-        old_pending_orders = Order.objects.filter(
-            status='pending',
-            payment_status='pending',
-            created_at__lt=cutoff_time
-        )
-        
-        count = old_pending_orders.count()
-        old_pending_orders.delete()
-        
-        return Response({
-            'message': f'Cleaned up {count} old pending orders'
-        })
-
     @action(detail=True, methods=['post'])
     def generate_invoice(self, request, pk=None):
         """Generate invoice for an order"""
@@ -291,68 +548,40 @@ class OrderViewSet(viewsets.ModelViewSet):
                 'error': f'Failed to generate invoice: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @idempotent('orders.create')
     def create(self, request, *args, **kwargs):
+        # Extract items from request data
+        items_data = request.data.pop('items', [])
+
+        # Create the order and its items in one transaction, priced from the products
+        serializer = self.get_serializer(data=request.data)
+        items_serializer = OrderItemCreateSerializer(data=items_data, many=True)
+        if not items_serializer.is_valid():
+            return Response({'items': items_serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Database and other unexpected errors are left to propagate as 500s so that
+        # an Idempotency-Key is released and the checkout can be retried
         try:
-            # Extract items from request data
-            items_data = request.data.pop('items', [])
-            
-            # Check if there's already a pending order for this customer with same items
-            customer_id = request.data.get('customer')
-            if customer_id:
-                # Check for existing pending orders for this customer
-                existing_pending_orders = Order.objects.filter(
-                    customer_id=customer_id,
-                    status='pending',
-                    payment_status='pending'
-                ).order_by('-created_at')
-                
-                # If there are recent pending orders (within last 30 minutes), return the latest one
-                if existing_pending_orders.exists():
-                    latest_pending = existing_pending_orders.first()
-                    # Check if it's within 30 minutes
-                    from django.utils import timezone
-                    from datetime import timedelta
-                    if latest_pending.created_at > timezone.now() - timedelta(minutes=30):
-                        # Return existing order instead of creating new one
-                        order_serializer = OrderDetailSerializer(latest_pending)
-                        return Response({
-                            'order': order_serializer.data,
-                            'message': 'Using existing pending order'
-                        }, status=status.HTTP_200_OK)
-            
-            # Create the order
-            serializer = self.get_serializer(data=request.data)
-            if serializer.is_valid():
-                order = serializer.save()
-                
-                # Create order items
-                for item_data in items_data:
-                    product = Product.objects.get(id=item_data['product'])
-                    OrderItem.objects.create(
-                        order=order,
-                        product=product,
-                        product_name=product.name,
-                        product_image=product.images[0] if product.images else None,
-                        quantity=item_data['quantity'],
-                        price=item_data['price'],
-                        total=item_data['quantity'] * item_data['price']
-                    )
-                
-                # Return the created order with items
-                order_serializer = OrderDetailSerializer(order)
-                return Response({
-                    'order': order_serializer.data,
-                    'message': 'Order created successfully'
-                }, status=status.HTTP_201_CREATED)
-            else:
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        except Exception as e:
+            order = create_order(serializer, items_serializer.validated_data)
+        except OrderError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientStock as e:
             return Response({
-                'error': str(e)
-            }, status=status.HTTP_400_BAD_REQUEST)
+                'error': str(e),
+                'product': e.product_id
+            }, status=status.HTTP_409_CONFLICT)
 
+        # Return the created order with items
+        order_serializer = OrderDetailSerializer(order)
+        return Response({
+            'order': order_serializer.data,
+            'message': 'Order created successfully'
+        }, status=status.HTTP_201_CREATED)
 
-class InvoiceViewSet(viewsets.ModelViewSet):
+
+class InvoiceViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Invoice.objects.all()
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = None
@@ -548,7 +777,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_404_NOT_FOUND)
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -576,123 +805,148 @@ class AdminUserViewSet(viewsets.ModelViewSet):
 
 class DashboardViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    MAX_CHART_DAYS = 5 * 366
+    DEFAULT_PRODUCT_LIMIT = 10
+    MAX_PRODUCT_LIMIT = 100
+    DEFAULT_CUSTOMER_LIMIT = 10
+    MAX_CUSTOMER_LIMIT = 100
 
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        # Calculate dashboard statistics
-        total_products = Product.objects.filter(is_deleted=False).count()
-        total_orders = Order.objects.count()
-        total_customers = Customer.objects.count()
-        
-        # Revenue by payment method
-        online_revenue = Order.objects.filter(
-            payment_status='verified', 
-            payment_method='online'
-        ).aggregate(total=Sum('total'))['total'] or 0
-        
-        offline_revenue = Order.objects.filter(
-            payment_status='verified', 
-            payment_method='offline'
-        ).aggregate(total=Sum('total'))['total'] or 0
-        
-        cod_revenue = Order.objects.filter(
-            payment_status='verified', 
-            payment_method='cod'
-        ).aggregate(total=Sum('total'))['total'] or 0
-        
-        total_revenue = online_revenue + offline_revenue + cod_revenue
-        
-        # Order status counts
-        pending_orders = Order.objects.filter(status='pending').count()
-        delivered_orders = Order.objects.filter(status='delivered').count()
-        cancelled_orders = Order.objects.filter(status='cancelled').count()
-        
-        # Payment status counts
-        verified_payments = Order.objects.filter(payment_status='verified').count()
-        pending_payments = Order.objects.filter(payment_status='pending').count()
-        failed_payments = Order.objects.filter(payment_status='failed').count()
-        
-        low_stock_products = Product.objects.filter(stock__lt=10, is_deleted=False).count()
-
-        # Recent orders (last 5)
-        recent_orders = Order.objects.all()[:5]
-        print(f"Recent orders count: {recent_orders.count()}")
-        for order in recent_orders:
-            print(f"Order {order.id}: {order.order_number}")
-            try:
-                items_count = order.items.count()
-                print(f"  Items count: {items_count}")
-            except Exception as e:
-                print(f"  Error getting items count: {e}")
-
-        # Top products (based on order items)
-        top_products = OrderItem.objects.values(
-            'product__id', 'product__name'
-        ).annotate(
-            total_sold=Sum('quantity'),
-            revenue=Sum('total')
-        ).order_by('-total_sold')[:5]
-
-        # Format top products data
-        top_products_data = []
-        for item in top_products:
-            top_products_data.append({
-                'product_id': item['product__id'],
-                'product_name': item['product__name'],
-                'total_sold': item['total_sold'],
-                'revenue': float(item['revenue'])
-            })
+        # Cached snapshot, rebuilt at most once per DASHBOARD_SNAPSHOT_TTL
+        return Response(dashboard.get_snapshot())
 
-        data = {
-            'stats': {
-                'total_products': total_products,
-                'total_orders': total_orders,
-                'total_customers': total_customers,
-                'total_revenue': total_revenue,
-                'online_revenue': online_revenue,
-                'offline_revenue': offline_revenue,
-                'cod_revenue': cod_revenue,
-                'pending_orders': pending_orders,
-                'delivered_orders': delivered_orders,
-                'cancelled_orders': cancelled_orders,
-                'verified_payments': verified_payments,
-                'pending_payments': pending_payments,
-                'failed_payments': failed_payments,
-                'low_stock_products': low_stock_products,
-            },
-            'recent_orders': recent_orders,
-            'top_products': top_products_data
-        }
-
-        serializer = DashboardSerializer(instance=data)
-        return Response(serializer.data)
+    def parse_date_range(self, request, default_days):
+        """``(start, end, error)`` from the ?from= and ?to= dates; defaults to the last ``default_days`` days"""
+        try:
+            end = parse_date(request.query_params['to']) if 'to' in request.query_params else timezone.localdate()
+            start = (
+                parse_date(request.query_params['from']) if 'from' in request.query_params
+                else end - timedelta(days=default_days - 1)
+            )
+        except ValueError:
+            start = end = None
+        if start is None or end is None:
+            return None, None, 'from and to must be dates (YYYY-MM-DD)'
+        if start > end:
+            return None, None, 'from must not be after to'
+        if (end - start).days > self.MAX_CHART_DAYS:
+            return None, None, f'The range can span at most {self.MAX_CHART_DAYS} days'
+        return start, end, None
 
     @action(detail=False, methods=['get'])
     def revenue_chart(self, request):
-        # Get revenue for last 7 days
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=7)
-        
-        daily_revenue = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            day_revenue = Order.objects.filter(
-                payment_status='paid',
-                created_at__date=current_date.date()
-            ).aggregate(total=Sum('total'))['total'] or 0
-            
-            daily_revenue.append({
-                'date': current_date.strftime('%Y-%m-%d'),
-                'revenue': float(day_revenue)
-            })
-            
-            current_date += timedelta(days=1)
-        
-        return Response(daily_revenue)
+        """
+        Verified revenue per day/week/month between ?from= and ?to= (dates,
+        inclusive, in the server time zone; default: the last 7 days), split
+        by payment method
+        """
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in rollups.GRANULARITIES:
+            return Response({
+                'error': f'granularity must be one of {", ".join(rollups.GRANULARITIES)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
 
+        start, end, error = self.parse_date_range(request, default_days=7)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
 
-class PaymentViewSet(viewsets.ModelViewSet):
+        series = rollups.revenue_series(start, end, granularity)
+        return Response({
+            'from': start,
+            'to': end,
+            'granularity': granularity,
+            'timezone': timezone.get_current_timezone_name(),
+            'results': [
+                {
+                    'date': point['date'].strftime('%Y-%m-%d'),
+                    'revenue': float(point['revenue']),
+                    'order_count': point['order_count'],
+                    'by_payment_method': {
+                        method: float(revenue) for method, revenue in point['by_payment_method'].items()
+                    },
+                }
+                for point in series
+            ]
+        })
+
+
+    @action(detail=False, methods=['get'])
+    def product_sales(self, request):
+        """
+        Best-selling products between ?from= and ?to= (default: the last 30
+        days) by ?sort=units|revenue, optionally in one ?category=, with their
+        sales velocity and the change since the window of the same length
+        just before
+        """
+        sort = request.query_params.get('sort', 'units')
+        if sort not in product_sales.SORT_FIELDS:
+            return Response({
+                'error': f'sort must be one of {", ".join(product_sales.SORT_FIELDS)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = int(request.query_params.get('limit', self.DEFAULT_PRODUCT_LIMIT))
+            category_id = int(request.query_params['category']) if request.query_params.get('category') else None
+        except ValueError:
+            return Response({
+                'error': 'limit and category must be integers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= limit <= self.MAX_PRODUCT_LIMIT:
+            return Response({
+                'error': f'limit must be between 1 and {self.MAX_PRODUCT_LIMIT}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        start, end, error = self.parse_date_range(request, default_days=30)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        days = (end - start).days + 1
+        results = product_sales.top_products(start, end, sort, limit, category_id, compare=True)
+        return Response({
+            'from': start,
+            'to': end,
+            'days': days,
+            'previous_from': start - timedelta(days=days),
+            'previous_to': start - timedelta(days=1),
+            'sort': sort,
+            'category': category_id,
+            'timezone': timezone.get_current_timezone_name(),
+            'results': ProductSalesSerializer(results, many=True).data,
+        })
+
+
+    @action(detail=False, methods=['get'])
+    def customer_analytics(self, request):
+        """
+        Cohort retention, repeat purchase rate and the ?limit= customers with
+        the highest lifetime value, from the last customer analytics run
+        """
+        try:
+            limit = int(request.query_params.get('limit', self.DEFAULT_CUSTOMER_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= self.MAX_CUSTOMER_LIMIT:
+            return Response({
+                'error': f'limit must be between 1 and {self.MAX_CUSTOMER_LIMIT}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        report = customer_analytics.latest_report()
+        if report is None:
+            return Response({
+                'error': 'Customer analytics have not been computed yet (manage.py compute_customer_analytics)'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        top_customers = CustomerValue.objects.select_related('customer').order_by('-lifetime_value', 'customer_id')[:limit]
+        return Response({
+            'generated_at': report.generated_at,
+            'summary': report.summary,
+            'cohorts': report.cohorts,
+            'top_customers': CustomerValueSerializer(top_customers, many=True).data,
+        })
+
+
+class PaymentViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = None
@@ -1074,7 +1328,7 @@ razorpay_client = razorpay.Client(
 )
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
@@ -1088,8 +1342,10 @@ class PaymentViewSet(viewsets.ModelViewSet):
             return Payment.objects.none()
 
     @action(detail=False, methods=['post'])
+    @idempotent('payments.create_razorpay_order', atomic=False)
     def create_razorpay_order(self, request):
         """Create Razorpay order for online payment"""
+        # Runs outside a transaction: the gateway call must not hold the database write lock
         try:
             amount = request.data.get('amount')
             currency = request.data.get('currency', 'INR')
@@ -1122,8 +1378,11 @@ class PaymentViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     @action(detail=False, methods=['post'])
+    @idempotent('payments.verify_razorpay_payment')
     def verify_razorpay_payment(self, request):
         """Verify Razorpay payment signature"""
+        # Only a bad signature is reported as 400; database or gateway failures
+        # propagate as 500s, which release the Idempotency-Key for a retry
         try:
             razorpay_order_id = request.data.get('razorpay_order_id')
             razorpay_payment_id = request.data.get('razorpay_payment_id')
@@ -1176,7 +1435,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
                     'error': 'Order or payment not found'
                 }, status=status.HTTP_404_NOT_FOUND)
 
-        except Exception as e:
+        except razorpay.errors.SignatureVerificationError as e:
             return Response({
                 'error': f'Payment verification failed: {str(e)}'
             }, status=status.HTTP_400_BAD_REQUEST)
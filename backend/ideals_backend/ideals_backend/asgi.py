@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ideals_backend.settings')
 
 application = get_asgi_application()
+
+# Periodic maintenance jobs (stale order cleanup) run inside the server process
+from api import scheduler  # noqa: E402
+
+scheduler.start()
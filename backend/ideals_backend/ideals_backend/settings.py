@@ -86,6 +86,18 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction begins, so concurrent
+            # checkouts wait their turn (up to `timeout` seconds) instead of
+            # failing with "database is locked" when upgrading a read lock
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        'TEST': {
+            # Shared-cache in-memory databases fail concurrent writers
+            # immediately; the concurrency tests need real file locking
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -141,6 +153,11 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'api.renderers.CompactJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
@@ -204,6 +221,76 @@ CLOUDINARY_API_SECRET = 'rlPLXOkDpdi8U7B4Mf1yb9AHRTw'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Product image derivatives (thumbnails / responsive variants, needs Pillow)
+PRODUCT_IMAGE_PIPELINE_ENABLED = True
+PRODUCT_IMAGE_ASYNC = True  # process after commit on a background thread
+PRODUCT_IMAGE_WIDTHS = [160, 320, 640, 1024]
+PRODUCT_IMAGE_FORMATS = ['webp', 'jpeg']
+PRODUCT_IMAGE_QUALITY = 80
+PRODUCT_IMAGE_FETCH_TIMEOUT = 15  # seconds
+PRODUCT_IMAGE_MAX_BYTES = 25 * 1024 * 1024
+
 # File upload settings
 MAX_UPLOAD_SIZE = 5242880  # 5MB
 ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
+
+# Caches
+# The catalog cache holds the catalog version counter and versioned product
+# payloads. Use a shared backend (Redis/Memcached) in production so that all
+# workers see version bumps; local memory is only suitable for a single process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+    },
+}
+
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_TTL = 60 * 60  # seconds; stale versions simply expire
+
+# Catalog facets
+CATALOG_FACET_CACHE_TTL = 60  # seconds
+CATALOG_PRICE_BUCKETS = [0, 250, 500, 1000, 2000]
+
+# Inventory
+DEFAULT_REORDER_THRESHOLD = 10  # used when neither product nor category sets one
+
+# Order pricing: tax applied on top of the item subtotal (18% GST, as shown at checkout)
+ORDER_TAX_RATE = '0.18'
+
+# Idempotency-Key replay window (seconds), and how long an unfinished request keeps its key
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+# Order/invoice numbers: values each process reserves per database round trip
+NUMBER_BLOCK_SIZE = 50
+
+# Admin order search: candidates taken per lookup, and the trigram similarity a customer needs to match
+ORDER_SEARCH_LIMIT = 100
+ORDER_SEARCH_SIMILARITY = 0.6
+
+# In-process scheduler for maintenance jobs, started by wsgi.py / asgi.py
+SCHEDULER_ENABLED = True
+SCHEDULER_TICK_SECONDS = 5
+SCHEDULER_LEASE_SECONDS = 10 * 60  # a run that stops renewing its lease for this long is taken over
+
+# Stale pending order cleanup (see api.cleanup)
+ORDER_CLEANUP_INTERVAL = 5 * 60  # seconds between scheduled runs
+ORDER_CLEANUP_AGE_HOURS = 1
+ORDER_CLEANUP_BATCH_SIZE = 500
+ORDER_CLEANUP_BATCH_PAUSE = 0.5  # seconds between batches
+
+# Dashboard stats snapshot (see api.dashboard): seconds it stays fresh, then how long a stale one is served while rebuilt
+DASHBOARD_CACHE_ALIAS = 'default'
+DASHBOARD_SNAPSHOT_TTL = 30
+DASHBOARD_SNAPSHOT_MAX_STALE = 5 * 60
+DASHBOARD_REFRESH_LOCK_TIMEOUT = 30  # a rebuild that takes longer than this can be started again
+DASHBOARD_REFRESH_ASYNC = True
+
+# Customer cohort / lifetime value batch job (see api.customer_analytics)
+CUSTOMER_ANALYTICS_INTERVAL = 24 * 60 * 60  # seconds between scheduled runs
+CUSTOMER_ANALYTICS_CHUNK_SIZE = 50000  # orders loaded per query
+CUSTOMER_ANALYTICS_REORDER_DAYS = 90  # cohorts report the share of customers who reordered within this many days
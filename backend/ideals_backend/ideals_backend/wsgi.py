@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ideals_backend.settings')
 
 application = get_wsgi_application()
+
+# Periodic maintenance jobs (stale order cleanup) run inside the server process
+from api import scheduler  # noqa: E402
+
+scheduler.start()
@@ -1,4 +1,4 @@
-import { Product, Order, DashboardStats, ProductFormData, OrderUpdateData, Payment, OnlinePayment, OfflinePayment, CODPayment, Invoice } from './types';
+import { Product, Order, DashboardStats, ProductFormData, OrderUpdateData, OrderBulkTransitionData, OrderBulkTransitionResult, Payment, OnlinePayment, OfflinePayment, CODPayment, Invoice } from './types';
 import api from './axios';
 import { API_ENDPOINTS } from './config';
 
@@ -6,7 +6,7 @@ import { API_ENDPOINTS } from './config';
 export const productsAPI = {
   getAll: async (): Promise<Product[]> => {
     try {
-      const response = await api.get(API_ENDPOINTS.PRODUCTS);
+      const response = await api.get(API_ENDPOINTS.PRODUCTS, { params: { paginate: 'false' } });
       console.log('API Response:', response.data);
       
       // Handle response structure (pagination disabled in backend)
@@ -121,6 +121,11 @@ export const ordersAPI = {
     return response.data;
   },
 
+  bulkTransition: async (data: OrderBulkTransitionData): Promise<OrderBulkTransitionResult> => {
+    const response = await api.post(`${API_ENDPOINTS.ORDERS}bulk_transition/`, data);
+    return response.data;
+  },
+
   generateInvoice: async (id: number): Promise<Invoice> => {
     const response = await api.post(`${API_ENDPOINTS.ORDERS}${id}/generate_invoice/`);
     return response.data;
@@ -114,6 +114,7 @@ export interface DashboardStats {
     total_sold: number;
     revenue: string; // Django returns Decimal as string
   }[];
+  generated_at: string; // when the cached snapshot was computed
 }
 
 export interface ProductFormData {
@@ -195,3 +196,15 @@ export interface OrderUpdateData {
   estimated_delivery?: string;
   generate_invoice?: boolean;
 }
+
+export interface OrderBulkTransitionData {
+  ids: number[];
+  status?: Order['status'];
+  payment_status?: Order['payment_status'];
+}
+
+export interface OrderBulkTransitionResult {
+  message: string;
+  updated: number[];
+  rejected: { id: number; order_number: string | null; reason: string }[];
+}
@@ -1,6 +1,6 @@
 'use client';
 
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useRouter } from 'next/navigation';
 import Link from 'next/link';
 import { FiArrowLeft, FiCreditCard, FiLock, FiMapPin, FiUpload, FiDollarSign, FiPlus, FiCheck, FiX } from 'react-icons/fi';
@@ -122,6 +122,13 @@ export default function CheckoutPage() {
 
   const [errors, setErrors] = useState<Record<string, string>>({});
 
+  // Idempotency key for the current checkout attempt: retries of the same
+  // cart reuse it, so the backend creates the order only once
+  const checkoutKeyRef = useRef<string | null>(null);
+  useEffect(() => {
+    checkoutKeyRef.current = null;
+  }, [items]);
+
   const subtotal = getTotalPrice();
   const shipping = 0; // Free shipping
   const tax = subtotal * 0.18; // 18% GST for India
@@ -295,7 +302,10 @@ export default function CheckoutPage() {
       console.log('Order data being sent:', orderData);
 
       // Create order in backend
-      const orderResponse = await ordersAPI.createOrder(orderData);
+      if (!checkoutKeyRef.current) {
+        checkoutKeyRef.current = crypto.randomUUID();
+      }
+      const orderResponse = await ordersAPI.createOrder(orderData, checkoutKeyRef.current);
       const order = orderResponse.order || orderResponse;
       
       console.log('Order created:', order);
@@ -313,7 +323,7 @@ export default function CheckoutPage() {
              // Handle payment based on type
        if (formData.paymentMethod.type === 'online') {
          // Create Razorpay order
-         const razorpayOrder = await paymentsAPI.createRazorpayOrder(roundedTotal, order.id);
+         const razorpayOrder = await paymentsAPI.createRazorpayOrder(roundedTotal, order.id, `${checkoutKeyRef.current}:razorpay`);
         
                  // Initialize Razorpay
          const options = {
@@ -174,7 +174,7 @@ export const productsAPI = {
   // Get all products from backend
   getAll: async () => {
     try {
-      const response = await backendApi.get('/products/');
+      const response = await backendApi.get('/products/?paginate=false');
       return response.data.results || response.data;
     } catch (error) {
       console.error('Error fetching products:', error);
@@ -185,7 +185,7 @@ export const productsAPI = {
   // Get featured products (first 4 active products)
   getFeatured: async () => {
     try {
-      const response = await backendApi.get('/products/?status=active');
+      const response = await backendApi.get('/products/?status=active&page_size=4');
       const products = response.data.results || response.data;
       return products.slice(0, 4);
     } catch (error) {
@@ -214,15 +214,29 @@ export const productsAPI = {
       console.error('Error fetching products by category:', error);
       throw error;
     }
+  },
+
+  // Get matching products together with category/brand/color/price facet counts
+  getFacets: async (filters: Record<string, string> = {}) => {
+    try {
+      const response = await backendApi.get('/products/facets/', { params: filters });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching product facets:', error);
+      throw error;
+    }
   }
 };
 
 // Order API functions
 export const ordersAPI = {
   // Create new order
-  createOrder: async (orderData: any) => {
+  // Pass the same idempotencyKey when retrying a checkout so the order is only created once
+  createOrder: async (orderData: any, idempotencyKey?: string) => {
     try {
-      const response = await backendApi.post('/orders/', orderData);
+      const response = await backendApi.post('/orders/', orderData, {
+        headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : undefined
+      });
       return response.data.order || response.data;
     } catch (error) {
       console.error('Error creating order:', error);
@@ -289,12 +303,14 @@ export const paymentsAPI = {
   },
 
   // Create Razorpay order
-  createRazorpayOrder: async (amount: number, orderId: string) => {
+  createRazorpayOrder: async (amount: number, orderId: string, idempotencyKey?: string) => {
     try {
       const response = await backendApi.post('/payments/create_razorpay_order/', {
         amount,
         order_id: orderId,
         currency: 'INR'
+      }, {
+        headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : undefined
       });
       return response.data;
     } catch (error) {
@@ -311,7 +327,10 @@ export const paymentsAPI = {
     order_id: string;
   }) => {
     try {
-      const response = await backendApi.post('/payments/verify_razorpay_payment/', paymentData);
+      // A Razorpay payment is verified once, however often the handler fires
+      const response = await backendApi.post('/payments/verify_razorpay_payment/', paymentData, {
+        headers: { 'Idempotency-Key': paymentData.razorpay_payment_id }
+      });
       return response.data;
     } catch (error) {
       console.error('Error verifying Razorpay payment:', error);